@@ -1,114 +1,456 @@
 import subprocess
 import shutil
 import time
+import io
+import os
+import re
+import struct
+import queue
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from colorama import init, Fore, Style
-import json
-
-with open("audio_quality_paths.json", "r") as f:
-    paths = json.load(f)
+from wav_io import wavInfo
+from paths_config import load_paths
 
 init(autoreset=True)
 
-class audioFilePlay:
-    def __init__(self):
-        pass
+PLAYER_PACKAGE = "com.shaiban.audioplayer.mplayer"
 
-    def log(self, level, message):
-        color = {
-            "SUCCESS": Fore.GREEN,
-            "ERROR": Fore.RED,
-            "WARNING": Fore.YELLOW,
-            "CHECK": Fore.CYAN,
-            "RESULT": Fore.MAGENTA,
-            "FAILURE": Fore.RED,
-            "FOUND": Fore.BLUE
-        }.get(level, Fore.WHITE)
-        print(f"{color}[{level}]{Style.RESET_ALL} {message}")
+# android.media.session.PlaybackState codes
+STATE_NONE = 0
+STATE_STOPPED = 1
+STATE_PAUSED = 2
+STATE_PLAYING = 3
+STATE_ERROR = 7
 
-    def check_adb_installed(self):
-        if not shutil.which("adb"):
-            self.log("ERROR", "'adb' command not found. Please install Android Platform Tools and set up your environment.")
-            return False
-        return True
+# Seconds a persistent-shell command may take before the shell is given up as stalled.
+SHELL_TIMEOUT = 30
+
+def log(level, message):
+    color = {
+        "SUCCESS": Fore.GREEN,
+        "ERROR": Fore.RED,
+        "WARNING": Fore.YELLOW,
+        "CHECK": Fore.CYAN,
+        "RESULT": Fore.MAGENTA,
+        "FAILURE": Fore.RED,
+        "FOUND": Fore.BLUE
+    }.get(level, Fore.WHITE)
+    print(f"{color}[{level}]{Style.RESET_ALL} {message}")
+
+
+def parse_devices(output):
+    """[(serial, state)] from `adb devices` output, skipping the header and daemon messages."""
+    devices = []
+    for line in (output or "").splitlines():
+        fields = line.split()
+        if len(fields) >= 2 and not line.startswith(("*", "List of devices")):
+            devices.append((fields[0], fields[1]))
+    return devices
+
+
+def list_devices(adb="adb"):
+    """Serials of the devices ready for commands (state "device"; not offline or unauthorized)."""
+    try:
+        result = subprocess.run(f"{adb} devices", shell=True, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    except subprocess.CalledProcessError as e:
+        log("ERROR", f"Failed to execute command: {adb} devices\nError:\n{e.stderr.strip()}")
+        return []
+    return [serial for serial, state in parse_devices(result.stdout) if state == "device"]
+
+
+def play_intent(device_path):
+    """`am start` command that opens `device_path` in the player."""
+    mime_type = "audio/wav" if device_path.lower().endswith(".wav") else "audio/mp3"
+    return (
+        f"am start -a android.intent.action.VIEW "
+        f"-d file://{device_path} -t {mime_type} "
+        f"-n {PLAYER_PACKAGE}/.ui.activities.FloatingPlayerActivity"
+    )
+
+
+def parse_playback_state(output, package_name=PLAYER_PACKAGE):
+    """(state, position_ms) of `package_name` in `dumpsys media_session` output, or None."""
+    current_package = None
+    for line in (output or "").splitlines():
+        line = line.strip()
+        if line.startswith("package="):
+            current_package = line.split("=", 1)[1]
+        elif current_package == package_name and line.startswith("state=PlaybackState"):
+            state = re.search(r"state=(\d+)", line[len("state="):])
+            position = re.search(r"position=(-?\d+)", line)
+            if state:
+                return int(state.group(1)), int(position.group(1)) if position else None
+    return None
+
+
+def frame_command(command, marker):
+    """Persistent-shell input that runs `command` and then prints `marker` and its exit status."""
+    return f"{command} 2>&1; echo {marker} $?\n".encode()
+
+
+def reply_line(raw, marker):
+    """(text, status) of one line read back after frame_command(); status is None until the marker line.
+
+    Output that does not end in a newline shares its last line with the
+    marker; that part comes back as `text`.
+    """
+    line = raw.decode(errors="replace").rstrip("\r\n")
+    at = line.find(marker)
+    if at < 0:
+        return line, None
+    return line[:at], int(line[at + len(marker):].split()[0])
 
-    def run_command(self, command):
+
+class playbackWatch:
+    """Decides when a playback has finished from successive media session polls.
+
+    Playback counts as finished when it leaves PLAYING or its media session
+    goes away, once PLAYING has been seen, or when its position reaches
+    `duration` (seconds); before
+    that any state is polled until `start_timeout`. The duration is also
+    the fallback when the player exposes no media session. check() returns
+    None while playback goes on, else (ok, level, message) with an optional
+    log line; shared by the blocking and the asyncio polling loops.
+    """
+
+    def __init__(self, duration, margin=5.0, start_timeout=30, start=None):
+        self.duration = duration
+        self.margin = margin
+        self.start_timeout = start_timeout
+        self.start = time.monotonic() if start is None else start
+        self.deadline = self.start + duration + margin if duration else None
+        self.seen_playing = False
+
+    def check(self, status, now):
+        duration = self.duration
+        if status is not None:
+            state, position = status
+            if state == STATE_PLAYING:
+                self.seen_playing = True
+                if duration and position is not None and position >= duration * 1000:
+                    return True, None, None
+            elif self.seen_playing:
+                return True, None, None
+
+        # Many players release their media session when the track completes.
+        if status is None and self.seen_playing:
+            return True, None, None
+        # Until PLAYING is seen, STOPPED/ERROR may be left over from the previous track.
+        if status is not None and not self.seen_playing:
+            if now - self.start > self.start_timeout:
+                return False, "FAILURE", f"Player did not start within {self.start_timeout}s."
+            return None
+        if status is None and duration and now >= self.start + duration + 1:
+            return True, "WARNING", "No media session state; used the WAV duration instead."
+        if self.deadline is not None and now >= self.deadline:
+            return True, "WARNING", f"Playback still reported after {duration + self.margin:.0f}s; moving on."
+        if self.deadline is None and status is None:
+            return False, "FAILURE", "No media session state and no WAV duration; cannot tell when playback ends."
+        return None
+
+    def delay(self, now, poll_interval):
+        """Seconds until the next poll."""
+        return poll_interval if self.deadline is None else min(poll_interval, max(self.deadline - now, 0))
+
+
+class adbSession:
+    """One long-lived `adb shell` plus device state that only has to be checked once.
+
+    connect() verifies the device and root once, opens a persistent shell
+    pipe and indexes every playback folder with a single listing, so each
+    later playback costs one shell command instead of several adb spawns.
+    With `serial`, every command targets that device (`adb -s <serial>`) and
+    log lines are tagged with it and also appended to `log_path`.
+    """
+
+    STORAGE_ROOT = "/storage/emulated/0"
+
+    def __init__(self, adb="adb", playback_folders=None, serial=None, log_path=None, shell_timeout=SHELL_TIMEOUT):
+        self.adb = adb
+        self.serial = serial
+        # Prefix of every device command; `adb devices` itself lists all devices.
+        self.target = f"{adb} -s {serial}" if serial else adb
+        self.log_path = log_path
+        self.playback_folders = playback_folders if playback_folders is not None else load_paths().get("playback_folders", [])
+        self.shell_timeout = shell_timeout
+        self.process = None
+        self.replies = None
+        self.connected = False
+        self.rooted = False
+        self.file_index = {}
+        self.durations = {}
+        self.lock = threading.Lock()
+        self.log_lock = threading.Lock()
+        self._marker_count = 0
+
+    def log(self, level, message):
+        log(level, f"[{self.serial}] {message}" if self.serial else message)
+        if self.log_path:
+            with self.log_lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} [{level}] {message}\n")
+
+    def run_command(self, command, quiet=False, binary=False):
         try:
-            result = subprocess.run(command, shell=True, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            self.log("SUCCESS", f"Executed command: {command}\nOutput:\n{result.stdout}")
+            result = subprocess.run(command, shell=True, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=not binary)
+            if not quiet:
+                self.log("SUCCESS", f"Executed command: {command}\nOutput:\n{result.stdout}")
             return result.stdout
         except subprocess.CalledProcessError as e:
-            self.log("ERROR", f"Failed to execute command: {command}\nError:\n{e.stderr.strip()}")
+            stderr = e.stderr.decode(errors="replace") if binary else e.stderr
+            self.log("ERROR", f"Failed to execute command: {command}\nError:\n{stderr.strip()}")
             return None
 
     def check_device_connected(self):
-        output = self.run_command("adb devices")
-        if output:
-            lines = output.strip().splitlines()
-            devices = [line for line in lines[1:] if "device" in line and not line.startswith("*")]
-            if devices:
-                self.log("CHECK", f"Connected devices: {devices}")
+        return self.device_ready(self.run_command(f"{self.adb} devices"))
+
+    def device_ready(self, output):
+        """Whether `adb devices` output shows this session's device (or, without a serial, one device) ready."""
+        devices = [serial for serial, state in parse_devices(output) if state == "device"]
+        if self.serial:
+            if self.serial in devices:
+                self.log("CHECK", f"Device {self.serial} connected.")
                 return True
-            else:
-                self.log("WARNING", "No devices detected. Please ensure your device is connected and USB debugging is enabled.")
+            self.log("WARNING", f"Device {self.serial} is not connected or not authorized (ready: {devices}).")
+        elif len(devices) == 1:
+            self.log("CHECK", f"Connected devices: {devices}")
+            return True
+        elif devices:
+            self.log("WARNING", f"{len(devices)} devices connected {devices}; choose one with a serial (\"adb_serial\").")
+        else:
+            self.log("WARNING", "No devices detected. Please ensure your device is connected and USB debugging is enabled.")
         return False
 
     def check_root_success(self):
-        output = self.run_command("adb root")
-        if output and ("adbd is already running as root" in output or "restarting adbd as root" in output):
+        output = self.run_command(f"{self.target} root")
+        if self.root_ready(output) and "restarting adbd as root" in output:
+            self.run_command(f"{self.target} wait-for-device", quiet=True)
+        return self.rooted
+
+    def root_ready(self, output):
+        """Whether `adb root` output reports root; a "restarting" device still needs wait-for-device."""
+        self.rooted = bool(output) and ("adbd is already running as root" in output or "restarting adbd as root" in output)
+        if self.rooted:
             self.log("CHECK", "adb root succeeded.")
-            return True
         else:
             self.log("ERROR", "adb root failed. Device may not support root or is not unlocked.")
-            return False
-        
-    def check_file_exists(self, folder, audioFile):
-        device_path = f"/storage/emulated/0/{folder}/{audioFile}"
-        check_command = f"adb shell ls {device_path}"
-        check_result = self.run_command(check_command)
+        return self.rooted
 
-        if check_result and audioFile in check_result:
-            self.log("FOUND", f"File found: {device_path}")
+    def connect(self):
+        if self.connected:
             return True
-        else:
-            self.log("WARNING", f"File not found in {folder}/")
+        if not self.check_device_connected():
+            return False
+        # `adb root` restarts adbd, so it has to happen before the shell is opened.
+        self.rooted = self.check_root_success()
+        if not self.rooted:
             return False
 
-    def play_audio(self, audioFile):
-        if not self.check_device_connected():
+        # A shell that died or stalled is still a process to reap.
+        self.close()
+        self.process = subprocess.Popen(
+            f"{self.target} shell",
+            shell=True,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        # Lines are read on a thread so shell() can wait for them with a timeout.
+        self.replies = queue.Queue()
+        threading.Thread(target=self._read_replies, args=(self.process.stdout, self.replies), daemon=True).start()
+        self.connected = True
+        self.build_index()
+        return True
+
+    @staticmethod
+    def _read_replies(stdout, replies):
+        for raw in iter(stdout.readline, b""):
+            replies.put(raw)
+        replies.put(b"")
+
+    def shell(self, command, quiet=False):
+        """Run `command` in the persistent shell; returns its output, or None on a non-zero exit.
+
+        A shell that is gone or does not answer within `shell_timeout` is
+        closed (and reopened by the next call), and None is returned.
+        """
+        if not self.connected and not self.connect():
+            return None
+        with self.lock:
+            self._marker_count += 1
+            marker = f"__ADB_SESSION_DONE_{self._marker_count}__"
+            try:
+                self.process.stdin.write(frame_command(command, marker))
+                self.process.stdin.flush()
+            except OSError as e:
+                self.log("ERROR", f"adb shell is gone ({e}); could not run: {command}")
+                self.close(kill=True)
+                return None
+
+            deadline = time.monotonic() + self.shell_timeout
+            lines = []
+            while True:
+                try:
+                    raw = self.replies.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    self.log("ERROR", f"adb shell did not answer within {self.shell_timeout}s: {command}")
+                    self.close(kill=True)
+                    return None
+                if not raw:
+                    self.log("ERROR", f"adb shell closed while running: {command}")
+                    self.close(kill=True)
+                    return None
+                text, status = reply_line(raw, marker)
+                if status is None:
+                    lines.append(text)
+                    continue
+                if text:
+                    lines.append(text)
+                break
+        return self.shell_result(command, lines, status, quiet)
+
+    def shell_result(self, command, lines, status, quiet=False):
+        """Output of a persistent-shell command from its reply lines, or None (logged) on a non-zero exit."""
+        output = "\n".join(lines) + ("\n" if lines else "")
+        if status != 0:
+            self.log("ERROR", f"Failed to execute command: adb shell {command}\nError:\n{output.strip()}")
+            return None
+        if not quiet:
+            self.log("SUCCESS", f"Executed command: adb shell {command}\nOutput:\n{output}")
+        return output
+
+    def build_index(self):
+        """Map file names to device paths across all playback folders with one listing.
+
+        Earlier folders in playback_folders win, matching the old search order.
+        """
+        return self.index_listing(self.shell(self.index_command(), quiet=True))
+
+    def index_command(self):
+        globs = " ".join(f'"{self.STORAGE_ROOT}/{folder}"/*' for folder in self.playback_folders)
+        return f"ls -1 -d {globs} 2>/dev/null; true"
+
+    def index_listing(self, output):
+        listed = set((output or "").splitlines())
+
+        self.file_index = {}
+        for folder in self.playback_folders:
+            prefix = f"{self.STORAGE_ROOT}/{folder}/"
+            for device_path in sorted(p for p in listed if p.startswith(prefix)):
+                name = device_path[len(prefix):]
+                if "/" not in name:
+                    self.file_index.setdefault(name, device_path)
+        self.log("CHECK", f"Indexed {len(self.file_index)} files in {len(self.playback_folders)} playback folders.")
+        return self.file_index
+
+    def header_command(self, device_path):
+        return f"{self.target} exec-out head -c 65536 {device_path}"
+
+    def header_duration(self, device_path, header):
+        """Duration in seconds from the first bytes of a WAV file on the device (cached), or None."""
+        if not header:
+            return None
+        try:
+            duration = wavInfo(device_path, fileobj=io.BytesIO(header)).duration
+        except (ValueError, struct.error):
+            self.log("WARNING", f"Could not read a WAV header from {device_path}")
+            return None
+        self.durations[device_path] = duration
+        return duration
+
+    def find_file(self, audioFile):
+        device_path = self.file_index.get(audioFile)
+        if device_path is None and self.connected:
+            # Pushed after connect(); refresh once.
+            device_path = self.build_index().get(audioFile)
+        return device_path
+
+    def close(self, kill=False):
+        """End the shell with `exit`, or at once with `kill` (one that died or stopped answering)."""
+        if self.process is not None:
+            try:
+                if not kill:
+                    self.process.stdin.write(b"exit\n")
+                # Also ends an adb left running under the killed command shell.
+                self.process.stdin.close()
+                if not kill:
+                    self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                kill = True
+            if kill:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+        self.connected = False
+
+
+class audioFilePlay:
+    def __init__(self, adb=None, session=None, serial=None, log_path=None):
+        # `adb` may point at any adb-compatible executable (e.g. a fake one in tests).
+        self.adb = adb or load_paths().get("adb", "adb")
+        self.session = session or adbSession(self.adb, serial=serial, log_path=log_path)
+        self.serial = self.session.serial
+        self.current_file = None
+
+    def log(self, level, message):
+        self.session.log(level, message)
+
+    def check_adb_installed(self):
+        if not shutil.which(self.adb):
+            self.log("ERROR", "'adb' command not found. Please install Android Platform Tools and set up your environment.")
             return False
-        if not self.check_root_success():
+        return True
+
+    def run_command(self, command, quiet=False, binary=False):
+        return self.session.run_command(command, quiet, binary)
+
+    def check_device_connected(self):
+        return self.session.check_device_connected()
+
+    def check_root_success(self):
+        return self.session.check_root_success()
+        
+    def push(self, local_path, folder=None):
+        """Copy a stimulus to `folder` (default: the first playback folder) on the device."""
+        folder = folder or (self.session.playback_folders or ["Music"])[0]
+        device_path = f"{adbSession.STORAGE_ROOT}/{folder}/{os.path.basename(local_path)}"
+        if self.run_command(f'{self.session.target} push "{local_path}" "{device_path}"', quiet=True) is None:
+            self.log("FAILURE", f"Failed to push {local_path}")
+            return False
+        # The old header may belong to a different file of the same name.
+        self.session.durations.pop(device_path, None)
+        self.log("SUCCESS", f"Pushed {local_path} -> {device_path}")
+        return True
+
+    def play_audio(self, audioFile):
+        self.current_file = None
+        if not self.session.connect():
             return False
 
         self.log("CHECK", f"Attempting to play audio file: {audioFile}")
-        mime_type = "audio/wav" if audioFile.lower().endswith(".wav") else "audio/mp3"
-        playback_folders = paths.get("playback_folders", [])
-
-        for folder in playback_folders:
-            if self.check_file_exists(folder, audioFile):
-                file_path = f"file:///storage/emulated/0/{folder}/{audioFile}"         
-                play_command = (
-                                f"adb shell am start -a android.intent.action.VIEW "
-                                f"-d {file_path} -t {mime_type} "
-                                f"-n com.shaiban.audioplayer.mplayer/.ui.activities.FloatingPlayerActivity"
-                            )
-                result = self.run_command(play_command)
-
-                if result:
-                    self.log("SUCCESS", f"Playback command sent for: {audioFile} in {folder}/")
-                    return True
-                else:
-                    self.log("FAILURE", f"Found file in {folder}/ but failed to play.")
-                    return False
-
-        self.log("FAILURE", f"Audio file '{audioFile}' not found in known locations.")
-        return False
+        device_path = self.session.find_file(audioFile)
+        if device_path is None:
+            self.log("FAILURE", f"Audio file '{audioFile}' not found in known locations.")
+            return False
+
+        self.log("FOUND", f"File found: {device_path}")
+        result = self.session.shell(play_intent(device_path))
+
+        if result:
+            self.current_file = device_path
+            self.log("SUCCESS", f"Playback command sent for: {device_path}")
+            return True
+        else:
+            self.log("FAILURE", f"Found {device_path} but failed to play.")
+            return False
 
     def app_cancel(self):
-        package_name = "com.shaiban.audioplayer.mplayer"
+        package_name = PLAYER_PACKAGE
         self.log("CHECK", f"Attempting to stop app: {package_name}")
         
-        command = f"adb shell am force-stop {package_name}"
-        result = self.run_command(command)
+        result = self.session.shell(f"am force-stop {package_name}")
 
         if result is not None:
             self.log("SUCCESS", f"App {package_name} has been stopped.")
@@ -116,3 +458,346 @@ class audioFilePlay:
         else:
             self.log("FAILURE", f"Failed to stop app: {package_name}")
             return False
+
+    def playback_state(self, package_name=PLAYER_PACKAGE):
+        """(state, position_ms) of the player's media session, or None if it has none."""
+        return parse_playback_state(self.session.shell("dumpsys media_session", quiet=True), package_name)
+
+    def wav_duration(self, device_path=None):
+        """Duration in seconds read from the WAV header on the device, or None."""
+        device_path = device_path or self.current_file
+        if not device_path:
+            return None
+        if device_path in self.session.durations:
+            return self.session.durations[device_path]
+        header = self.run_command(self.session.header_command(device_path), quiet=True, binary=True)
+        return self.session.header_duration(device_path, header)
+
+    def wait_playback_start(self, timeout=15, poll_interval=0.5):
+        """Block until the player reports PLAYING; False if it never does within `timeout`."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            status = self.playback_state()
+            if status and status[0] == STATE_PLAYING:
+                self.log("CHECK", "Playback started.")
+                return True
+            time.sleep(poll_interval)
+        self.log("WARNING", f"Playback did not report PLAYING within {timeout}s.")
+        return False
+
+    def wait_playback_end(self, duration=None, poll_interval=1.0, margin=5.0, start_timeout=30, stop_event=None):
+        """Block until the current file stops playing.
+
+        Polls the player's media session; playback counts as finished when it
+        leaves PLAYING or its position reaches the file duration. `duration`
+        (seconds) defaults to the WAV header of the file on the device and
+        is also the fallback when no media session state is available.
+        Returns early once `stop_event` (a threading.Event) is set, and
+        False if the player never starts within `start_timeout` seconds.
+        """
+        if duration is None:
+            duration = self.wav_duration()
+        watch = playbackWatch(duration, margin, start_timeout)
+
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                self.log("CHECK", "Stop requested before playback ended.")
+                return True
+            outcome = watch.check(self.playback_state(), time.monotonic())
+            if outcome is not None:
+                break
+            time.sleep(watch.delay(time.monotonic(), poll_interval))
+
+        ok, level, message = outcome
+        if level:
+            self.log(level, message)
+        if not ok:
+            return False
+        self.log("RESULT", f"Playback finished after {time.monotonic() - watch.start:.1f}s.")
+        return True
+
+
+class asyncPlayer:
+    """audioFilePlay for asyncio: every adb call is an asyncio subprocess, so waiting on the phone never blocks the loop.
+
+    `session` (an adbSession, never opened itself) supplies the device
+    serial, playback folders, file index and log; this class keeps its own
+    persistent `adb shell`. Cancelling a wait leaves the player running;
+    stop() force-stops it.
+    """
+
+    def __init__(self, adb=None, serial=None, session=None, log_path=None):
+        adb = adb or load_paths().get("adb", "adb")
+        # The session's shell_timeout also bounds every command of this shell.
+        self.session = session or adbSession(adb, serial=serial, log_path=log_path)
+        self.serial = self.session.serial
+        self.process = None
+        self.lock = None
+        self.current_file = None
+        self._marker_count = 0
+
+    def log(self, level, message):
+        self.session.log(level, message)
+
+    async def run_command(self, command, binary=False):
+        """Output of a one-off adb command, or None if it fails."""
+        process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await process.communicate()
+        if process.returncode != 0:
+            self.log("ERROR", f"Failed to execute command: {command}\nError:\n{stderr.decode(errors='replace').strip()}")
+            return None
+        return stdout if binary else stdout.decode(errors="replace")
+
+    async def connect(self):
+        session = self.session
+        if self.process is not None and self.process.returncode is None:
+            return True
+        if not session.device_ready(await self.run_command(f"{session.adb} devices")):
+            return False
+        output = await self.run_command(f"{session.target} root")
+        if not session.root_ready(output):
+            return False
+        if "restarting adbd as root" in output:
+            await self.run_command(f"{session.target} wait-for-device")
+
+        await self.close()
+        self.lock = asyncio.Lock()
+        self.process = await asyncio.create_subprocess_shell(
+            f"{session.target} shell",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        session.index_listing(await self.shell(session.index_command(), quiet=True))
+        return True
+
+    async def shell(self, command, quiet=False):
+        """Run `command` in the persistent shell; returns its output, or None on a non-zero exit."""
+        if (self.process is None or self.process.returncode is not None) and not await self.connect():
+            return None
+        async with self.lock:
+            self._marker_count += 1
+            marker = f"__ADB_SESSION_DONE_{self._marker_count}__"
+            try:
+                self.process.stdin.write(frame_command(command, marker))
+                await self.process.stdin.drain()
+            except OSError as e:
+                self.log("ERROR", f"adb shell is gone ({e}); could not run: {command}")
+                await self.close(kill=True)
+                return None
+
+            deadline = asyncio.get_running_loop().time() + self.session.shell_timeout
+            lines = []
+            while True:
+                try:
+                    raw = await asyncio.wait_for(
+                        self.process.stdout.readline(), max(0.0, deadline - asyncio.get_running_loop().time())
+                    )
+                except asyncio.TimeoutError:
+                    self.log("ERROR", f"adb shell did not answer within {self.session.shell_timeout}s: {command}")
+                    await self.close(kill=True)
+                    return None
+                if not raw:
+                    self.log("ERROR", f"adb shell closed while running: {command}")
+                    await self.close(kill=True)
+                    return None
+                text, status = reply_line(raw, marker)
+                if status is None:
+                    lines.append(text)
+                    continue
+                if text:
+                    lines.append(text)
+                break
+        return self.session.shell_result(command, lines, status, quiet)
+
+    async def play_audio(self, audioFile):
+        self.current_file = None
+        if not await self.connect():
+            return False
+
+        self.log("CHECK", f"Attempting to play audio file: {audioFile}")
+        device_path = self.session.file_index.get(audioFile)
+        if device_path is None:
+            # Pushed after connect(); refresh once.
+            device_path = self.session.index_listing(await self.shell(self.session.index_command(), quiet=True)).get(audioFile)
+        if device_path is None:
+            self.log("FAILURE", f"Audio file '{audioFile}' not found in known locations.")
+            return False
+
+        self.log("FOUND", f"File found: {device_path}")
+        if await self.shell(play_intent(device_path)):
+            self.current_file = device_path
+            self.log("SUCCESS", f"Playback command sent for: {device_path}")
+            return True
+        self.log("FAILURE", f"Found {device_path} but failed to play.")
+        return False
+
+    async def app_cancel(self):
+        self.log("CHECK", f"Attempting to stop app: {PLAYER_PACKAGE}")
+        if await self.shell(f"am force-stop {PLAYER_PACKAGE}") is not None:
+            self.log("SUCCESS", f"App {PLAYER_PACKAGE} has been stopped.")
+            return True
+        self.log("FAILURE", f"Failed to stop app: {PLAYER_PACKAGE}")
+        return False
+
+    async def playback_state(self, package_name=PLAYER_PACKAGE):
+        return parse_playback_state(await self.shell("dumpsys media_session", quiet=True), package_name)
+
+    async def wav_duration(self, device_path=None):
+        device_path = device_path or self.current_file
+        if not device_path:
+            return None
+        if device_path in self.session.durations:
+            return self.session.durations[device_path]
+        header = await self.run_command(self.session.header_command(device_path), binary=True)
+        return self.session.header_duration(device_path, header)
+
+    async def wait_playback_start(self, timeout=15, poll_interval=0.5):
+        """True once the player reports PLAYING; False if it never does within `timeout`."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while loop.time() < deadline:
+            status = await self.playback_state()
+            if status and status[0] == STATE_PLAYING:
+                self.log("CHECK", "Playback started.")
+                return True
+            await asyncio.sleep(poll_interval)
+        self.log("WARNING", f"Playback did not report PLAYING within {timeout}s.")
+        return False
+
+    async def wait_playback_end(self, duration=None, poll_interval=1.0, margin=5.0, start_timeout=30):
+        """audioFilePlay.wait_playback_end() without blocking; cancel the task to stop waiting early."""
+        if duration is None:
+            duration = await self.wav_duration()
+        watch = playbackWatch(duration, margin, start_timeout)
+        while True:
+            outcome = watch.check(await self.playback_state(), time.monotonic())
+            if outcome is not None:
+                break
+            await asyncio.sleep(watch.delay(time.monotonic(), poll_interval))
+
+        ok, level, message = outcome
+        if level:
+            self.log(level, message)
+        if ok:
+            self.log("RESULT", f"Playback finished after {time.monotonic() - watch.start:.1f}s.")
+        return ok
+
+    async def close(self, kill=False):
+        """End the shell with `exit`, or at once with `kill` (one that died or stopped answering)."""
+        if self.process is not None:
+            try:
+                if not kill and self.process.returncode is None:
+                    self.process.stdin.write(b"exit\n")
+                self.process.stdin.close()
+                if not kill:
+                    await asyncio.wait_for(self.process.wait(), 5)
+            except (OSError, asyncio.TimeoutError):
+                kill = True
+            if kill:
+                if self.process.returncode is None:
+                    self.process.kill()
+                try:
+                    # wait() also waits for the pipes, which an orphaned adb may hold a while longer.
+                    await asyncio.wait_for(self.process.wait(), 5)
+                except asyncio.TimeoutError:
+                    self.log("WARNING", "adb shell pipes still open 5s after kill.")
+        self.process = None
+
+
+def play_job(player, audio_file, local_path=None, folder=None):
+    """Push (optionally), play and wait out one stimulus on `player`'s device; returns a summary dict."""
+    start = time.monotonic()
+    ok = (local_path is None or player.push(local_path, folder)) and player.play_audio(audio_file)
+    ok = ok and player.wait_playback_end()
+    player.app_cancel()
+    return {"serial": player.serial, "file": audio_file, "ok": bool(ok), "seconds": time.monotonic() - start}
+
+
+class devicePool:
+    """Every attached phone with its own adbSession, running jobs on whichever phone is free.
+
+    A job is `job(player, *args)`, where player is the audioFilePlay of one
+    device; a phone runs one job at a time, so a push or playback on one
+    phone overlaps the connect/root/index setup and playback of the others.
+    With `log_dir`, each phone also logs to `<log_dir>/<serial>.log`.
+    """
+
+    def __init__(self, adb=None, serials=None, playback_folders=None, log_dir=None):
+        self.adb = adb or load_paths().get("adb", "adb")
+        self.serials = list(serials) if serials else list_devices(self.adb)
+        if not self.serials:
+            raise RuntimeError("No adb device in state 'device'. Check the USB connection and authorization.")
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        self.players = {
+            serial: audioFilePlay(
+                self.adb,
+                adbSession(self.adb, playback_folders, serial, os.path.join(log_dir, f"{serial}.log") if log_dir else None),
+            )
+            for serial in self.serials
+        }
+        self.free = queue.Queue()
+        for player in self.players.values():
+            self.free.put(player)
+        self.executor = ThreadPoolExecutor(max_workers=len(self.players), thread_name_prefix="adb")
+
+    def _run(self, job, args):
+        player = self.free.get()
+        try:
+            return job(player, *args)
+        finally:
+            self.free.put(player)
+
+    def submit(self, job, *args):
+        """Run job(player, *args) on the next free device; returns a Future."""
+        return self.executor.submit(self._run, job, args)
+
+    def map(self, job, items):
+        """job(player, *item) for every item (a tuple of arguments), spread over the devices; results in order."""
+        futures = [self.submit(job, *item) for item in items]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for player in self.players.values():
+            player.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play stimuli on every attached Android phone concurrently")
+    parser.add_argument("files", type=str, nargs="*", help="Stimulus file names on the phones (local paths with --push)")
+    parser.add_argument("--list", action="store_true", help="List the ready devices and exit")
+    parser.add_argument("--serial", type=str, action="append", help="Use only this device (repeatable; default: all ready devices)")
+    parser.add_argument("--push", action="store_true", help="Push each local file to the phone before playing it")
+    parser.add_argument("--folder", type=str, default=None, help="Device folder for --push (default: first playback folder)")
+    parser.add_argument("--repeat", type=int, default=1, help="Play the file list this many times")
+    parser.add_argument("--log-dir", type=str, default=None, help="Folder for the per-device logs")
+    parser.add_argument("--adb", type=str, default=None, help="adb executable (default: \"adb\" in the paths file, else adb)")
+    args = parser.parse_args(argv)
+
+    adb = args.adb or load_paths().get("adb", "adb")
+    if args.list:
+        for serial in list_devices(adb):
+            print(serial)
+        return
+
+    items = [
+        (os.path.basename(f), f, args.folder) if args.push else (f,)
+        for f in args.files * args.repeat
+    ]
+    with devicePool(adb, args.serial, log_dir=args.log_dir) as pool:
+        results = pool.map(play_job, items)
+    for res in results:
+        print(f"{'✅' if res['ok'] else '❌'} {res['serial']}  {res['file']}  {res['seconds']:.1f}s")
+    return 0 if all(res["ok"] for res in results) else 1
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import os
+import argparse
+import tempfile
+
+# Per measurement (the APx500_Application property of the active measurement):
+# result -> exports, in the order they are written. "png" files go to
+# graph_folder[fs]; "csv" targets are formatted with report_folder and fs.
+EXPORT_MANIFEST = {
+    "DynamicRange": {
+        "DynamicRange": [("png", "DNR.png")],
+    },
+    "SteppedFrequencySweep": {
+        "Level": [("png", "sweep_RMSLevel.png")],
+        "RelativeLevel": [("png", "sweep_RelativeLevel.png")],
+        "Phase": [("png", "sweep_Phase.png")],
+        "ThdNRatio": [("png", "sweep_ThdNRatio.png")],
+    },
+    "MultitoneAnalyzer": {
+        "FFTSpectrum": [
+            ("csv", "{report_folder}/{fs}_raw_data.csv"),
+            ("png", "multitone_RelativeLevel_FFT.png"),
+        ],
+        "RelativeLevel": [("png", "multitone_RelativeLevel.png")],
+    },
+}
+
+
+def export_files(measurement, paths, fs, manifest=EXPORT_MANIFEST):
+    """Every file export_results() writes for `measurement`, in order."""
+    files = []
+    for exports in manifest[measurement].values():
+        for kind, target in exports:
+            if kind == "png":
+                files.append(f"{paths['graph_folder'][fs]}/{target}")
+            else:
+                files.append(target.format(report_folder=paths["report_folder"], fs=fs))
+    return files
+
+
+def png_type():
+    # Imported late: the real enum only exists once clr has loaded the APx DLLs.
+    try:
+        from AudioPrecision.API import GraphImageType
+    except ImportError:
+        from apx_trace import GraphImageType
+    return GraphImageType.PNG
+
+
+def export_results(APx, measurement, paths, fs, headless=False, manifest=EXPORT_MANIFEST):
+    """Write every graph and CSV of `measurement` listed in the manifest in one pass.
+
+    Each result object is fetched and checked once, however many files it
+    produces. `headless` skips the per-result Show(), which only redraws the
+    UI; the measurement itself must already be active (Show() on the sequence
+    measurement), as the APx500_Application properties refer to it.
+    """
+    graph_folder = paths["graph_folder"][fs]
+    os.makedirs(graph_folder, exist_ok=True)
+    image_type = png_type()
+    results = getattr(APx, measurement)
+
+    saved = []
+    for result_name, exports in manifest[measurement].items():
+        result = getattr(results, result_name)
+        result.Checked = True
+        if not headless:
+            result.Show()
+        for kind, target in exports:
+            if kind == "png":
+                path = f"{graph_folder}/{target}"
+                result.Save(path, image_type)
+            elif kind == "csv":
+                path = target.format(report_folder=paths["report_folder"], fs=fs)
+                result.ExportData(path, "All Points")
+            else:
+                raise ValueError(f"Unknown export type '{kind}' for {measurement}.{result_name}")
+            saved.append(path)
+    return saved
+
+
+def count_calls(headless, fs="48k"):
+    """Interop calls made by exporting every manifest entry against a counting stand-in APx."""
+    from apx_trace import apiTrace, apxTracer, apxStub
+
+    trace = apiTrace()
+    APx = apxTracer(apxStub(), trace)
+    with tempfile.TemporaryDirectory() as folder:
+        paths = {"graph_folder": {fs: os.path.join(folder, "graph")}, "report_folder": folder}
+        for measurement in EXPORT_MANIFEST:
+            export_results(APx, measurement, paths, fs, headless)
+    return trace
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count the APx calls of the export manifest with a stand-in APx")
+    parser.add_argument("--headless", action="store_true", help="Count the headless export")
+    args = parser.parse_args(argv)
+
+    trace = count_calls(args.headless)
+    print(f"{len(trace.events)} API calls")
+    trace.print_summary()
+
+
+if __name__ == "__main__":
+    main()
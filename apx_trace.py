@@ -0,0 +1,301 @@
+import json
+import time
+import argparse
+import threading
+from collections import defaultdict, deque
+
+PRIMITIVES = (str, int, float, bool, type(None))
+
+
+class GraphImageType:
+    """Stand-in for AudioPrecision.API.GraphImageType when the APx DLLs are not available."""
+
+    BMP = "BMP"
+    EMF = "EMF"
+    GIF = "GIF"
+    JPG = "JPG"
+    PNG = "PNG"
+    TIFF = "TIFF"
+
+
+# Members of the APx API that are methods; everything else is a property.
+APX_METHODS = {
+    "CancelOperation",
+    "ExportData",
+    "GetMeasurement",
+    "OpenProject",
+    "Run",
+    "Save",
+    "Show",
+    "Start",
+}
+
+
+class apxStub:
+    """Do-nothing APx object: any property is another stub, any APX_METHODS member a no-op call.
+
+    Wrapped in apxTracer it counts the interop calls a piece of orchestration makes.
+    """
+
+    def __getattr__(self, name):
+        if name in APX_METHODS:
+            return lambda *args, **kwargs: apxStub()
+        return apxStub()
+
+    def __setattr__(self, name, value):
+        pass
+
+
+def describe(value):
+    """JSON-friendly form of an argument: proxies by path, .NET objects by str()."""
+    if isinstance(value, (apxTracer, apxReplay)):
+        return object.__getattribute__(value, "_path")
+    if isinstance(value, PRIMITIVES):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [describe(v) for v in value]
+    return str(value)
+
+
+def arg_text(args, kwargs):
+    parts = [json.dumps(describe(a), ensure_ascii=False) for a in args]
+    parts += [f"{k}={json.dumps(describe(v), ensure_ascii=False)}" for k, v in kwargs.items()]
+    return ", ".join(parts)
+
+
+def unwrap(value):
+    if isinstance(value, apxTracer):
+        return object.__getattribute__(value, "_target")
+    if isinstance(value, list):
+        return [unwrap(v) for v in value]
+    return value
+
+
+def member_name(path):
+    """Last member of a path with call arguments stripped: 'APx.Sequence.GetMeasurement("a")' -> 'GetMeasurement'."""
+    depth = 0
+    for i in range(len(path) - 1, -1, -1):
+        ch = path[i]
+        if ch == ")":
+            depth += 1
+        elif ch == "(":
+            depth -= 1
+        elif ch == "." and depth == 0:
+            return path[i + 1 :].split("(")[0]
+    return path.split("(")[0]
+
+
+class apiTrace:
+    """Thread-safe list of APx API events (get / set / call) with their latency."""
+
+    def __init__(self, events=None):
+        self.events = list(events or [])
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def record(self, op, path, start, latency, args=None, kind=None, result=None, error=None):
+        event = {
+            "op": op,
+            "path": path,
+            "args": args,
+            "start": round(start - self.origin, 6),
+            "latency": round(latency, 6),
+            "thread": threading.current_thread().name,
+            "kind": kind,
+        }
+        if kind == "value":
+            event["result"] = result
+        if error is not None:
+            event["error"] = error
+        with self.lock:
+            event["seq"] = len(self.events)
+            self.events.append(event)
+
+    def save(self, trace_file):
+        with self.lock:
+            events = list(self.events)
+        with open(trace_file, "w") as f:
+            json.dump({"events": events}, f, indent=1, ensure_ascii=False)
+        print(f"Saved as: {trace_file}")
+
+    @classmethod
+    def load(cls, trace_file):
+        with open(trace_file, "r") as f:
+            return cls(json.load(f)["events"])
+
+    def summary(self):
+        """Latency per operation type ('call Run', 'set Checked', ...), most expensive first."""
+        groups = defaultdict(list)
+        for event in self.events:
+            groups[f"{event['op']} {member_name(event['path'])}"].append(event["latency"])
+        total = sum(sum(v) for v in groups.values()) or 1.0
+        rows = [
+            {
+                "Operation": name,
+                "Count": len(latencies),
+                "Total_s": round(sum(latencies), 3),
+                "Mean_ms": round(1000 * sum(latencies) / len(latencies), 2),
+                "Max_ms": round(1000 * max(latencies), 2),
+                "Share_%": round(100 * sum(latencies) / total, 1),
+            }
+            for name, latencies in groups.items()
+        ]
+        return sorted(rows, key=lambda r: r["Total_s"], reverse=True)
+
+    def print_summary(self, top=20):
+        print(f"{'Operation':<32} {'Count':>6} {'Total s':>9} {'Mean ms':>9} {'Max ms':>9} {'Share':>6}")
+        for row in self.summary()[:top]:
+            print(
+                f"{row['Operation']:<32} {row['Count']:>6} {row['Total_s']:>9.3f}"
+                f" {row['Mean_ms']:>9.2f} {row['Max_ms']:>9.2f} {row['Share_%']:>5.1f}%"
+            )
+
+
+class apxTracer:
+    """Transparent proxy around APx500_Application that records every interop call.
+
+    Property reads that return .NET objects are wrapped again, so a chain
+    like APx.Sequence.GetMeasurement(...).Run() is traced member by member
+    under a path that replay can match.
+    """
+
+    def __init__(self, target, trace=None, path="APx"):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_trace", trace if trace is not None else apiTrace())
+        object.__setattr__(self, "_path", path)
+
+    def _wrap(self, value, path):
+        if isinstance(value, PRIMITIVES):
+            return value
+        return apxTracer(value, self._trace, path)
+
+    def __getattr__(self, name):
+        path = f"{self._path}.{name}"
+        start = time.perf_counter()
+        value = getattr(self._target, name)
+        latency = time.perf_counter() - start
+
+        if callable(value):
+            return self._tracing_call(value, path)
+        kind = "value" if isinstance(value, PRIMITIVES) else "object"
+        self._trace.record("get", path, start, latency, kind=kind, result=value)
+        return self._wrap(value, path)
+
+    def _tracing_call(self, method, path):
+        def call(*args, **kwargs):
+            text = arg_text(args, kwargs)
+            start = time.perf_counter()
+            try:
+                result = method(*[unwrap(a) for a in args], **{k: unwrap(v) for k, v in kwargs.items()})
+            except Exception as e:
+                self._trace.record("call", path, start, time.perf_counter() - start, args=text, error=repr(e))
+                raise
+            latency = time.perf_counter() - start
+            kind = "value" if isinstance(result, PRIMITIVES) else "object"
+            self._trace.record("call", path, start, latency, args=text, kind=kind, result=result)
+            return self._wrap(result, f"{path}({text})")
+
+        return call
+
+    def __setattr__(self, name, value):
+        path = f"{self._path}.{name}"
+        start = time.perf_counter()
+        setattr(self._target, name, unwrap(value))
+        self._trace.record("set", path, start, time.perf_counter() - start, args=arg_text((value,), {}))
+
+
+class replayState:
+    """Recorded events indexed for lookup, shared by every apxReplay of one session."""
+
+    def __init__(self, trace, speed=1.0):
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.missing = []
+        self.by_args = defaultdict(deque)
+        self.by_path = defaultdict(deque)
+        self.calls = set()
+        for event in trace.events:
+            if "error" in event:
+                continue
+            self.by_args[(event["op"], event["path"], event["args"])].append(event)
+            self.by_path[(event["op"], event["path"])].append(event)
+            if event["op"] == "call":
+                self.calls.add(event["path"])
+
+    def _take(self, queue):
+        # The last recording of a member is reused when the run makes more calls than the trace.
+        return queue.popleft() if len(queue) > 1 else queue[0]
+
+    def next(self, op, path, args=None):
+        with self.lock:
+            queue = self.by_args.get((op, path, args)) or self.by_path.get((op, path))
+            if not queue:
+                self.missing.append((op, path, args))
+                return None
+            event = self._take(queue)
+        if self.speed:
+            time.sleep(event["latency"] / self.speed)
+        return event
+
+
+class apxReplay:
+    """Pure-Python stand-in for APx500_Application driven by a recorded trace.
+
+    Every get/set/call sleeps for its recorded latency (divided by `speed`,
+    0 disables the delays) and returns the recorded value. Members the trace
+    never saw are answered with a stand-in object and listed in `missing`.
+    """
+
+    def __init__(self, trace, speed=1.0, path="APx", state=None):
+        object.__setattr__(self, "_state", state or replayState(trace, speed))
+        object.__setattr__(self, "_path", path)
+        object.__setattr__(self, "trace", trace)
+
+    @classmethod
+    def load(cls, trace_file, speed=1.0):
+        return cls(apiTrace.load(trace_file), speed)
+
+    @property
+    def missing(self):
+        return self._state.missing
+
+    def _child(self, path):
+        return apxReplay(self.trace, path=path, state=self._state)
+
+    def __getattr__(self, name):
+        path = f"{self._path}.{name}"
+        if path in self._state.calls:
+            return self._replay_call(path)
+        event = self._state.next("get", path)
+        if event is not None and event["kind"] == "value":
+            return event["result"]
+        return self._child(path)
+
+    def _replay_call(self, path):
+        def call(*args, **kwargs):
+            text = arg_text(args, kwargs)
+            event = self._state.next("call", path, text)
+            if event is not None and event["kind"] == "value":
+                return event["result"]
+            return self._child(f"{path}({text})")
+
+        return call
+
+    def __setattr__(self, name, value):
+        self._state.next("set", f"{self._path}.{name}", arg_text((value,), {}))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a recorded APx API trace")
+    parser.add_argument("trace", type=str, help="Trace JSON written by audio_quality_test.py --trace")
+    parser.add_argument("--top", type=int, default=20, help="Number of operations to show")
+    args = parser.parse_args(argv)
+
+    trace = apiTrace.load(args.trace)
+    total = sum(e["latency"] for e in trace.events)
+    print(f"{len(trace.events)} API events, {total:.3f} s in APx calls")
+    trace.print_summary(args.top)
+
+
+if __name__ == "__main__":
+    main()
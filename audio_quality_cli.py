@@ -0,0 +1,43 @@
+import sys
+import argparse
+import importlib
+
+# Subcommand -> (module, help). Only the module of the chosen subcommand is
+# imported, so numpy/pandas/matplotlib/scipy load only for stages that use them.
+COMMANDS = {
+    "run": ("audio_quality_test", "Run the APx measurements and the offline pipeline"),
+    "csv": ("csv_analyze", "Multitone peak analysis of APx FFT CSV exports"),
+    "sweep": ("sweep_offline", "Offline sweep analysis of a split recording"),
+    "multitone": ("multitone_offline", "Offline multitone FFT of the split segments"),
+    "align": ("stimulus_align", "Locate the step 1 stimuli in a recording by cross-correlation"),
+    "play": ("adb_command", "Play stimuli on every attached phone concurrently"),
+    "dnr": ("dnr_offline", "Offline dynamic range of a recording"),
+    "spectrum": ("spectrogramDraw", "Welch spectrum and STFT spectrogram of a WAV file"),
+    "overview": ("waveform_overview", "Waveform overview images"),
+    "report": ("pdf_report", "Build the PDF report"),
+    "results": ("results_store", "Query the results stored across runs"),
+    "trace": ("apx_trace", "Summarize a recorded APx API trace"),
+    "export": ("apx_export", "Count the APx calls of the export manifest"),
+    "bench": ("benchmark", "Benchmark the processing stages"),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Audio quality test tools",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n"
+        + "\n".join(f"  {name:<14}{text}" for name, (_, text) in COMMANDS.items())
+        + "\n\nRun '%(prog)s <command> --help' for the options of a command.",
+    )
+    parser.add_argument("command", choices=list(COMMANDS), metavar="command", help="Command to run (see below)")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    module = importlib.import_module(COMMANDS[args.command][0])
+    sys.argv[0] = f"{parser.prog} {args.command}"
+    return module.main(args.args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,49 @@
-import clr, time, os, sys
-import threading
+import os
 import argparse
 import glob
-import json
-from adb_command import audioFilePlay
-from tone_splitter import silenceSplitter, manualSplitter
-
-# Add a reference to the APx API
-clr.AddReference(
-    r"C:\\Program Files\\Audio Precision\\APx500 9.1\\API\\AudioPrecision.API2.dll"
-)
-clr.AddReference(
-    r"C:\\Program Files\\Audio Precision\\APx500 9.1\\API\\AudioPrecision.API.dll"
-)
-from AudioPrecision.API import *
-
-with open("audio_quality_paths.json", "r") as f:
-    paths = json.load(f)
-
-
-def project_init(path=None):
-    APx = APx500_Application()
-    APx.Visible = True
+from stage_scheduler import stageScheduler
+from apx_trace import apiTrace, apxTracer, apxReplay
+from apx_export import EXPORT_MANIFEST, export_results, export_files
+from paths_config import load_paths
+
+# Heavy modules (adb_command, tone_splitter, csv_analyze, the offline
+# analyzers, pythonnet) are imported by the stage that uses them, so a run
+# of a few steps only pays for what it runs.
+
+
+def apx_application_class():
+    """APx500_Application from the APx DLLs, loaded on first use; None without pythonnet."""
+    try:
+        import clr
+    except ImportError:
+        # No pythonnet/.NET runtime (e.g. Linux): only --replay can stand in for the APx.
+        return None
+
+    # Add a reference to the APx API
+    clr.AddReference(
+        r"C:\\Program Files\\Audio Precision\\APx500 9.1\\API\\AudioPrecision.API2.dll"
+    )
+    clr.AddReference(
+        r"C:\\Program Files\\Audio Precision\\APx500 9.1\\API\\AudioPrecision.API.dll"
+    )
+    from AudioPrecision.API import APx500_Application
+
+    return APx500_Application
+
+
+def project_init(path=None, trace=None, replay=None, replay_speed=1.0, headless=False):
+    """Open the APx project; `trace` records every API call, `replay` stands in for the APx."""
+    if replay:
+        APx = apxReplay.load(replay, replay_speed)
+    else:
+        application = apx_application_class()
+        if application is None:
+            raise RuntimeError("APx500 API is not available (pythonnet missing); use --replay")
+        APx = application()
+        if trace is not None:
+            APx = apxTracer(APx, trace)
+    if not headless:
+        APx.Visible = True
     if path:
         APx.OpenProject(path)
     else:
@@ -31,16 +53,14 @@ def project_init(path=None):
 
 # adb shell am start -a android.intent.action.VIEW -d file:///storage/emulated/0/Music/DNR_1kHz_48kHz24b2Ch.wav -t audio/wav -n com.shaiban.audioplayer.mplayer/.ui.activities.FloatingPlayerActivity
 class audioQualityEvkI2s:
-    def __init__(self, APx, fs):
+    def __init__(self, APx, fs, headless=False):
         self.APx = APx
         self.fs = fs  # sample rate
+        self.headless = headless
+        self.paths = load_paths()
 
     def export_graph(self):
-        os.makedirs(paths["graph_folder"].get(self.fs), exist_ok=True)
-        export = self.APx.DynamicRange.DynamicRange
-        export.Checked = True
-        export.Show()
-        export.Save(f"{paths["graph_folder"].get(self.fs)}/DNR.png", GraphImageType.PNG)
+        export_results(self.APx, "DynamicRange", self.paths, self.fs, self.headless)
 
     def dynamic_range(self):
         DNR = self.APx.Sequence.GetMeasurement(
@@ -58,89 +78,39 @@ class audioQualityEvkI2s:
         recorder.Checked = True
         recorder.Show()
         self.APx.MeasurementRecorder.SaveAcquisitionToFile = True
-        self.APx.MeasurementRecorder.SavedAcquisitionFolderName = paths["report_folder"]
+        self.APx.MeasurementRecorder.SavedAcquisitionFolderName = self.paths["report_folder"]
         self.APx.MeasurementRecorder.SavedAcquisitionFileName = f"{self.fs}Hz"
         recorder.Run()
 
     def generate_report(self):
         self.APx.Sequence.Report.Checked = False
-        self.APx.Sequence.Report.AutoSaveReportFileLocation = paths["report_folder"]
+        self.APx.Sequence.Report.AutoSaveReportFileLocation = self.paths["report_folder"]
         self.APx.Sequence.Report.AutoSaveReport = False
         self.APx.Sequence.Report.ShowAutoSavedReport = False
 
-    def dynamic_range_files(self):
-        player = audioFilePlay()
-        if self.fs == "48k":
-            player.play_audio(paths["dynamic_range_file"]["48k"])
-            time.sleep(30)
-            player.app_cancel()
-
-        elif self.fs == "96k":
-            player.play_audio(paths["dynamic_range_file"]["96k"])
-            time.sleep(30)
-            player.app_cancel()
-
-    def measurement_recorder_files(self):
-        player = audioFilePlay()
-        if self.fs == "48k":
-            player.play_audio(paths["measurement_recorder_files"]["48k"][0])
-            time.sleep(403)
-            player.app_cancel()
-
-            player.play_audio(paths["measurement_recorder_files"]["48k"][1])
-            time.sleep(303)
-            player.app_cancel()
-
-        elif self.fs == "96k":
-            player.play_audio(paths["measurement_recorder_files"]["96k"][0])
-            time.sleep(403)
-            player.app_cancel()
-
-            player.play_audio(paths["measurement_recorder_files"]["96k"][1])
-            time.sleep(306)
-            player.app_cancel()
-
     def run_sequence(self):
-        self.generate_report()
-
-        DNR_thread = threading.Thread(target=self.dynamic_range)
-        DNR_player_thread = threading.Thread(target=self.dynamic_range_files)
+        # Playback and measurement run as asyncio task pairs (capture_orchestrator):
+        # scheduled offsets, timeouts, and either side failing stops the other.
+        from capture_orchestrator import run_capture
 
-        DNR_player_thread.start()
-        time.sleep(10)
-        DNR_thread.start()
-
-        DNR_player_thread.join()
-        DNR_thread.join()
-
-        recorder_thread = threading.Thread(target=self.measurement_recorder)
-        player_thread = threading.Thread(target=self.measurement_recorder_files)
-
-        recorder_thread.start()
-        player_thread.start()
-
-        recorder_thread.join()
-        player_thread.join()
+        run_capture(self)
 
 
 class audioQualityFileAnalyze:
-    def __init__(self, APx, fs):
+    def __init__(self, APx, fs, headless=False):
         self.APx = APx
         self.fs = fs
+        self.headless = headless
+        self.paths = load_paths()
 
-        segment_folder = paths["segment_result_folder"][self.fs]
+        segment_folder = self.paths["segment_result_folder"][self.fs]
         self.freq_sweep_files = [f"{segment_folder}/{self.fs}_freq_sweep.wav"]
         self.multitone_files = sorted(
             glob.glob(f"{segment_folder}/{self.fs}_multitone_*.wav")
         )
 
     def choose_files(self, measurement_name: str, wav_file_path: list):
-        measurement = self.APx.Sequence.GetMeasurement(
-            "AudioQuality_FileAnalyze", measurement_name
-        )
-        measurement.Checked = True
-        measurement.Show()
-
+        # The caller has already checked and shown (activated) the measurement.
         if measurement_name == f"{self.fs}Hz_Stepped Frequency Sweep":
             setting = self.APx.SteppedFrequencySweep.FileAnalysisSettings
             setting.WavFiles = wav_file_path
@@ -152,37 +122,7 @@ class audioQualityFileAnalyze:
             self.APx.MultitoneAnalyzer.AnalyzeFiles = True
 
     def export_freq_sweep_graph(self):
-        os.makedirs(paths["graph_folder"].get(self.fs), exist_ok=True)
-        exportRMS = self.APx.SteppedFrequencySweep.Level
-        exportRMS.Checked = True
-        exportRMS.Show()
-        exportRMS.Save(
-            f"{paths["graph_folder"].get(self.fs)}/sweep_RMSLevel.png",
-            GraphImageType.PNG,
-        )
-
-        exportRelative = self.APx.SteppedFrequencySweep.RelativeLevel
-        exportRelative.Checked = True
-        exportRelative.Show()
-        exportRelative.Save(
-            f"{paths["graph_folder"].get(self.fs)}/sweep_RelativeLevel.png",
-            GraphImageType.PNG,
-        )
-
-        exportPhase = self.APx.SteppedFrequencySweep.Phase
-        exportPhase.Checked = True
-        exportPhase.Show()
-        exportPhase.Save(
-            f"{paths["graph_folder"].get(self.fs)}/sweep_Phase.png", GraphImageType.PNG
-        )
-
-        exportThdNRatio = self.APx.SteppedFrequencySweep.ThdNRatio
-        exportThdNRatio.Checked = True
-        exportThdNRatio.Show()
-        exportThdNRatio.Save(
-            f"{paths["graph_folder"].get(self.fs)}/sweep_ThdNRatio.png",
-            GraphImageType.PNG,
-        )
+        export_results(self.APx, "SteppedFrequencySweep", self.paths, self.fs, self.headless)
 
     def freq_sweep(self):
         measurement_name = f"{self.fs}Hz_Stepped Frequency Sweep"
@@ -195,31 +135,9 @@ class audioQualityFileAnalyze:
         freq_sweep.Run()
         self.export_freq_sweep_graph()
 
-    def export_csv(self):
-        exportStep = self.APx.MultitoneAnalyzer.FFTSpectrum
-        exportStep.Checked = True
-        exportStep.Show()
-        exportStep.ExportData(
-            f"{paths["report_folder"]}/{self.fs}_raw_data.csv", "All Points"
-        )
-
-    def export_multitone_graph(self):
-        os.makedirs(paths["graph_folder"].get(self.fs), exist_ok=True)
-        exportFFT = self.APx.MultitoneAnalyzer.FFTSpectrum
-        exportFFT.Checked = True
-        exportFFT.Show()
-        exportFFT.Save(
-            f"{paths["graph_folder"].get(self.fs)}/multitone_RelativeLevel_FFT.png",
-            GraphImageType.PNG,
-        )
-
-        exportRelative = self.APx.MultitoneAnalyzer.RelativeLevel
-        exportRelative.Checked = True
-        exportRelative.Show()
-        exportRelative.Save(
-            f"{paths["graph_folder"].get(self.fs)}/multitone_RelativeLevel.png",
-            GraphImageType.PNG,
-        )
+    def export_multitone(self):
+        # FFTSpectrum CSV and both graphs in one pass over the results.
+        export_results(self.APx, "MultitoneAnalyzer", self.paths, self.fs, self.headless)
 
     def multitone_analyzer(self):
         measurement_name = f"{self.fs}Hz_Multitone Analyzer"
@@ -230,14 +148,170 @@ class audioQualityFileAnalyze:
         analyzer.Show()
         self.choose_files(measurement_name, self.multitone_files)
         analyzer.Run()
-        self.export_csv()
-        self.export_multitone_graph()
+        self.export_multitone()
 
     def run_sequence(self):
         self.freq_sweep()
         self.multitone_analyzer()
 
 
+def open_stage_cache(cache_dir):
+    if not cache_dir:
+        return None
+    from stage_cache import stageCache
+
+    return stageCache(cache_dir)
+
+
+def file_analyze(APx, fs, headless=False, cache_dir=None):
+    import wav_io
+    from stage_cache import run_cached
+
+    # Built when the stage runs so it picks up the segments split just before.
+    analyzer = audioQualityFileAnalyze(APx, fs, headless)
+    measurements = ["SteppedFrequencySweep", "MultitoneAnalyzer"]
+    outputs = [path for m in measurements for path in export_files(m, analyzer.paths, fs)]
+    run_cached(
+        open_stage_cache(cache_dir),
+        f"analyze_{fs}",
+        analyzer.run_sequence,
+        inputs=analyzer.freq_sweep_files + analyzer.multitone_files + [analyzer.paths["project_path"], wav_io.__file__],
+        params={"exports": {m: EXPORT_MANIFEST[m] for m in measurements}, "outputs": outputs},
+        outputs=lambda _: outputs,
+    )
+
+
+def offline_file_analyze(fs, folder="", cache_dir=None):
+    import wav_io
+    import multitone_offline
+    import sweep_offline
+    from results_store import record_results, sweep_rows
+    from stage_cache import run_cached
+
+    paths = load_paths()
+    cache = open_stage_cache(cache_dir)
+    sweep_file, outputs = sweep_offline.sweep_files(fs, paths)
+    table, skipped = run_cached(
+        cache,
+        f"sweep_{fs}",
+        sweep_offline.analyze_sweep,
+        (fs, paths),
+        inputs=[sweep_file, sweep_offline.__file__, wav_io.__file__],
+        params={"profile": sweep_offline.SWEEP_PROFILES[fs], "outputs": outputs},
+        outputs=lambda _: outputs,
+    )
+    if not skipped:
+        # A skipped stage has nothing new to record.
+        record_results(results_db(paths), "sweep", fs, sweep_rows(table), folder, sweep_file)
+
+    csv_file = paths["csv_raw_data_files"][fs]
+    run_cached(
+        cache,
+        f"multitone_{fs}",
+        multitone_offline.analyze_segments,
+        (fs, paths),
+        inputs=multitone_offline.segment_files(fs, paths) + [multitone_offline.__file__, wav_io.__file__],
+        params={"fft_size": multitone_offline.FFT_SIZE, "window": "blackmanharris", "csv": csv_file},
+        outputs=lambda _: [csv_file],
+    )
+
+
+def split_stage(fs, recording_file, paths, cache_dir=None):
+    import wav_io
+    import tone_splitter
+    import stimulus_align
+    from stage_cache import run_cached
+
+    prefix, output_dir = tone_splitter.output_target(recording_file, paths)
+    stimuli = [f for f in stimulus_align.stimulus_files(paths, prefix) or [] if os.path.exists(f)]
+    segments, _ = run_cached(
+        open_stage_cache(cache_dir),
+        f"split_{fs}",
+        tone_splitter.split_recording,
+        (recording_file, paths),
+        inputs=[recording_file, tone_splitter.__file__, wav_io.__file__, stimulus_align.__file__] + stimuli,
+        params={"options": tone_splitter.split_options(paths), "output_dir": output_dir, "stimuli": stimuli},
+        outputs=lambda files: files,
+        keep_result=True,
+    )
+    return segments
+
+
+def csv_stage(fs, csv_files, db=None, folder="", cache_dir=None):
+    import csv_analyze
+    import fft_csv_cache
+    from stage_cache import run_cached
+
+    batch, skipped = run_cached(
+        open_stage_cache(cache_dir),
+        f"csv_{fs}",
+        csv_analyze.run,
+        (fs, csv_files, True, db, folder),
+        inputs=csv_files + [csv_analyze.__file__, fft_csv_cache.__file__],
+        params={"profile": csv_analyze.RATE_PROFILES[fs]},
+        keep_result=True,
+    )
+    if skipped:
+        csv_analyze.print_batch(csv_analyze.multitoneAnalysis(fs), batch)
+    return batch
+
+
+def results_db(paths):
+    # One database for every customer folder, so runs can be compared across them.
+    from results_store import RESULTS_DB
+
+    return paths.get("results_db", RESULTS_DB)
+
+
+def build_pipeline(APx, rates, steps, offline=False, headless=False, folder="", force=False):
+    """capture -> split -> file-analyze -> csv-analyze for every rate as one dependency graph.
+
+    Capture needs the APx and the phone and file analysis needs the APx, so
+    those stay serialized; splitting and CSV analysis run in worker processes
+    and overlap the next rate's capture. With `offline`, file analysis runs
+    in NumPy (sweep_offline + multitone_offline) and does not hold the APx.
+    Sweep and multitone results are recorded in the results store under `folder`.
+
+    Split, file-analyze and csv-analyze are skipped when their input files
+    (by content), parameters and code are unchanged since their last run
+    and their outputs are still in place (stage_cache); `force` runs them all.
+    """
+    paths = load_paths()
+    cache_dir = None if force else os.path.join(paths["report_folder"], ".stage_cache")
+    scheduler = stageScheduler()
+    for fs in rates:
+        deps = []
+        if 1 in steps:
+            tester = audioQualityEvkI2s(APx, fs, headless)
+            deps = [scheduler.add(f"capture_{fs}", tester.run_sequence, resources={"apx", "phone"})]
+        if 2 in steps:
+            deps = [
+                scheduler.add(
+                    f"split_{fs}",
+                    split_stage,
+                    (fs, paths["recording_file"][fs], paths, cache_dir),
+                    deps=deps,
+                    process=True,
+                )
+            ]
+        if 3 in steps and offline:
+            # multitone_offline runs its own process pool across the segment files.
+            deps = [scheduler.add(f"analyze_{fs}", offline_file_analyze, (fs, folder, cache_dir), deps=deps)]
+        elif 3 in steps:
+            deps = [
+                scheduler.add(f"analyze_{fs}", file_analyze, (APx, fs, headless, cache_dir), deps=deps, resources={"apx"})
+            ]
+        if 4 in steps:
+            scheduler.add(
+                f"csv_{fs}",
+                csv_stage,
+                (fs, [paths["csv_raw_data_files"][fs]], results_db(paths), folder, cache_dir),
+                deps=deps,
+                process=True,
+            )
+    return scheduler
+
+
 def insert_folder(path, folder_name):
     return path.replace("audio_report/", f"audio_report/{folder_name}/")
 
@@ -255,22 +329,29 @@ def make_dirs(paths_dict):
             os.makedirs(parent_dir, exist_ok=True)
 
 
-if __name__ == "__main__":
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Audio Quality Test")
     parser.add_argument(
         "--fs",
         type=str,
         choices=["48k", "96k"],
-        default="48k",
-        help="Sampling rate (48k or 96k)",
+        nargs="+",
+        default=["48k"],
+        help="Sampling rate(s) (48k and/or 96k); several rates run as one overlapping pipeline",
     )
     parser.add_argument(
         "--step",
         type=int,
-        choices=[1, 2, 3],
+        choices=[1, 2, 3, 4],
         nargs="*",
-        default=[1, 2, 3],
-        help="Select function(s) to run: 1=audioQualityEvkI2s, 2=manual+silenceSplitter, 3=audioQualityFileAnalyze",
+        default=[1, 2, 3, 4],
+        help="Select function(s) to run: 1=audioQualityEvkI2s, 2=recordingSplitter, 3=audioQualityFileAnalyze, 4=csv_analyze",
+    )
+    parser.add_argument(
+        "--paths",
+        type=str,
+        default=None,
+        help="Paths JSON (default: $AUDIO_QUALITY_PATHS or audio_quality_paths.json)",
     )
     parser.add_argument(
         "--folder",
@@ -278,8 +359,40 @@ if __name__ == "__main__":
         required=False,
         help="Create a folder based on the customer name",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Step 3 analyzes the sweep and multitone segments with NumPy instead of the APx",
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Keep the APx window hidden and skip the Show() before every graph export",
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        help="Record every APx API call (latency and arguments) to this JSON file",
+    )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        help="Replay a recorded trace instead of driving the APx (no APx DLLs needed)",
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        help="Divide the recorded latencies by this factor during --replay (0 = no delays)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-run split/analyze/csv stages even when their inputs and parameters are unchanged",
+    )
+    args = parser.parse_args(argv)
 
+    paths = load_paths(args.paths)
     if args.folder:
         paths["report_folder"] = os.path.join(paths["report_folder"], args.folder)
         for key in [
@@ -292,20 +405,22 @@ if __name__ == "__main__":
                 paths[key][file] = insert_folder(paths[key][file], args.folder)
         make_dirs(paths)
 
-    APx = project_init(paths["project_path"])
-
-    if 1 in args.step:
-        tester = audioQualityEvkI2s(APx, args.fs)
-        tester.run_sequence()
+    trace = apiTrace() if args.trace else None
+    if 1 in args.step or (3 in args.step and not args.offline):
+        APx = project_init(paths["project_path"], trace, args.replay, args.replay_speed, args.headless)
+    else:
+        APx = None
 
-    if 2 in args.step:
-        recording_file_path = paths["recording_file"][args.fs]
-        manual = manualSplitter(recording_file_path, paths)
-        remaining_path = manual.split_sweep_only()
+    pipeline = build_pipeline(APx, args.fs, args.step, args.offline, args.headless, args.folder or "", args.force)
+    try:
+        pipeline.run()
+    finally:
+        if trace is not None:
+            trace.save(args.trace)
+            trace.print_summary()
+        if args.replay and APx is not None and APx.missing:
+            print(f"⚠️ {len(APx.missing)} API call(s) were not in the trace: {APx.missing[:5]}")
 
-        silence = silenceSplitter(remaining_path, paths)
-        silence.pydub_split()
 
-    if 3 in args.step:
-        analyzer = audioQualityFileAnalyze(APx, args.fs)
-        analyzer.run_sequence()
+if __name__ == "__main__":
+    main()
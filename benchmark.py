@@ -0,0 +1,1016 @@
+import os
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import io
+import sys
+import json
+import time
+import wave
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tracemalloc
+import contextlib
+import numpy as np
+import pandas as pd
+import csv_analyze
+import tone_splitter
+import multitone_offline
+import spectrogramDraw
+import waveform_overview
+import find_peak_open_src
+import peak_detect
+import stimulus_align
+import tempfile
+from wav_io import wavInfo, read_frames
+from fft_csv_cache import load_columns, load_fft_csv
+
+BASELINE_FILE = "benchmark_baseline.json"
+
+# Every size is a full fixture set; larger sizes are what show scaling problems.
+SIZES = {
+    "small": {"sweep_s": 10, "bursts": 4, "long_s": 15, "csv_files": 1},
+    "medium": {"sweep_s": 40, "bursts": 16, "long_s": 60, "csv_files": 2},
+    "large": {"sweep_s": 160, "bursts": 64, "long_s": 240, "csv_files": 4},
+}
+BURST_S = 2.0
+GAP_S = 1.5
+NOISE_FLOOR = 1e-5
+CHUNK_S = 10
+
+
+def multitone_freqs(fs):
+    """Bin-centred tone frequencies for a rate profile; the checked tone sits on the first expected bin."""
+    profile = csv_analyze.RATE_PROFILES[fs]
+    bin_width = profile["fs"] / profile["fft_size"]
+    check_freq = profile["expected_bins"][0] * bin_width
+    low = profile["band_hz"][0] * 25
+    freqs = np.geomspace(low, check_freq, profile["check_tone"] + 1)
+    extra = check_freq + 500 * np.arange(1, profile["num_tones"] - profile["check_tone"])
+    return np.rint(np.concatenate([freqs, extra]) / bin_width) * bin_width
+
+
+def multitone_burst(fs, frames, channels, rng):
+    tones = multitone_freqs(fs)
+    t = np.arange(frames) / csv_analyze.RATE_PROFILES[fs]["fs"]
+    amplitude = 0.5 / len(tones)
+    burst = np.empty((frames, channels))
+    for ch in range(channels):
+        phases = rng.uniform(0, 2 * np.pi, len(tones))
+        burst[:, ch] = amplitude * np.sin(2 * np.pi * tones[:, None] * t + phases[:, None]).sum(axis=0)
+    return burst
+
+
+def log_sweep(framerate, seconds, channels, f0=20.0, f1=20000.0):
+    """Yield a -6 dBFS logarithmic sweep in CHUNK_S blocks."""
+    total = int(seconds * framerate)
+    rate = seconds / np.log(f1 / f0)
+    for start in range(0, total, CHUNK_S * framerate):
+        t = np.arange(start, min(total, start + CHUNK_S * framerate)) / framerate
+        block = 0.5 * np.sin(2 * np.pi * f0 * rate * (np.exp(t / rate) - 1))
+        yield np.repeat(block[:, None], channels, axis=1)
+
+
+def to_pcm24(samples):
+    pcm = np.rint(np.clip(samples, -1, 1 - 2**-23) * 2**23).astype("<i4")
+    return pcm.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+
+
+def write_wav(path, framerate, channels, blocks):
+    """Write 24-bit PCM from an iterable of (frames, channels) float blocks."""
+    tmp_path = f"{path}.tmp"
+    with wave.open(tmp_path, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(3)
+        w.setframerate(framerate)
+        for block in blocks:
+            w.writeframes(to_pcm24(block))
+    os.replace(tmp_path, path)
+    return path
+
+
+class fixtureSet:
+    """Deterministic synthetic inputs, generated on first use and reused from `root`."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def recording(self, fs, size):
+        """Sweep followed by silence-separated multitone bursts, like a step 1 recording."""
+        params = SIZES[size]
+        path = self._path(f"{fs}_recording_{params['sweep_s']}s_{params['bursts']}b.wav")
+        if os.path.exists(path):
+            return path
+
+        framerate = csv_analyze.RATE_PROFILES[fs]["fs"]
+        rng = np.random.default_rng(1)
+        burst = multitone_burst(fs, int(BURST_S * framerate), 2, rng)
+
+        def blocks():
+            yield from log_sweep(framerate, params["sweep_s"], 2)
+            for _ in range(params["bursts"]):
+                yield rng.normal(0, NOISE_FLOOR, (int(GAP_S * framerate), 2))
+                yield burst + rng.normal(0, NOISE_FLOOR, burst.shape)
+            yield rng.normal(0, NOISE_FLOOR, (int(GAP_S * framerate), 2))
+
+        return write_wav(path, framerate, 2, blocks())
+
+    def stimuli(self, fs, size):
+        """The sweep and multitone stimulus files `recording(fs, size)` was made from, as step 2 alignment reads them."""
+        params = SIZES[size]
+        sweep = self._path(f"{fs}_stimulus_sweep_{params['sweep_s']}s.wav")
+        multitone = self._path(f"{fs}_stimulus_multitone_{params['bursts']}b.wav")
+        framerate = csv_analyze.RATE_PROFILES[fs]["fs"]
+        if not os.path.exists(sweep):
+            write_wav(sweep, framerate, 2, log_sweep(framerate, params["sweep_s"], 2))
+        if not os.path.exists(multitone):
+            burst = multitone_burst(fs, int(BURST_S * framerate), 2, np.random.default_rng(1))
+            gap = np.zeros((int(GAP_S * framerate), 2))
+            write_wav(multitone, framerate, 2, [block for _ in range(params["bursts"]) for block in (gap, burst)] + [gap])
+        return [sweep, multitone]
+
+    def long_wav(self, size):
+        """Long 96 kHz 24-bit multitone file."""
+        seconds = SIZES[size]["long_s"]
+        path = self._path(f"96k_long_{seconds}s.wav")
+        if os.path.exists(path):
+            return path
+
+        framerate = csv_analyze.RATE_PROFILES["96k"]["fs"]
+        rng = np.random.default_rng(2)
+        block = multitone_burst("96k", CHUNK_S * framerate, 2, rng)
+        chunks = -(-seconds // CHUNK_S)
+        return write_wav(path, framerate, 2, (block for _ in range(chunks)))
+
+    def segments(self, fs, size):
+        """Output folder of recordingSplitter for `recording(fs, size)`."""
+        params = SIZES[size]
+        folder = self._path(f"{fs}_segments_{params['sweep_s']}s_{params['bursts']}b")
+        if not os.path.isdir(folder):
+            paths = {"segment_result_folder": {fs: f"{folder}.tmp"}}
+            with contextlib.redirect_stdout(io.StringIO()):
+                tone_splitter.recordingSplitter(self.recording(fs, size), paths).split(
+                    sweep_end=params["sweep_s"] * 1000
+                )
+            os.replace(f"{folder}.tmp", folder)
+        return folder
+
+    def fft_csvs(self, fs, size, n_channels=16):
+        """APx "All Points"-style FFT exports with `n_channels` frequency/dBFS column pairs."""
+        profile = csv_analyze.RATE_PROFILES[fs]
+        points = profile["fft_size"] // 2
+        bin_width = profile["fs"] / profile["fft_size"]
+        tone_bins = np.rint(multitone_freqs(fs) / bin_width).astype(int)
+        freq = np.arange(points) * bin_width
+
+        files = []
+        for index in range(SIZES[size]["csv_files"]):
+            path = self._path(f"{fs}_raw_data_{index + 1}.csv")
+            files.append(path)
+            if os.path.exists(path):
+                continue
+
+            rng = np.random.default_rng(100 + index)
+            labels, columns = [], []
+            for ch in range(n_channels):
+                level = rng.normal(-140, 3, points)
+                level[tone_bins] = -30 + rng.normal(0, 0.5, len(tone_bins))
+                # Window skirts either side of each tone.
+                level[tone_bins - 1] = level[tone_bins] - 6
+                level[tone_bins + 1] = level[tone_bins] - 6
+                labels += [f"Ch{ch + 1} Frequency (Hz)", f"Ch{ch + 1} Level (dBFS)"]
+                columns += [freq, level]
+
+            with open(f"{path}.tmp", "w", newline="") as f:
+                f.write("FFT Spectrum\nAll Points\nSynthetic fixture\n\n")
+                pd.DataFrame(np.array(columns).T, columns=labels).to_csv(f, index=False, float_format="%.5f")
+            os.replace(f"{path}.tmp", path)
+        return files
+
+    def clean(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class benchmarkCase:
+    def __init__(self, name, setup, func, sizes=tuple(SIZES)):
+        """`setup(fixtures, size, workdir)` returns the args for `func`; only `func` is timed."""
+        self.name = name
+        self.setup = setup
+        self.func = func
+        self.sizes = sizes
+
+
+def _split(info, start):
+    return tone_splitter.split_frame_ranges(info, start=start)
+
+
+def _split_setup(fixtures, size, workdir):
+    info = wavInfo(fixtures.recording("48k", size))
+    return info, SIZES[size]["sweep_s"] * info.framerate
+
+
+def _recording_split(audio_path, paths, sweep_end):
+    return tone_splitter.recordingSplitter(audio_path, paths).split(sweep_end=sweep_end)
+
+
+def _recording_split_setup(fixtures, size, workdir):
+    paths = {"segment_result_folder": {"48k": os.path.join(workdir, "segments")}}
+    return fixtures.recording("48k", size), paths, SIZES[size]["sweep_s"] * 1000
+
+
+def _manual_split(audio_path, paths, sweep_end):
+    return tone_splitter.manualSplitter(audio_path, paths).split_sweep_only(sweep_end=sweep_end)
+
+
+def _silence_split(audio_path, paths):
+    return tone_splitter.silenceSplitter(audio_path, paths).split()
+
+
+def _pydub_split(audio_path, paths):
+    return tone_splitter.silenceSplitter(audio_path, paths).pydub_split()
+
+
+def _pydub_split_setup(fixtures, size, workdir):
+    # pydub_split expects the multitone-only file that manualSplitter leaves behind.
+    info = wavInfo(fixtures.recording("48k", size))
+    multitone = os.path.join(workdir, "48k_recording_multitone.wav")
+    tone_splitter.copy_frames(info, multitone, SIZES[size]["sweep_s"] * info.framerate, info.nframes)
+    paths = {"segment_result_folder": {"48k": os.path.join(workdir, "segments")}}
+    return multitone, paths
+
+
+def _stimulus_align(info, stimuli):
+    return stimulus_align.stimulus_cut_ranges(info, stimuli)
+
+
+def _stimulus_align_setup(fixtures, size, workdir):
+    return wavInfo(fixtures.recording("96k", size)), fixtures.stimuli("96k", size)
+
+
+def _ms_energy(info):
+    return tone_splitter.ms_energy(info)
+
+
+def _long_setup(fixtures, size, workdir):
+    return (wavInfo(fixtures.long_wav(size)),)
+
+
+def _overview_build(info):
+    return waveform_overview.build_pyramid(info)
+
+
+def _overview_view(overview):
+    # Full view, a split boundary and a zoom below one bucket.
+    return [overview.view(0, None, 1600), overview.view(5, 7, 1600), overview.view(5, 5.01, 1600)]
+
+
+def _overview_view_setup(fixtures, size, workdir):
+    return (waveform_overview.waveformOverview.load(fixtures.long_wav(size), cache_dir=workdir),)
+
+
+def _csv_parse(csv_files):
+    return csv_analyze.multitoneAnalysis("48k").analyze_files(csv_files, use_cache=False)
+
+
+def _csv_cached(csv_files):
+    return csv_analyze.multitoneAnalysis("48k").analyze_files(csv_files, use_cache=True)
+
+
+def _csv_setup(fixtures, size, workdir):
+    return (fixtures.fft_csvs("48k", size),)
+
+
+def _csv_cached_setup(fixtures, size, workdir):
+    csv_files = fixtures.fft_csvs("48k", size)
+    for csv_file in csv_files:
+        load_columns(csv_file)
+    return (csv_files,)
+
+
+def _spectra_setup(fixtures, size, workdir):
+    freqs, dbfss = zip(*(load_fft_csv(f) for f in fixtures.fft_csvs("48k", size)))
+    return np.concatenate(freqs), np.concatenate(dbfss)
+
+
+def _select_peaks(freq, dbfs):
+    profile = csv_analyze.RATE_PROFILES["48k"]
+    return csv_analyze.select_peaks(
+        freq, dbfs, profile["num_tones"], profile["min_spacing_hz"], *profile["band_hz"]
+    )
+
+
+def _findpeaks(freq, dbfs):
+    return [find_peak_open_src.findpeaks(np.asarray(d, dtype=np.float64), spacing=50) for d in dbfs]
+
+
+# 262144-bin spectra at the 48k FFT bin width; 50 Hz spacing is 273 bins.
+PEAK_BINS = 262144
+PEAK_SPACING_HZ = 50
+
+
+def peak_spectra(channels, seed=7):
+    """(freq, dbfs) with `channels` rows of noise around -140 dBFS and the 48k multitone tones with skirts."""
+    profile = csv_analyze.RATE_PROFILES["48k"]
+    bin_width = profile["fs"] / profile["fft_size"]
+    freq = np.arange(PEAK_BINS) * bin_width
+    tone_bins = np.rint(multitone_freqs("48k") / bin_width).astype(int)
+    rng = np.random.default_rng(seed)
+    dbfs = rng.normal(-140, 3, (channels, PEAK_BINS))
+    dbfs[:, tone_bins] = -30 + rng.normal(0, 0.5, (channels, len(tone_bins)))
+    dbfs[:, tone_bins - 1] = dbfs[:, tone_bins] - 6
+    dbfs[:, tone_bins + 1] = dbfs[:, tone_bins] - 6
+    return freq, dbfs
+
+
+def _peaks_262k_setup(fixtures, size, workdir):
+    return peak_spectra(4 * SIZES[size]["csv_files"])
+
+
+def _findpeaks_262k(freq, dbfs):
+    spacing = peak_detect.spacing_bins(freq, PEAK_SPACING_HZ)
+    return [find_peak_open_src.findpeaks(d, spacing=spacing) for d in dbfs]
+
+
+def _sliding_peaks_262k(freq, dbfs):
+    return peak_detect.findpeaks(dbfs, freq=freq, spacing_hz=PEAK_SPACING_HZ)
+
+
+def _detect_peaks_262k(freq, dbfs):
+    mpd = peak_detect.spacing_bins(freq, PEAK_SPACING_HZ)
+    return [find_peak_open_src.detect_peaks(d, mpd=mpd) for d in dbfs]
+
+
+def _sliding_detect_262k(freq, dbfs):
+    return peak_detect.detect_peaks(dbfs, mpd=peak_detect.spacing_bins(freq, PEAK_SPACING_HZ))
+
+
+def check_peaks(trials=2000, seed=3):
+    """peak_detect against the find_peak_open_src originals; returns a list of mismatch descriptions.
+
+    Random walks and white noise of random length, some with NaNs, plus the
+    262144-bin benchmark spectra. Equal heights are left out of the
+    detect_peaks comparison: its unstable sort picks any of them.
+    """
+    rng = np.random.default_rng(seed)
+    failures = []
+    for trial in range(trials):
+        n = int(rng.integers(3, 400))
+        x = rng.standard_normal(n).cumsum() if trial % 2 else rng.standard_normal(n)
+        ties = trial % 5 == 0
+        if ties:
+            x = np.round(x)
+        if trial % 7 == 0:
+            x[rng.integers(0, n, 3)] = np.nan
+        spacing = int(rng.integers(1, 20))
+        limit = None if trial % 3 else 0.0
+        if not np.array_equal(find_peak_open_src.findpeaks(x, spacing, limit), peak_detect.findpeaks(x, spacing, limit)):
+            failures.append(f"findpeaks trial {trial} (n={n}, spacing={spacing}, limit={limit})")
+        if ties:
+            continue
+        mph = None if trial % 4 else 0.0
+        mpd = int(rng.integers(1, 30))
+        threshold = 0 if trial % 6 else 0.2
+        expected = find_peak_open_src.detect_peaks(x, mph, mpd, threshold)
+        if not np.array_equal(expected, peak_detect.detect_peaks(x, mph, mpd, threshold)):
+            failures.append(f"detect_peaks trial {trial} (n={n}, mph={mph}, mpd={mpd}, threshold={threshold})")
+
+    freq, dbfs = peak_spectra(4)
+    for name, expected, actual in (
+        ("findpeaks 262k", _findpeaks_262k(freq, dbfs), _sliding_peaks_262k(freq, dbfs)),
+        ("detect_peaks 262k", _detect_peaks_262k(freq, dbfs), _sliding_detect_262k(freq, dbfs)),
+    ):
+        for ch, (a, b) in enumerate(zip(expected, actual)):
+            if not np.array_equal(a, b):
+                failures.append(f"{name} Ch{ch + 1}: {len(a)} vs {len(b)} peaks")
+    return failures
+
+
+def _spectrum(audio_path, workdir):
+    spectrogramDraw.analyze_audio_spectrum(audio_path, output=os.path.join(workdir, "spectrum_analysis.png"))
+
+
+def _spectrogram(audio_path, workdir):
+    times, freq, dbfs = spectrogramDraw.stft_spectrogram(audio_path)
+    spectrogramDraw.render_spectrogram(times, freq, dbfs, os.path.join(workdir, "spectrogram.png"))
+
+
+def _spectrum_setup(fixtures, size, workdir):
+    return os.path.abspath(fixtures.recording("48k", size)), workdir
+
+
+def _offline_multitone(wav_files):
+    return [multitone_offline.segment_spectrum(f) for f in wav_files]
+
+
+def _offline_multitone_setup(fixtures, size, workdir):
+    folder = fixtures.segments("48k", size)
+    return (sorted(os.path.join(folder, f) for f in os.listdir(folder) if "_multitone_" in f),)
+
+
+CASES = [
+    benchmarkCase("split_frame_ranges", _split_setup, _split),
+    benchmarkCase("recording_split", _recording_split_setup, _recording_split),
+    benchmarkCase("manual_split", _recording_split_setup, _manual_split),
+    benchmarkCase("silence_split", _pydub_split_setup, _silence_split),
+    benchmarkCase("pydub_split", _pydub_split_setup, _pydub_split, sizes=("small", "medium")),
+    benchmarkCase("stimulus_align_96k", _stimulus_align_setup, _stimulus_align),
+    benchmarkCase("ms_energy_96k24", _long_setup, _ms_energy),
+    benchmarkCase("overview_build_96k24", _long_setup, _overview_build),
+    benchmarkCase("overview_view_96k24", _overview_view_setup, _overview_view),
+    benchmarkCase("csv_analyze_parse", _csv_setup, _csv_parse),
+    benchmarkCase("csv_analyze_cached", _csv_cached_setup, _csv_cached),
+    benchmarkCase("select_peaks", _spectra_setup, _select_peaks),
+    benchmarkCase("findpeaks_open_src", _spectra_setup, _findpeaks),
+    benchmarkCase("findpeaks_262k", _peaks_262k_setup, _findpeaks_262k),
+    benchmarkCase("peak_detect_262k", _peaks_262k_setup, _sliding_peaks_262k),
+    benchmarkCase("detect_peaks_262k", _peaks_262k_setup, _detect_peaks_262k),
+    benchmarkCase("peak_detect_mpd_262k", _peaks_262k_setup, _sliding_detect_262k),
+    benchmarkCase("spectrum_draw", _spectrum_setup, _spectrum),
+    benchmarkCase("spectrogram_draw", _spectrum_setup, _spectrogram),
+    benchmarkCase("multitone_offline", _offline_multitone_setup, _offline_multitone),
+]
+
+
+# Cold start of each entry point in a fresh interpreter. `forbidden` are the
+# heavy packages the code must not pull in; quick re-checks stay fast only
+# while they are loaded lazily by the stages that need them.
+HEAVY = ("numpy", "pandas", "matplotlib", "scipy", "pydub", "soundfile", "reportlab")
+IMPORT_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+{code}
+seconds = time.perf_counter() - start
+loaded = sorted(m for m in {forbidden!r} if m in sys.modules)
+print(json.dumps({{"seconds": seconds, "modules": len(sys.modules), "loaded": loaded}}))
+"""
+
+
+class importCase:
+    def __init__(self, name, code, forbidden=(), setup=None):
+        """`setup(fixtures)` returns extra command-line arguments for `code` (read from sys.argv[1:])."""
+        self.name = name
+        self.code = code
+        self.forbidden = forbidden
+        self.setup = setup
+
+
+def _csv_warm_setup(fixtures):
+    csv_files = [os.path.abspath(f) for f in fixtures.fft_csvs("48k", "small")]
+    for csv_file in csv_files:
+        load_columns(csv_file)
+    return csv_files
+
+
+IMPORT_CASES = [
+    importCase("import_cli", "import audio_quality_cli", HEAVY),
+    importCase("import_audio_quality_test", "import audio_quality_test", ("pandas", "matplotlib", "scipy", "pydub", "soundfile")),
+    importCase("import_csv_analyze", "import csv_analyze", ("pandas", "matplotlib", "scipy")),
+    importCase("import_tone_splitter", "import tone_splitter", ("pandas", "matplotlib", "scipy", "pydub", "soundfile")),
+    importCase("import_waveform_overview", "import waveform_overview", ("pandas", "matplotlib")),
+    importCase(
+        "csv_rerun_cached",
+        "import audio_quality_cli; audio_quality_cli.main(['csv', '--csv'] + sys.argv[1:])",
+        ("pandas", "matplotlib", "scipy"),
+        _csv_warm_setup,
+    ),
+]
+
+
+def measure_import(case, argv, repeat):
+    """Best wall time of `case.code` over `repeat` fresh interpreters, with the module count and forbidden imports."""
+    probe = IMPORT_PROBE.format(code=case.code, forbidden=tuple(case.forbidden))
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", probe, *argv],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        "seconds": round(min(r["seconds"] for r in runs), 4),
+        "modules": runs[0]["modules"],
+        "loaded": runs[0]["loaded"],
+    }
+
+
+def run_imports(case_names=None, repeat=5, fixture_dir="bench_fixtures"):
+    """Time the import cases; returns (results, violations) where violations name forbidden imports."""
+    fixtures = fixtureSet(fixture_dir)
+    results = {}
+    violations = []
+    for case in IMPORT_CASES:
+        if case_names and case.name not in case_names:
+            continue
+        argv = case.setup(fixtures) if case.setup else []
+        result = measure_import(case, argv, repeat)
+        loaded = result.pop("loaded")
+        results[case.name] = {"cold": result}
+        print(f"{case.name:<26} {result['seconds']:>8.4f} s  {result['modules']:>5} modules")
+        if loaded:
+            violations.append((case.name, loaded))
+            print(f"❌ {case.name} loads {', '.join(loaded)}")
+    return results, violations
+
+
+def check_alignment(pre_roll_s=2.3456, gap_s=0.789, seed=4):
+    """stimulus_align on a recording with an odd pre-roll and gap; returns a list of mismatch descriptions.
+
+    Same clock on both sides, so every cut has to be exact to the frame.
+    """
+    fixtures = fixtureSet(tempfile.mkdtemp(prefix="align_check_"))
+    try:
+        sweep_path, multitone_path = fixtures.stimuli("48k", "small")
+        sweep, multitone = wavInfo(sweep_path), wavInfo(multitone_path)
+        pre, gap = int(pre_roll_s * sweep.framerate), int(gap_s * sweep.framerate)
+        rng = np.random.default_rng(seed)
+
+        def blocks():
+            yield rng.normal(0, NOISE_FLOOR, (pre, 2))
+            yield 0.5 * read_frames(sweep, 0, sweep.nframes, dtype=np.float64)
+            yield rng.normal(0, NOISE_FLOOR, (gap, 2))
+            yield 0.5 * read_frames(multitone, 0, multitone.nframes, dtype=np.float64)
+            yield rng.normal(0, NOISE_FLOOR, (sweep.framerate, 2))
+
+        recording = wavInfo(write_wav(fixtures._path("48k_shifted.wav"), sweep.framerate, 2, blocks()))
+        sweep_range = stimulus_align.active_ranges(sweep)
+        burst_offset = pre + sweep.nframes + gap
+        expected = [[pre + sweep_range[0][0], pre + sweep_range[-1][1]]] + [
+            [burst_offset + start, burst_offset + end] for start, end in stimulus_align.active_ranges(multitone)
+        ]
+        actual = stimulus_align.stimulus_cut_ranges(recording, [sweep_path, multitone_path])
+    finally:
+        fixtures.clean()
+
+    if len(actual) != len(expected):
+        return [f"stimulus_align found {len(actual)} ranges, expected {len(expected)}"]
+    return [
+        f"stimulus_align range {i}: {a} vs {e}" for i, (a, e) in enumerate(zip(actual, expected)) if a != e
+    ]
+
+
+def _stub_stage(seconds, result=None, fail=False):
+    time.sleep(seconds)
+    if fail:
+        raise RuntimeError("stub stage failed")
+    return result
+
+
+def check_scheduler(seconds=0.2):
+    """stageScheduler on stub stages; returns a list of failure descriptions.
+
+    Dependency order, overlap of independent stages, one stage at a time
+    per resource, a worker-process stage, failure propagation with the
+    skipping of dependent stages, and graph errors.
+    """
+    from stage_scheduler import stageScheduler
+
+    failures = []
+    scheduler = stageScheduler()
+    scheduler.add("a", _stub_stage, (seconds, "a"))
+    scheduler.add("b", _stub_stage, (seconds, "b"), deps=["a"], resources={"apx"})
+    scheduler.add("c", _stub_stage, (seconds, "c"), deps=["a"], process=True)
+    scheduler.add("d", _stub_stage, (seconds, "d"), deps=["a"], resources={"apx"})
+    scheduler.add("e", _stub_stage, (seconds, "e"), deps=["b", "c", "d"])
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = scheduler.run()
+    spans = {name: (start, end) for name, start, end in scheduler.timeline}
+    if results != {name: name for name in "abcde"}:
+        failures.append(f"scheduler results: {results}")
+    else:
+        for name in "bcde":
+            for dep in scheduler.stages[name].deps:
+                if spans[name][0] < spans[dep][1]:
+                    failures.append(f"scheduler started {name} before its dependency {dep} finished")
+        if not spans["c"][0] < spans["b"][1] and not spans["c"][0] < spans["d"][1]:
+            failures.append("scheduler did not overlap the independent stages c and b/d")
+        b, d = spans["b"], spans["d"]
+        if b[0] < d[1] and d[0] < b[1]:
+            failures.append("scheduler ran b and d together although both use the apx resource")
+
+    scheduler = stageScheduler()
+    scheduler.add("fail", _stub_stage, (seconds,), {"fail": True})
+    scheduler.add("child", _stub_stage, (seconds,), deps=["fail"])
+    scheduler.add("grandchild", _stub_stage, (seconds,), deps=["child"])
+    scheduler.add("independent", _stub_stage, (seconds, "independent"))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            scheduler.run()
+        failures.append("scheduler did not raise for a failed stage")
+    except RuntimeError:
+        pass
+    if list(scheduler.failed) != ["fail"] or scheduler.skipped != ["child", "grandchild"]:
+        failures.append(f"scheduler failed {list(scheduler.failed)}, skipped {scheduler.skipped}")
+    if scheduler.results != {"independent": "independent"}:
+        failures.append(f"scheduler independent branch: {scheduler.results}")
+
+    for deps in ({"x": ["y"], "y": ["x"]}, {"x": ["missing"]}):
+        scheduler = stageScheduler()
+        for name, stage_deps in deps.items():
+            scheduler.add(name, _stub_stage, (0,), deps=stage_deps)
+        try:
+            scheduler.run()
+            failures.append(f"scheduler accepted the graph {deps}")
+        except ValueError:
+            pass
+    return failures
+
+
+def _fake_phones(devices, play_s):
+    """fake_adb root scripted with `devices`, its adb command and a silent `play_s` stimulus to push."""
+    import fake_adb
+
+    root = tempfile.mkdtemp(prefix="fake_adb_")
+    fake_adb.setup(root, devices)
+    framerate = 48000
+    stimulus = write_wav(os.path.join(root, "tone.wav"), framerate, 2, [np.zeros((int(play_s * framerate), 2))])
+    return root, fake_adb.fake_adb_command(root), stimulus
+
+
+def check_playback(play_s=1.5, start_s=0.4):
+    """adb_command.playbackWatch through audioFilePlay and fake_adb.py; returns a list of failure descriptions.
+
+    The end of a playback behind a stale STOPPED state, the end of one
+    whose player releases its media session, and the start timeout of a
+    player that never plays.
+    """
+    import adb_command
+
+    root, adb, stimulus = _fake_phones(
+        {
+            "STALE": {"start_s": start_s, "play_s": play_s, "stale": True},
+            "RELEASE": {"start_s": 0.0, "play_s": play_s, "release": True},
+            "SILENT": {"start_s": 1e9},
+        },
+        play_s,
+    )
+    outcomes = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for serial, kwargs in (("STALE", {}), ("RELEASE", {}), ("SILENT", {"start_timeout": 1})):
+                player = adb_command.audioFilePlay(adb, adb_command.adbSession(adb, ["Music"], serial))
+                player.push(stimulus)
+                start = time.monotonic()
+                ok = player.play_audio("tone.wav") and player.wait_playback_end(poll_interval=0.1, **kwargs)
+                outcomes[serial] = (ok, time.monotonic() - start)
+                player.session.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    failures = []
+    ok, seconds = outcomes["STALE"]
+    if not ok or seconds < start_s + play_s:
+        failures.append(f"playback behind a stale STOPPED state ended={ok} after {seconds:.2f}s")
+    ok, seconds = outcomes["RELEASE"]
+    # The WAV-duration fallback would only end it 1 s after the track.
+    if not ok or seconds > play_s + 0.7:
+        failures.append(f"playback whose session is released ended={ok} after {seconds:.2f}s")
+    ok, seconds = outcomes["SILENT"]
+    if ok or not 1 <= seconds < 5:
+        failures.append(f"start timeout: ended={ok} after {seconds:.2f}s")
+    watch = adb_command.playbackWatch(None, start=0)
+    watch.check((adb_command.STATE_PLAYING, 0), 1)
+    if watch.check(None, 2) != (True, None, None):
+        failures.append("playbackWatch without a duration: a released session is not the end of playback")
+    return failures
+
+
+def check_adb(play_s=1.5):
+    """adb_command against fake_adb.py; returns a list of failure descriptions.
+
+    Device listing, shell output without a final newline, a stalled and a
+    vanished shell, and a devicePool running jobs on two phones at once.
+    `play_s` stays above the 1 s poll interval of play_job(), or no poll
+    would ever see the player PLAYING.
+    """
+    import adb_command
+
+    root, adb, stimulus = _fake_phones(
+        {
+            "FAKE1": {"start_s": 0.4, "play_s": play_s, "stale": True},
+            "FAKE2": {"start_s": 0.0, "play_s": play_s},
+            "FAKE3": {"state": "offline"},
+        },
+        play_s,
+    )
+    note = os.path.join(root, "note.txt")
+    with open(note, "w") as f:
+        f.write("no final newline")
+    failures = []
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            devices = adb_command.list_devices(adb)
+            player = adb_command.audioFilePlay(adb, adb_command.adbSession(adb, ["Music"], "FAKE1"))
+            player.push(note)
+            note_output = player.session.shell(f"cat {adb_command.adbSession.STORAGE_ROOT}/Music/note.txt", quiet=True)
+            player.session.close()
+
+            stalled = adb_command.adbSession(adb, ["Music"], "FAKE2", shell_timeout=1)
+            start = time.monotonic()
+            stall_output = stalled.shell("sleep 3", quiet=True)
+            stall_s = time.monotonic() - start
+            dropped = stalled.shell("disconnect", quiet=True)
+            recovered = stalled.shell(f"ls {adb_command.adbSession.STORAGE_ROOT}/Music", quiet=True)
+            stalled.close()
+
+            start = time.monotonic()
+            with adb_command.devicePool(adb, ["FAKE1", "FAKE2"], ["Music"]) as pool:
+                jobs = pool.map(adb_command.play_job, [("tone.wav", stimulus, "Music")] * 4)
+            pool_s = time.monotonic() - start
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if devices != ["FAKE1", "FAKE2"]:
+        failures.append(f"list_devices: {devices}")
+    if note_output != "no final newline\n":
+        failures.append(f"shell output without a final newline: {note_output!r}")
+    if stall_output is not None or stall_s > 2.5:
+        failures.append(f"stalled shell: {stall_output!r} after {stall_s:.2f}s (timeout 1s)")
+    if dropped is not None or recovered is None:
+        failures.append(f"shell after a disconnect: {dropped!r}, then {recovered!r}")
+    if not all(job["ok"] for job in jobs) or {job["serial"] for job in jobs} != {"FAKE1", "FAKE2"}:
+        failures.append(f"devicePool jobs: {[(job['serial'], job['ok']) for job in jobs]}")
+    elif pool_s > 0.8 * sum(job["seconds"] for job in jobs):
+        failures.append(f"devicePool ran the jobs one after another ({pool_s:.2f}s)")
+    return failures
+
+
+class _stubApx:
+    def __init__(self):
+        import threading
+
+        self.cancel = threading.Event()
+
+    def CancelOperation(self):
+        self.cancel.set()
+
+
+class _stubTester:
+    """The parts of audioQualityEvkI2s that captureOrchestrator uses; a measurement runs `seconds` or until CancelOperation()."""
+
+    fs = "48k"
+
+    def __init__(self, recorder_files, dnr_s, recorder_s):
+        self.APx = _stubApx()
+        self.paths = {"dynamic_range_file": {"48k": "tone.wav"}, "measurement_recorder_files": {"48k": recorder_files}}
+        self.dnr_s, self.recorder_s = dnr_s, recorder_s
+        self.cancelled = []
+
+    def generate_report(self):
+        pass
+
+    def run(self, name, seconds):
+        if self.APx.cancel.wait(seconds):
+            self.APx.cancel.clear()
+            self.cancelled.append(name)
+
+    def dynamic_range(self):
+        self.run("Dynamic Range", self.dnr_s)
+
+    def measurement_recorder(self):
+        self.run("Measurement Recorder", self.recorder_s)
+
+
+def check_orchestrator(play_s=1.5):
+    """captureOrchestrator on a stub tester and fake_adb.py; returns a list of failure descriptions.
+
+    The normal path ending both sides, a stimulus that cannot be played
+    cancelling the Measurement Recorder, and a DNR measurement timeout
+    stopping the phone.
+    """
+    import adb_command
+    from capture_orchestrator import ORCHESTRATION_DEFAULTS, run_capture
+
+    root, adb, stimulus = _fake_phones({"PHONE": {"start_s": 0.0, "play_s": play_s}}, play_s)
+    options = {**ORCHESTRATION_DEFAULTS, "dnr_settle": 0.1, "recorder_lead": 0.1, "start_timeout": 3, "cancel_timeout": 2}
+    cases = [
+        # name, recorder files, DNR seconds, recorder seconds, options, expected error, expected cancel
+        ("normal path", ["tone.wav"], 0.3, 30, options, None, ["Measurement Recorder"]),
+        ("play failure", ["missing.wav"], 0.3, 30, options, "Could not play", ["Measurement Recorder"]),
+        ("measurement timeout", ["tone.wav"], 30, 30, {**options, "dnr_timeout": 0.5}, "did not finish", ["Dynamic Range"]),
+    ]
+    failures = []
+    try:
+        session = adb_command.adbSession(adb, ["Music"], "PHONE")
+        with contextlib.redirect_stdout(io.StringIO()):
+            adb_command.audioFilePlay(adb, session).push(stimulus)
+            for name, files, dnr_s, recorder_s, case_options, error, cancelled in cases:
+                tester = _stubTester(files, dnr_s, recorder_s)
+                player = adb_command.asyncPlayer(adb, session=adb_command.adbSession(adb, ["Music"], "PHONE"))
+                start = time.monotonic()
+                try:
+                    run_capture(tester, player, case_options)
+                    raised = None
+                except RuntimeError as e:
+                    raised = str(e)
+                seconds = time.monotonic() - start
+                playing = adb_command.parse_playback_state(session.shell("dumpsys media_session", quiet=True))
+                if (raised is None) != (error is None) or (error and error not in raised):
+                    failures.append(f"{name}: raised {raised!r}, expected {error!r}")
+                if tester.cancelled != cancelled:
+                    failures.append(f"{name}: CancelOperation() stopped {tester.cancelled}, expected {cancelled}")
+                if playing is not None:
+                    failures.append(f"{name}: the player was not stopped ({playing})")
+                if seconds > 10:
+                    failures.append(f"{name}: took {seconds:.1f}s")
+        session.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return failures
+
+
+def measure(func, args, repeat):
+    """Best and median wall time over `repeat` runs, then one traced run for peak Python-heap memory."""
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(*args)
+            times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            func(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "seconds": round(min(times), 4),
+        "median_s": round(statistics.median(times), 4),
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+
+def run(sizes, case_names=None, repeat=3, fixture_dir="bench_fixtures"):
+    fixtures = fixtureSet(fixture_dir)
+    results = {}
+    for case in CASES:
+        if case_names and case.name not in case_names:
+            continue
+        for size in sizes:
+            if size not in case.sizes:
+                continue
+            workdir = os.path.join(fixture_dir, "work", case.name)
+            shutil.rmtree(workdir, ignore_errors=True)
+            os.makedirs(workdir)
+            args = case.setup(fixtures, size, workdir)
+            result = measure(case.func, args, repeat)
+            results.setdefault(case.name, {})[size] = result
+            print(
+                f"{case.name:<20} {size:<7} {result['seconds']:>9.4f} s"
+                f" (median {result['median_s']:.4f} s)  peak {result['peak_mb']:>8.2f} MB"
+            )
+    return results
+
+
+def environment():
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cpus": os.cpu_count(),
+    }
+
+
+def save_baseline(results, baseline_file=BASELINE_FILE):
+    """Merge `results` into the baseline file, replacing the cases/sizes that were re-run."""
+    try:
+        with open(baseline_file, "r") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {"results": {}}
+
+    baseline["environment"] = environment()
+    for name, by_size in results.items():
+        baseline["results"].setdefault(name, {}).update(by_size)
+    with open(baseline_file, "w") as f:
+        json.dump(baseline, f, indent=4)
+    print(f"Saved as: {baseline_file}")
+
+
+def compare(results, baseline_file=BASELINE_FILE, tolerance=1.3):
+    """Print every case that got slower or hungrier than `tolerance` x baseline; returns the regressions."""
+    with open(baseline_file, "r") as f:
+        baseline = json.load(f)
+    if baseline.get("environment", {}).get("platform") != environment()["platform"]:
+        print("⚠️ Baseline was recorded on a different machine; timings are not comparable.")
+
+    regressions = []
+    for name, by_size in results.items():
+        for size, result in by_size.items():
+            base = baseline["results"].get(name, {}).get(size)
+            if base is None:
+                print(f"{name} {size}: no baseline")
+                continue
+            for key, slack in (("seconds", 0.0), ("peak_mb", 1.0), ("modules", 0)):
+                if key not in result or key not in base:
+                    continue
+                ratio = result[key] / base[key] if base[key] else 1.0
+                if result[key] > base[key] * tolerance + slack:
+                    regressions.append((name, size, key, base[key], result[key]))
+                    print(f"❌ {name} {size} {key}: {base[key]} -> {result[key]} ({ratio:.2f}x)")
+                elif ratio < 1 / tolerance:
+                    print(f"✅ {name} {size} {key}: {base[key]} -> {result[key]} ({ratio:.2f}x)")
+    if not regressions:
+        print("No regressions")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the processing stages on synthetic fixtures")
+    parser.add_argument(
+        "--size",
+        type=str,
+        choices=list(SIZES),
+        nargs="+",
+        default=["small", "medium"],
+        help="Fixture size(s) to run (default: small medium)",
+    )
+    parser.add_argument(
+        "--case",
+        type=str,
+        choices=[case.name for case in CASES + IMPORT_CASES],
+        nargs="*",
+        help="Only run these cases (default: all)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case (default: 3)")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only run the checks: peak_detect against find_peak_open_src, stimulus_align cuts, stageScheduler on stub stages, playbackWatch, adb_command and captureOrchestrator against fake_adb.py",
+    )
+    parser.add_argument(
+        "--imports",
+        action="store_true",
+        help="Run the cold-start import cases instead; fails if a forbidden package gets loaded",
+    )
+    parser.add_argument(
+        "--fixtures",
+        type=str,
+        default="bench_fixtures",
+        help="Where generated fixtures are kept between runs (default: bench_fixtures)",
+    )
+    parser.add_argument("--baseline", type=str, default=BASELINE_FILE, help="Baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="Compare the results with the baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.3,
+        help="Allowed slowdown/memory growth factor before --compare fails (default: 1.3)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.check:
+        failures = check_peaks()
+        for failure in failures:
+            print(f"❌ {failure}")
+        print("❌ peak_detect differs" if failures else "✅ peak_detect matches find_peak_open_src")
+        align_failures = check_alignment()
+        for failure in align_failures:
+            print(f"❌ {failure}")
+        print("❌ stimulus_align is off" if align_failures else "✅ stimulus_align cuts are frame-exact")
+        scheduler_failures = check_scheduler()
+        for failure in scheduler_failures:
+            print(f"❌ {failure}")
+        print("❌ stageScheduler misbehaves" if scheduler_failures else "✅ stageScheduler keeps order, resources and failures")
+        playback_failures = check_playback()
+        for failure in playback_failures:
+            print(f"❌ {failure}")
+        print("❌ playbackWatch misjudges the end of playback" if playback_failures else "✅ playbackWatch ends on stop or released session, times out a silent player")
+        adb_failures = check_adb()
+        for failure in adb_failures:
+            print(f"❌ {failure}")
+        print("❌ adb_command misbehaves" if adb_failures else "✅ adb_command shell and devicePool behave on fake phones")
+        orchestrator_failures = check_orchestrator()
+        for failure in orchestrator_failures:
+            print(f"❌ {failure}")
+        print("❌ captureOrchestrator misbehaves" if orchestrator_failures else "✅ captureOrchestrator ends both sides on success, play failure and timeout")
+        sys.exit(1 if failures or align_failures or scheduler_failures or playback_failures or adb_failures or orchestrator_failures else 0)
+
+    violations = []
+    if args.imports:
+        results, violations = run_imports(args.case, max(args.repeat, 5), args.fixtures)
+    else:
+        results = run(args.size, args.case, args.repeat, args.fixtures)
+    if args.save:
+        save_baseline(results, args.baseline)
+    if args.compare and compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+    if violations:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
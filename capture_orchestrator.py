@@ -0,0 +1,161 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# Seconds; "orchestration" in audio_quality_paths.json overrides any of them.
+ORCHESTRATION_DEFAULTS = {
+    "dnr_settle": 2.0,  # DNR tone playing before the measurement starts
+    "recorder_lead": 1.0,  # recorder running before the first stimulus starts
+    "start_timeout": 15.0,  # player reporting PLAYING after the intent
+    "dnr_timeout": 300.0,  # whole DNR measurement, graph export included
+    "recorder_timeout": 1800.0,  # whole Measurement Recorder run
+    "cancel_timeout": 30.0,  # APx returning after CancelOperation()
+}
+
+
+def orchestration_options(paths):
+    return {**ORCHESTRATION_DEFAULTS, **paths.get("orchestration", {})}
+
+
+class captureOrchestrator:
+    """Step 1 (DNR, then Measurement Recorder) as pairs of asyncio tasks: phone playback and APx measurement.
+
+    adb calls are asyncio subprocesses (adb_command.asyncPlayer); APx calls
+    run one at a time on a dedicated thread. Start offsets are scheduled on
+    the loop's monotonic clock, every wait has a timeout, and when either
+    task of a pair ends the other is cancelled: the phone is force-stopped,
+    or a running APx measurement is stopped with CancelOperation(). A
+    failure on either side is raised once both have stopped.
+    """
+
+    def __init__(self, tester, player=None, options=None):
+        from adb_command import asyncPlayer
+
+        self.tester = tester
+        self.options = options or orchestration_options(tester.paths)
+        self.player = player or asyncPlayer(serial=tester.paths.get("adb_serial"))
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="apx")
+        self.origin = None
+        self.timeline = []
+
+    def mark(self, event):
+        """Record `event` at its offset from the start of the run, on the loop's monotonic clock."""
+        offset = asyncio.get_running_loop().time() - self.origin
+        self.timeline.append((event, offset))
+        print(f"[capture {self.tester.fs}] {offset:8.3f}s {event}")
+        return offset
+
+    async def sleep_until(self, offset):
+        """Sleep until `offset` seconds after the start of the run."""
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(max(0.0, self.origin + offset - loop.time()))
+
+    async def apx(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def measure(self, name, func, timeout):
+        """func() on the APx thread; stopped with CancelOperation() on timeout or when this task is cancelled."""
+        future = asyncio.get_running_loop().run_in_executor(self.executor, func)
+        self.mark(f"{name} started")
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            await self.abort(name, future)
+            raise RuntimeError(f"{name} did not finish within {timeout:.0f}s") from None
+        except asyncio.CancelledError:
+            await self.abort(name, future)
+            raise
+        self.mark(f"{name} finished")
+        return result
+
+    async def abort(self, name, future):
+        self.mark(f"stopping {name}")
+        # Run() blocks the APx thread; CancelOperation() has to come from another one.
+        await asyncio.get_running_loop().run_in_executor(None, self.tester.APx.CancelOperation)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.options["cancel_timeout"])
+            self.mark(f"{name} stopped")
+        except asyncio.TimeoutError:
+            print(f"⚠️ {name} still running {self.options['cancel_timeout']:.0f}s after CancelOperation()")
+        except Exception as e:
+            print(f"⚠️ {name} failed while stopping: {e!r}")
+
+    async def run_pair(self, *coros):
+        """Run the coroutines together; when one ends the others are cancelled. Raises the first error."""
+        tasks = [asyncio.ensure_future(coro) for coro in coros]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    async def play(self, audio_file):
+        player = self.player
+        if not await player.play_audio(audio_file):
+            raise RuntimeError(f"Could not play {audio_file} on the phone")
+        if not await player.wait_playback_start(self.options["start_timeout"]):
+            raise RuntimeError(f"{audio_file} did not start playing within {self.options['start_timeout']:.0f}s")
+        return self.mark(f"playing {audio_file}")
+
+    async def dynamic_range(self):
+        """DNR: the measurement starts `dnr_settle` s after the tone is confirmed playing; the tone stops with it."""
+        started = asyncio.get_running_loop().create_future()
+
+        async def playback():
+            try:
+                started.set_result(await self.play(self.tester.paths["dynamic_range_file"][self.tester.fs]))
+                # The tone only has to last while the measurement runs; it ending first is not an error.
+                if not await self.player.wait_playback_end():
+                    raise RuntimeError("DNR tone playback failed")
+                await asyncio.Event().wait()
+            finally:
+                await asyncio.shield(self.player.app_cancel())
+
+        async def measurement():
+            await self.sleep_until(await asyncio.shield(started) + self.options["dnr_settle"])
+            await self.measure("Dynamic Range", self.tester.dynamic_range, self.options["dnr_timeout"])
+
+        await self.run_pair(playback(), measurement())
+
+    async def measurement_recorder(self):
+        """Recorder: the stimuli start `recorder_lead` s after it, one after another; it is stopped after the last."""
+        start = self.mark("Measurement Recorder scheduled")
+
+        async def playback():
+            await self.sleep_until(start + self.options["recorder_lead"])
+            try:
+                for audio_file in self.tester.paths["measurement_recorder_files"][self.tester.fs]:
+                    await self.play(audio_file)
+                    if not await self.player.wait_playback_end():
+                        raise RuntimeError(f"{audio_file} did not play to the end")
+                    await self.player.app_cancel()
+                self.mark("playback finished")
+            except BaseException:
+                await asyncio.shield(self.player.app_cancel())
+                raise
+
+        async def measurement():
+            await self.measure("Measurement Recorder", self.tester.measurement_recorder, self.options["recorder_timeout"])
+            print("⚠️ The Measurement Recorder ended before the last stimulus; stopping playback.")
+
+        await self.run_pair(playback(), measurement())
+
+    async def run(self):
+        self.origin = asyncio.get_running_loop().time()
+        try:
+            await self.apx(self.tester.generate_report)
+            await self.dynamic_range()
+            await self.measurement_recorder()
+        finally:
+            await self.player.close()
+            self.executor.shutdown(wait=False)
+        return self.timeline
+
+
+def run_capture(tester, player=None, options=None):
+    """Run step 1 of `tester` (an audioQualityEvkI2s) to completion; returns the (event, offset) timeline."""
+    return asyncio.run(captureOrchestrator(tester, player, options).run())
@@ -1,163 +1,300 @@
-import pandas as pd
+import os
 import numpy as np
-import json
 import argparse
+from fft_csv_cache import load_fft_csv
+from paths_config import load_paths
 
 
-def find_peak_48k(df, channel_index):
-    freq_col = df.columns[channel_index * 2]
-    dbfs_col = df.columns[channel_index * 2 + 1]
+def channel_arrays(df, n_channels=16):
+    """Split an APx "All Points" export into (n_channels, n_points) frequency and dBFS arrays."""
+    import pandas as pd
 
-    freq = pd.to_numeric(df[freq_col], errors="coerce")
-    dbfs = pd.to_numeric(df[dbfs_col], errors="coerce")
-    df_pair = pd.DataFrame({"Frequency": freq, "dBFS": dbfs}).dropna()
-
-    df_filtered = df_pair[
-        (df_pair["Frequency"] >= 15) & (df_pair["Frequency"] <= 22300)
-    ].reset_index(drop=True)
-    df_sorted = df_filtered.sort_values(by="dBFS", ascending=False).reset_index(
-        drop=True
+    data = (
+        df.iloc[:, : n_channels * 2]
+        .apply(pd.to_numeric, errors="coerce")
+        .to_numpy(dtype=np.float64)
     )
+    return np.ascontiguousarray(data[:, 0::2].T), np.ascontiguousarray(data[:, 1::2].T)
 
-    min_spacing_hz = 50
-    selected_peaks = []
-    for j in range(len(df_sorted)):
-        freq_val = df_sorted.loc[j, "Frequency"]
-        dbfs_val = df_sorted.loc[j, "dBFS"]
-        if all(abs(freq_val - sel[0]) >= min_spacing_hz for sel in selected_peaks):
-            selected_peaks.append((freq_val, dbfs_val))
-        if len(selected_peaks) == 32:
-            break
 
-    dbfs_values = [dbfs for _, dbfs in selected_peaks]
-    max_db = max(dbfs_values)
-    min_db = min(dbfs_values)
-    deviation = max_db - min_db
-
-    selected_peaks_sorted = sorted(selected_peaks, key=lambda x: x[0])
-    fs = 48000
-    fft_size = 262144
-    bin_width = fs / fft_size
-    peak_freq = selected_peaks_sorted[31][0]
-    tone_bin = round(peak_freq / bin_width)
-    expected_bins = [121651, 120739]
-    tolerance = 100
-    bin_match = any(
-        abs(tone_bin - expected_bin) <= tolerance for expected_bin in expected_bins
-    )
+def select_peaks(
+    freq, dbfs, top_k, min_spacing_hz=50, f_min=None, f_max=None, mask=None
+):
+    """Greedy top-K peak selection for every channel at once.
 
-    return {
-        "Max_dBFS": round(max_db, 5),
-        "Min_dBFS": round(min_db, 5),
-        "Deviation_dB": round(deviation, 2),
-        "Deviation Pass": deviation <= 10.0,
-        "Tone Bin": tone_bin,
-        "Bin Match": "✅" if bin_match else "❌",
-    }
-
-
-def find_peak_96k(df, channel_index):
-    freq_col = df.columns[channel_index * 2]
-    dbfs_col = df.columns[channel_index * 2 + 1]
-
-    freq = pd.to_numeric(df[freq_col], errors="coerce")
-    dbfs = pd.to_numeric(df[dbfs_col], errors="coerce")
-    df_pair = pd.DataFrame({"Frequency": freq, "dBFS": dbfs}).dropna()
-
-    df_filtered = df_pair[
-        (df_pair["Frequency"] >= 20) & (df_pair["Frequency"] <= 45000)
-    ].reset_index(drop=True)
-    df_sorted = df_filtered.sort_values(by="dBFS", ascending=False).reset_index(
-        drop=True
-    )
+    Equivalent to walking each channel sorted by dBFS (descending) and keeping a
+    point only when it is at least `min_spacing_hz` away from every point kept
+    so far. Only the loudest candidates of each channel are ranked (growing the
+    candidate pool if it runs dry), and each round takes the loudest remaining
+    candidate of every channel and masks its neighbourhood, so there is no
+    Python loop over the sorted rows.
+
+    `mask` is an optional precomputed band mask broadcastable to `dbfs`; it is
+    combined with `f_min`/`f_max`.
+
+    Returns (peak_freq, peak_dbfs) of shape (channels, top_k) in selection
+    order; channels with fewer than `top_k` candidates are padded with NaN.
+    """
+    freq = np.atleast_2d(np.asarray(freq, dtype=np.float64))
+    dbfs = np.atleast_2d(np.asarray(dbfs, dtype=np.float64))
+    freq = np.broadcast_to(freq, dbfs.shape)
+
+    valid = ~(np.isnan(freq) | np.isnan(dbfs))
+    if f_min is not None:
+        valid &= freq >= f_min
+    if f_max is not None:
+        valid &= freq <= f_max
+    if mask is not None:
+        valid &= mask
+    score = np.where(valid, dbfs, -np.inf)
+
+    n_channels, n_points = score.shape
+    rows = np.arange(n_channels)[:, None]
+    pool = min(n_points, max(64 * top_k, 1024))
+
+    while True:
+        # The `pool` loudest points of every channel are a prefix of the
+        # sorted walk, so greedy selection inside them gives the same answer
+        # as long as each channel fills `top_k` (or runs out of points).
+        if pool < n_points:
+            cand = np.argpartition(-score, pool - 1, axis=1)[:, :pool]
+        else:
+            cand = np.broadcast_to(np.arange(n_points), score.shape)
+        cand_freq = freq[rows, cand]
+        work = score[rows, cand]
+
+        peak_freq, peak_dbfs = _greedy_rounds(cand_freq, work, top_k, min_spacing_hz)
 
-    min_spacing_hz = 50
-    selected_peaks = []
-    for _, row in df_sorted.iterrows():
-        freq_val = row["Frequency"]
-        dbfs_val = row["dBFS"]
-        if all(abs(freq_val - sel[0]) >= min_spacing_hz for sel in selected_peaks):
-            selected_peaks.append((freq_val, dbfs_val))
-        if len(selected_peaks) == 64:
+        filled = ~np.isnan(peak_dbfs[:, -1])
+        exhausted = ~np.isfinite(work).all(axis=1)
+        if pool == n_points or (filled | exhausted).all():
+            return peak_freq, peak_dbfs
+        pool = min(n_points, pool * 4)
+
+
+def _greedy_rounds(freq, work, top_k, min_spacing_hz):
+    work = work.copy()
+    n_channels = work.shape[0]
+    rows = np.arange(n_channels)
+    peak_freq = np.full((n_channels, top_k), np.nan)
+    peak_dbfs = np.full((n_channels, top_k), np.nan)
+
+    for k in range(top_k):
+        idx = np.argmax(work, axis=1)
+        best = work[rows, idx]
+        found = best > -np.inf
+        if not found.any():
             break
+        sel_freq = np.where(found, freq[rows, idx], np.nan)
+        peak_freq[found, k] = sel_freq[found]
+        peak_dbfs[found, k] = best[found]
+        work[np.abs(freq - sel_freq[:, None]) < min_spacing_hz] = -np.inf
+
+    return peak_freq, peak_dbfs
+
+
+RATE_PROFILES = {
+    "48k": {
+        "fs": 48000,
+        "fft_size": 262144,
+        "band_hz": (15, 22300),
+        "num_tones": 32,
+        "check_tone": 31,
+        "stat_band_hz": None,
+        "expected_bins": [121651, 120739],
+        "bin_tolerance": 100,
+        "min_spacing_hz": 50,
+        "max_deviation_db": 10.0,
+        "min_label": "Min",
+        "tone_label": "32nd tone bin",
+    },
+    "96k": {
+        "fs": 96000,
+        "fft_size": 262144,
+        "band_hz": (20, 45000),
+        "num_tones": 64,
+        "check_tone": 59,
+        "stat_band_hz": (20, 40000),
+        "expected_bins": [114785, 113077],
+        "bin_tolerance": 100,
+        "min_spacing_hz": 50,
+        "max_deviation_db": 10.0,
+        "min_label": "Min dBFS at 20hz~40khz",
+        "tone_label": "60th tone bin",
+    },
+}
+
+
+class multitoneAnalysis:
+    """Batch multitone analysis driven by one entry of RATE_PROFILES.
+
+    Bin width, the expected-bin table and the band mask of the frequency axis
+    are built once per analyzer and reused for every channel and file.
+    """
+
+    def __init__(self, fs):
+        self.fs = fs
+        self.profile = RATE_PROFILES[fs]
+        self.bin_width = self.profile["fs"] / self.profile["fft_size"]
+        self.expected_bins = np.asarray(self.profile["expected_bins"])
+        self._axis = None
+        self._axis_mask = None
+
+    def band_mask(self, freq):
+        """Band mask for `freq`, shared across channels when they use one axis."""
+        f_min, f_max = self.profile["band_hz"]
+        axis = freq[0]
+        if not (freq == axis).all():
+            return (freq >= f_min) & (freq <= f_max)
+        if self._axis is None or not np.array_equal(self._axis, axis):
+            self._axis = axis.copy()
+            self._axis_mask = (axis >= f_min) & (axis <= f_max)
+        return self._axis_mask
 
-    selected_peaks_sorted = sorted(selected_peaks, key=lambda x: x[0])
+    def analyze(self, freq, dbfs):
+        """Analyze (channels, points) frequency/dBFS arrays; returns one dict per channel."""
+        profile = self.profile
+        freq = np.atleast_2d(freq)
+        dbfs = np.atleast_2d(dbfs)
+        peak_freq, peak_dbfs = select_peaks(
+            freq,
+            dbfs,
+            top_k=profile["num_tones"],
+            min_spacing_hz=profile["min_spacing_hz"],
+            mask=self.band_mask(freq),
+        )
 
-    filtered_peaks = [peak for peak in selected_peaks_sorted if 20 <= peak[0] <= 40000]
-    # Calculate max, min, and deviation
-    if filtered_peaks:
-        dbfs_values = [peak[1] for peak in filtered_peaks]
-        max_db = max(dbfs_values)
-        min_db = min(dbfs_values)
+        order = np.argsort(peak_freq, axis=1)
+        peak_freq = np.take_along_axis(peak_freq, order, axis=1)
+        peak_dbfs = np.take_along_axis(peak_dbfs, order, axis=1)
+
+        if profile["stat_band_hz"] is None:
+            in_band = ~np.isnan(peak_freq)
+        else:
+            lo, hi = profile["stat_band_hz"]
+            in_band = (peak_freq >= lo) & (peak_freq <= hi)
+        has_peaks = in_band.any(axis=1)
+        max_db = np.where(has_peaks, np.where(in_band, peak_dbfs, -np.inf).max(axis=1), np.nan)
+        min_db = np.where(has_peaks, np.where(in_band, peak_dbfs, np.inf).min(axis=1), np.nan)
         deviation = max_db - min_db
-    else:
-        max_db = min_db = deviation = float("nan")
-
-    fs = 96000
-    fft_size = 262144
-    bin_width = fs / fft_size
-    peak_freq = selected_peaks_sorted[59][0]
-    tone_bin = round(peak_freq / bin_width)
-    expected_bins = [114785, 113077]
-    tolerance = 100
-    bin_match = any(
-        abs(tone_bin - expected_bin) <= tolerance for expected_bin in expected_bins
-    )
 
-    return {
-        "Max_dBFS": round(max_db, 5),
-        "Min_dBFS": round(min_db, 5),
-        "Deviation_dB": round(deviation, 2),
-        "Deviation Pass": deviation <= 10.0,
-        "Tone Bin": tone_bin,
-        "Bin Match": "✅" if bin_match else "❌",
-    }
+        tone_bin = np.rint(peak_freq[:, profile["check_tone"]] / self.bin_width)
+        bin_match = (
+            np.abs(tone_bin[:, None] - self.expected_bins[None, :])
+            <= profile["bin_tolerance"]
+        ).any(axis=1)
 
+        results = []
+        for i in range(dbfs.shape[0]):
+            results.append(
+                {
+                    "Max_dBFS": round(float(max_db[i]), 5),
+                    "Min_dBFS": round(float(min_db[i]), 5),
+                    "Deviation_dB": round(float(deviation[i]), 2),
+                    "Deviation Pass": bool(deviation[i] <= profile["max_deviation_db"]),
+                    "Tone Bin": None if np.isnan(tone_bin[i]) else int(tone_bin[i]),
+                    "Bin Match": "✅" if bin_match[i] else "❌",
+                }
+            )
+        return results
 
-def run(fs):
-    with open("audio_quality_paths.json", "r") as f:
-        paths = json.load(f)
+    def analyze_files(self, csv_files, n_channels=16, use_cache=True):
+        """Analyze several APx exports in one batch; returns {csv_file: [result, ...]}.
 
-    df = pd.read_csv(paths["csv_raw_data_files"][fs], skiprows=4)
-    results = {}
+        With `use_cache`, each export is parsed once into a float64 sidecar
+        (see fft_csv_cache) and memory-mapped on later runs.
+        """
+        freqs, dbfss, counts = [], [], []
+        for csv_file in csv_files:
+            if use_cache:
+                freq, dbfs = load_fft_csv(csv_file, n_channels)
+            else:
+                # pandas is only needed when the sidecar cache is bypassed.
+                import pandas as pd
+
+                freq, dbfs = channel_arrays(pd.read_csv(csv_file, skiprows=4), n_channels)
+            freqs.append(freq)
+            dbfss.append(dbfs)
+            counts.append(len(dbfs))
 
-    for i in range(16):
-        if fs == "96k":
-            result = find_peak_96k(df, i)
+        if len({f.shape[1] for f in freqs}) == 1:
+            results = self.analyze(np.concatenate(freqs), np.concatenate(dbfss))
         else:
-            result = find_peak_48k(df, i)
-        results[f"Channel_{i+1}"] = result
+            results = [r for f, d in zip(freqs, dbfss) for r in self.analyze(f, d)]
 
-    for i, res in enumerate(results.values()):
-        pair_num = i // 2 + 1
-        sub_num = i % 2 + 1
-        label = f"{fs} Multitone {pair_num}_{sub_num}"
+        batch = {}
+        offset = 0
+        for csv_file, count in zip(csv_files, counts):
+            batch[csv_file] = results[offset : offset + count]
+            offset += count
+        return batch
 
+    def format_result(self, channel_index, res):
+        label = f"{self.fs} Multitone {channel_index // 2 + 1}_{channel_index % 2 + 1}"
         if "Error" in res:
-            print(f"{label} => ⚠️ {res['Error']}")
-        else:
-            min_label = res["Min_dBFS"]
+            return f"{label} => ⚠️ {res['Error']}"
 
-            if fs == "48k":
-                output = f"{label} => Max: {res['Max_dBFS']} dB, Min: {min_label} dB"
-                output += f", 32nd tone bin: {res['Tone Bin']}({res['Bin Match']})"
-            else:
-                output = f"{label} => Max: {res['Max_dBFS']} dB, Min dBFS at 20hz~40khz: {min_label} dB, 60th tone bin: {res['Tone Bin']}({res['Bin Match']})"
-            output += f", Deviation: {res['Deviation_dB']} dB"
-            output += " ✅ Pass" if res["Deviation Pass"] else " ❌ Fail"
+        output = f"{label} => Max: {res['Max_dBFS']} dB"
+        output += f", {self.profile['min_label']}: {res['Min_dBFS']} dB"
+        output += f", {self.profile['tone_label']}: {res['Tone Bin']}({res['Bin Match']})"
+        output += f", Deviation: {res['Deviation_dB']} dB"
+        output += " ✅ Pass" if res["Deviation Pass"] else " ❌ Fail"
+        return output
 
-            print(output)
 
+def print_batch(analyzer, batch):
+    for csv_file, results in batch.items():
+        if len(batch) > 1:
+            print(csv_file)
+        for i, res in enumerate(results):
+            print(analyzer.format_result(i, res))
 
-if __name__ == "__main__":
+
+def run(fs, csv_files=None, use_cache=True, db=None, folder=""):
+    """Analyze and print; with `db`, every file is also recorded as a "multitone" run of `folder` in the results store."""
+    if not csv_files:
+        csv_files = [load_paths()["csv_raw_data_files"][fs]]
+
+    analyzer = multitoneAnalysis(fs)
+    batch = analyzer.analyze_files(csv_files, use_cache=use_cache)
+    print_batch(analyzer, batch)
+
+    if db:
+        from results_store import resultsStore, multitone_rows
+
+        with resultsStore(db) as store:
+            for csv_file, results in batch.items():
+                store.record("multitone", fs, multitone_rows(results), folder, os.path.abspath(csv_file))
+        print(f"Saved as: {db}")
+    return batch
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Multitone raw data analyze")
     parser.add_argument(
         "--fs",
         type=str,
-        choices=["48k", "96k"],
+        choices=list(RATE_PROFILES),
         default="48k",
         help="Sampling rate (48k or 96k)",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--csv",
+        type=str,
+        nargs="*",
+        help="Raw data CSV file(s) to analyze (default: csv_raw_data_files[fs] in audio_quality_paths.json)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always re-parse the CSV text instead of using the binary sidecar cache",
+    )
+    parser.add_argument("--db", type=str, help="Also record the results in this results database")
+    parser.add_argument("--folder", type=str, default="", help="Customer folder the results are recorded under")
+    args = parser.parse_args(argv)
+
+    run(args.fs, args.csv, use_cache=not args.no_cache, db=args.db, folder=args.folder)
 
-    run(args.fs)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import os
+import argparse
+import json
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import scipy.fft
+import scipy.signal
+from wav_io import wavInfo, read_frames, iter_blocks
+
+# Analog A-weighting pole frequencies (IEC 61672).
+A_WEIGHTING_POLES_HZ = (20.598997, 107.65265, 737.86223, 12194.217)
+
+
+def _normalize_at(sos, fs, freq):
+    """Scale `sos` to 0 dB at `freq`."""
+    _, h = scipy.signal.sosfreqz(sos, worN=[freq], fs=fs)
+    sos = sos.copy()
+    sos[0, :3] /= np.abs(h[0])
+    return sos
+
+
+@lru_cache(maxsize=None)
+def a_weighting_sos(fs):
+    f1, f2, f3, f4 = (2 * np.pi * f for f in A_WEIGHTING_POLES_HZ)
+    zeros = [0, 0, 0, 0]
+    poles = [-f1, -f1, -f2, -f3, -f4, -f4]
+    z, p, k = scipy.signal.bilinear_zpk(zeros, poles, f4**2, fs)
+    return _normalize_at(scipy.signal.zpk2sos(z, p, k), fs, 1000)
+
+
+@lru_cache(maxsize=None)
+def band_sos(fs, band_hz=(20, 20000)):
+    """AES17 measurement bandwidth: 20 Hz high-pass and a steep low-pass at the top of the band."""
+    high = scipy.signal.butter(4, band_hz[0], "highpass", fs=fs, output="sos")
+    low = scipy.signal.ellip(10, 0.01, 80, band_hz[1], "lowpass", fs=fs, output="sos")
+    return np.vstack([high, low])
+
+
+@lru_cache(maxsize=64)
+def notch_sos(fs, tone_hz, q=2.0):
+    b, a = scipy.signal.iirnotch(tone_hz, q, fs)
+    return scipy.signal.tf2sos(b, a)
+
+
+def tone_region(info, block_s=0.1, window_db=10, margin_s=0.5):
+    """Frame range where the tone plays: blocks within `window_db` of the loudest one, minus a margin."""
+    block = max(1, int(block_s * info.framerate))
+    levels = np.array([np.mean(x.astype(np.float64) ** 2) for _, x in iter_blocks(info, block)])
+    if not len(levels) or not levels.max():
+        raise ValueError(f"{info.path} is silent")
+
+    loud = np.flatnonzero(levels >= levels.max() * 10 ** (-window_db / 10))
+    margin = int(margin_s * info.framerate)
+    start = loud[0] * block + margin
+    end = min(info.nframes, (loud[-1] + 1) * block) - margin
+    if end <= start:
+        raise ValueError(f"{info.path}: tone is shorter than {2 * margin_s} s")
+    return start, end
+
+
+def tone_frequency(info, start, end, tone_hz=1000, search_hz=50, analysis_s=1.0):
+    """Tone frequency from the middle of [start, end) to a few mHz, so the notch sits on it."""
+    length = min(end - start, int(analysis_s * info.framerate))
+    first = (start + end - length) // 2
+    x = read_frames(info, first, first + length, np.float64).mean(axis=1)
+    win = scipy.signal.get_window(("kaiser", 20), length)
+    p = np.abs(scipy.fft.rfft(x * win)) ** 2
+    bins = scipy.fft.rfftfreq(length, 1 / info.framerate)
+
+    search = np.abs(bins - tone_hz) <= search_hz
+    peak = np.clip(np.argmax(np.where(search, p, -1)), 1, len(p) - 2)
+    a, b, c = np.log(p[peak - 1 : peak + 2] + 1e-30)
+    offset = 0.5 * (a - c) / (a - 2 * b + c) if a - 2 * b + c < 0 else 0.0
+    return (peak + offset) * info.framerate / length
+
+
+def dynamic_range(
+    wav_path,
+    tone_hz=1000,
+    band_hz=(20, 20000),
+    settle_s=0.5,
+    block_frames=1 << 16,
+    min_dnr_db=None,
+):
+    """AES17 dynamic range of a capture of the -60 dBFS tone, one dict per channel.
+
+    The tone is located and its exact frequency measured, then the capture
+    streams once through the band-limit, band-limit + notch and band-limit +
+    notch + A-weighting chains (coefficients are built once per rate), with
+    filter state carried across blocks. Levels are dBFS with a full-scale
+    sine at 0 dB; DNR is minus the A-weighted THD+N level, i.e. the -60 dB
+    tone's THD+N ratio plus 60 dB when the tone is exactly at -60 dBFS.
+    """
+    info = wavInfo(wav_path)
+    fs = info.framerate
+    band_hz = (band_hz[0], min(band_hz[1], 0.45 * fs))
+    start, end = tone_region(info)
+    measured_hz = tone_frequency(info, start, end, tone_hz)
+
+    band = band_sos(fs, band_hz)
+    notched = np.vstack([band, notch_sos(fs, round(measured_hz, 3))])
+    chains = [band, notched, np.vstack([notched, a_weighting_sos(fs)])]
+    states = [np.zeros((len(sos), 2, info.channels)) for sos in chains]
+
+    settle = int(settle_s * fs)
+    energy = np.zeros((len(chains), info.channels))
+    count = 0
+    for pos, x in iter_blocks(info, block_frames, start, end, np.float64):
+        skip = max(0, start + settle - pos)
+        for i, sos in enumerate(chains):
+            y, states[i] = scipy.signal.sosfilt(sos, x, axis=0, zi=states[i])
+            energy[i] += (y[skip:] ** 2).sum(axis=0)
+        count += max(0, len(x) - skip)
+    if not count:
+        raise ValueError(f"{wav_path}: tone is too short to measure")
+
+    with np.errstate(divide="ignore"):
+        level_db = 10 * np.log10(2 * energy / count)
+    signal_db, thdn_db, thdn_a_db = level_db
+
+    results = []
+    for ch in range(info.channels):
+        dnr = -thdn_a_db[ch]
+        results.append(
+            {
+                "Channel": ch + 1,
+                "Tone_Hz": round(float(measured_hz), 3),
+                "Signal_dBFS": round(float(signal_db[ch]), 3),
+                "THDN_dBFS": round(float(thdn_db[ch]), 3),
+                "THDN_A_dBFS": round(float(thdn_a_db[ch]), 3),
+                "DNR_dB": round(float(-thdn_db[ch]), 3),
+                "DNR_A_dB": round(float(dnr), 3),
+                "Pass": None if min_dnr_db is None else bool(dnr >= min_dnr_db),
+            }
+        )
+    return results
+
+
+def analyze_files(wav_files, max_workers=None, **kwargs):
+    """DNR of many captures in parallel; returns {wav_file: [result, ...]}."""
+    with ProcessPoolExecutor(max_workers) as pool:
+        futures = {f: pool.submit(dynamic_range, f, **kwargs) for f in wav_files}
+        return {f: future.result() for f, future in futures.items()}
+
+
+def format_result(wav_file, res):
+    output = f"{wav_file} Ch{res['Channel']} => DNR: {res['DNR_A_dB']} dB(A)"
+    output += f" ({res['DNR_dB']} dB unweighted), Signal: {res['Signal_dBFS']} dBFS"
+    output += f" @ {res['Tone_Hz']} Hz"
+    if abs(res["Signal_dBFS"] + 60) > 3:
+        output += " ⚠️ tone is not at -60 dBFS"
+    if res["Pass"] is not None:
+        output += " ✅ Pass" if res["Pass"] else " ❌ Fail"
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AES17 dynamic range from recorded -60 dBFS 1 kHz captures")
+    parser.add_argument("--wav", type=str, nargs="+", required=True, help="DNR capture(s) to analyze")
+    parser.add_argument(
+        "--limit",
+        type=float,
+        default=None,
+        help="Minimum A-weighted DNR in dB; adds Pass/Fail to every channel",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--json", type=str, help="Also write the results to this JSON file")
+    parser.add_argument("--db", type=str, help="Also record the results in this results database")
+    parser.add_argument("--folder", type=str, default="", help="Customer folder the results are recorded under")
+    args = parser.parse_args(argv)
+
+    batch = analyze_files(args.wav, args.workers, min_dnr_db=args.limit)
+    for wav_file, results in batch.items():
+        for res in results:
+            print(format_result(wav_file, res))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(batch, f, indent=4, ensure_ascii=False)
+        print(f"Saved as: {args.json}")
+    if args.db:
+        from results_store import resultsStore, dnr_rows
+
+        with resultsStore(args.db) as store:
+            for wav_file, results in batch.items():
+                fs = f"{wavInfo(wav_file).framerate // 1000}k"
+                store.record("dnr", fs, dnr_rows(results), args.folder, os.path.abspath(wav_file))
+        print(f"Saved as: {args.db}")
+
+
+if __name__ == "__main__":
+    main()
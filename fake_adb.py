@@ -0,0 +1,182 @@
+"""Stand-in for adb with scripted devices and media sessions, so adb_command can be checked without a phone.
+
+    python fake_adb.py --root DIR [-s SERIAL] devices | root | wait-for-device | push SRC DST | exec-out head -c N PATH | shell
+
+`DIR/devices.json` scripts the phones (write it with setup()):
+
+    {"FAKE1": {"state": "device", "start_s": 0.0, "play_s": 1.0, "stale": false, "release": false}, ...}
+
+- `state`: what `adb devices` lists (only "device" accepts commands).
+- `start_s` / `play_s`: after `am start`, the player reports STOPPED for
+  `start_s` seconds, then PLAYING (with its position) for `play_s`, then
+  STOPPED; `am force-stop` clears it.
+- `stale`: the player already has a STOPPED session before the first
+  `am start`, like one left over from the previous track.
+- `release`: the player drops its media session when the track ends
+  instead of reporting STOPPED.
+
+The shell also takes `sleep N` (an adbd that stalls) and `disconnect`
+(the phone dropping off USB mid-command).
+
+Device storage lives under DIR/<serial>/; every call is appended to
+DIR/calls.log as "<time> <serial> <command>".
+"""
+import os
+import re
+import sys
+import glob
+import json
+import time
+import shutil
+
+STORAGE_ROOT = "/storage/emulated/0"
+PLAYER_PACKAGE = "com.shaiban.audioplayer.mplayer"
+FRAMED = re.compile(r"^(.*) 2>&1; echo (\S+) \$\?$")
+
+
+def setup(root, devices):
+    """Write DIR/devices.json; `adb` for adb_command is then fake_adb_command(root)."""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, "devices.json"), "w") as f:
+        json.dump(devices, f)
+
+
+def fake_adb_command(root):
+    return f'"{sys.executable}" "{os.path.abspath(__file__)}" --root "{root}"'
+
+
+class fakeDevice:
+    def __init__(self, root, serial, script):
+        self.root = os.path.join(root, serial)
+        self.script = script
+        self.started = os.path.join(self.root, "started")
+        os.makedirs(self.local(f"{STORAGE_ROOT}/Music"), exist_ok=True)
+
+    def local(self, device_path):
+        return os.path.join(self.root, device_path.strip('"').lstrip("/"))
+
+    def session(self):
+        """`dumpsys media_session` output for the scripted player state."""
+        if os.path.exists(self.started):
+            with open(self.started) as f:
+                elapsed = time.time() - float(f.read())
+            start_s, play_s = self.script.get("start_s", 0.0), self.script.get("play_s", 1.0)
+            if start_s <= elapsed < start_s + play_s:
+                state, position = 3, (elapsed - start_s) * 1000
+            elif elapsed >= start_s + play_s and self.script.get("release"):
+                return ""
+            else:
+                state, position = 1, 0
+        elif self.script.get("stale"):
+            state, position = 1, 0
+        else:
+            return ""
+        return (
+            f"  package={PLAYER_PACKAGE}\n"
+            f"    state=PlaybackState {{state={state}, position={int(position)}, buffered position=0, speed=1.0}}\n"
+        )
+
+    def run(self, command):
+        """(output, status) of one shell command."""
+        if command.startswith("ls -1 -d"):
+            paths = re.findall(r'"([^"]+)"/\*', command)
+            listed = [
+                f"{path}/{os.path.basename(p)}" for path in paths for p in sorted(glob.glob(os.path.join(self.local(path), "*")))
+            ]
+            return "".join(f"{p}\n" for p in listed), 0
+        if command.startswith("ls "):
+            path = command.split()[1]
+            if os.path.exists(self.local(path)):
+                return f"{path}\n", 0
+            return f"ls: {path}: No such file or directory\n", 1
+        if command.startswith("cat "):
+            try:
+                with open(self.local(command.split()[1]), "r") as f:
+                    return f.read(), 0
+            except OSError:
+                return f"cat: {command.split()[1]}: No such file or directory\n", 1
+        if command.startswith("am start"):
+            with open(self.started, "w") as f:
+                f.write(repr(time.time()))
+            return "Starting: Intent { act=android.intent.action.VIEW }\n", 0
+        if command.startswith("am force-stop"):
+            if os.path.exists(self.started):
+                os.remove(self.started)
+            self.script["stale"] = False
+            return "", 0
+        if command == "dumpsys media_session":
+            return self.session(), 0
+        if command == "disconnect":
+            # The phone dropping off USB: the shell ends without answering.
+            sys.exit(1)
+        if command.startswith("sleep "):
+            # A stalled adbd: the answer comes only after the sleep.
+            time.sleep(float(command.split()[1]))
+            return "", 0
+        return f"/system/bin/sh: {command.split()[0]}: inaccessible or not found\n", 127
+
+    def shell(self):
+        """Persistent shell: answers framed commands line by line, output first, then "<marker> <status>"."""
+        while True:
+            line = sys.stdin.readline()
+            if not line or line.strip() == "exit":
+                return
+            framed = FRAMED.match(line.rstrip("\r\n"))
+            if framed:
+                output, status = self.run(framed.group(1))
+                sys.stdout.write(f"{output}{framed.group(2)} {status}\n")
+            else:
+                sys.stdout.write(self.run(line.strip())[0])
+            sys.stdout.flush()
+
+
+def main(argv=None):
+    args = list(sys.argv[1:] if argv is None else argv)
+    root = args[args.index("--root") + 1]
+    del args[args.index("--root") : args.index("--root") + 2]
+    serial = None
+    if args[:1] == ["-s"]:
+        serial, args = args[1], args[2:]
+
+    with open(os.path.join(root, "devices.json")) as f:
+        devices = json.load(f)
+    with open(os.path.join(root, "calls.log"), "a") as f:
+        f.write(f"{time.time():.3f} {serial} {' '.join(args)}\n")
+
+    if args == ["devices"]:
+        print("List of devices attached")
+        for name, script in devices.items():
+            print(f"{name}\t{script.get('state', 'device')}")
+        print()
+        return 0
+    ready = [name for name, script in devices.items() if script.get("state", "device") == "device"]
+    if serial is None:
+        if len(ready) != 1:
+            print("adb: more than one device/emulator" if ready else "adb: no devices/emulators found", file=sys.stderr)
+            return 1
+        serial = ready[0]
+    if serial not in ready:
+        print(f"adb: device '{serial}' not found", file=sys.stderr)
+        return 1
+
+    device = fakeDevice(root, serial, devices[serial])
+    command = args[0]
+    if command == "root":
+        print("adbd is already running as root")
+    elif command == "push":
+        shutil.copy(args[1], device.local(args[2]))
+        print(f"{args[1]}: 1 file pushed")
+    elif command == "exec-out":
+        # exec-out head -c N PATH
+        with open(device.local(args[-1]), "rb") as f:
+            sys.stdout.buffer.write(f.read(int(args[3])))
+    elif command == "shell":
+        device.shell()
+    elif command != "wait-for-device":
+        print(f"adb: unknown command {command}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
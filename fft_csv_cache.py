@@ -0,0 +1,106 @@
+import os
+import json
+import numpy as np
+
+CACHE_VERSION = 2
+
+
+def cache_paths(csv_file, cache_dir=None):
+    """Sidecar data/metadata paths for `csv_file` (next to it unless `cache_dir` is given)."""
+    csv_file = os.path.abspath(csv_file)
+    if cache_dir:
+        base = os.path.join(cache_dir, os.path.basename(csv_file))
+    else:
+        base = csv_file
+    return f"{base}.f64.npy", f"{base}.f64.json"
+
+
+def cache_key(csv_file):
+    stat = os.stat(csv_file)
+    return {
+        "version": CACHE_VERSION,
+        "path": os.path.abspath(csv_file),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+    }
+
+
+def parse_csv(csv_file):
+    """Parse an APx text export into a (columns, rows) float64 array, the values --no-cache analyzes."""
+    # Imported here: a cache hit never needs pandas.
+    import pandas as pd
+
+    df = pd.read_csv(csv_file, skiprows=4)
+    columns = np.empty((df.shape[1], df.shape[0]), dtype=np.float64)
+    for i, col in enumerate(df.columns):
+        columns[i] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+    return columns
+
+
+def _replace_atomic(path, write):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _write_npy(array):
+    def write(path):
+        with open(path, "wb") as f:
+            np.save(f, array)
+
+    return write
+
+
+def _write_json(data):
+    def write(path):
+        with open(path, "w") as f:
+            json.dump(data, f, indent=4)
+
+    return write
+
+
+def load_columns(csv_file, cache_dir=None):
+    """Return the export as a memory-mapped (columns, rows) float64 array.
+
+    The text export is parsed only when its sidecar is missing or was written
+    for a different path, mtime or size; otherwise the cached binary is mapped
+    without reading the CSV at all. float64, so cached results match a
+    re-parse of the text exactly.
+    """
+    data_path, meta_path = cache_paths(csv_file, cache_dir)
+    key = cache_key(csv_file)
+
+    try:
+        with open(meta_path, "r") as f:
+            cached_key = json.load(f)
+    except (OSError, ValueError):
+        cached_key = None
+
+    if cached_key == key and os.path.exists(data_path):
+        return np.load(data_path, mmap_mode="r")
+
+    return store_columns(csv_file, parse_csv(csv_file), cache_dir)
+
+
+def store_columns(csv_file, columns, cache_dir=None):
+    """Write the sidecar for `csv_file` from already-parsed (columns, rows) data.
+
+    Lets a producer that just wrote the CSV skip the first text parse; the
+    values must be what parsing the CSV would give.
+    """
+    data_path, meta_path = cache_paths(csv_file, cache_dir)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    _replace_atomic(data_path, _write_npy(np.asarray(columns, dtype=np.float64)))
+    _replace_atomic(meta_path, _write_json(cache_key(csv_file)))
+    return np.load(data_path, mmap_mode="r")
+
+
+def load_fft_csv(csv_file, n_channels=16, cache_dir=None):
+    """(freq, dbfs) arrays of shape (n_channels, points) backed by the sidecar cache."""
+    columns = load_columns(csv_file, cache_dir)
+    return columns[0 : n_channels * 2 : 2], columns[1 : n_channels * 2 : 2]
@@ -2,14 +2,7 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import scipy.signal
-
-# Load the CSV file and skip the header rows
-df = pd.read_csv("C:\\Users\\chimtsen\\APx500_Python_Guide\\audio_report\\96k_raw_data_61.csv", skiprows=4)
-df.columns = ['Frequency', 'dBFS']
-
-# Convert to numpy arrays
-frequency = df['Frequency'].values
-dbfs = df['dBFS'].values
+import peak_detect
 
 # Peak detection function
 def detect_peaks(x, mph=None, mpd=1, threshold=0, edge='rising', kpsh=False, valley=False):
@@ -33,7 +26,7 @@ def detect_peaks(x, mph=None, mpd=1, threshold=0, edge='rising', kpsh=False, val
             ife = np.where((np.hstack((dx, 0)) < 0) & (np.hstack((0, dx)) >= 0))[0]
     ind = np.unique(np.hstack((ine, ire, ife)))
     if ind.size and indnan.size:
-        ind = ind[np.in1d(ind, np.unique(np.hstack((indnan, indnan - 1, indnan + 1))), invert=True)]
+        ind = ind[np.isin(ind, np.unique(np.hstack((indnan, indnan - 1, indnan + 1))), invert=True)]
     if ind.size and ind[0] == 0:
         ind = ind[1:]
     if ind.size and ind[-1] == x.size - 1:
@@ -82,11 +75,20 @@ def findpeaks(data, spacing=50, limit=None):
         ind = ind[data[ind] > limit]
     return ind
 
-# Detect peaks
-peaks = findpeaks(dbfs, spacing=50)
-# peaks, _= scipy.signal.find_peaks(dbfs, distance=50)
-# Output log
-dbfs_sorted = sorted(peaks, key=lambda i: dbfs[i], reverse=True)[:64]
-freq_sorted = sorted(dbfs_sorted, key=lambda i: frequency[i])[:64]
-for i, idx in enumerate(freq_sorted, start = 1):
-    print(f"peak {i}: {frequency[idx]:.5f} Hz, dBFS: {dbfs[idx]:.5f}")
+if __name__ == "__main__":
+    # Load the CSV file and skip the header rows
+    df = pd.read_csv("C:\\Users\\chimtsen\\APx500_Python_Guide\\audio_report\\96k_raw_data_61.csv", skiprows=4)
+    df.columns = ['Frequency', 'dBFS']
+
+    # Convert to numpy arrays
+    frequency = df['Frequency'].values
+    dbfs = df['dBFS'].values
+
+    # Detect peaks (peak_detect.findpeaks gives the same peaks in one sliding-window pass)
+    peaks = peak_detect.findpeaks(dbfs, spacing=50)
+    # peaks, _= scipy.signal.find_peaks(dbfs, distance=50)
+    # Output log
+    dbfs_sorted = sorted(peaks, key=lambda i: dbfs[i], reverse=True)[:64]
+    freq_sorted = sorted(dbfs_sorted, key=lambda i: frequency[i])[:64]
+    for i, idx in enumerate(freq_sorted, start = 1):
+        print(f"peak {i}: {frequency[idx]:.5f} Hz, dBFS: {dbfs[idx]:.5f}")
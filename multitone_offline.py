@@ -0,0 +1,126 @@
+import os
+import glob
+import argparse
+from functools import lru_cache
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import scipy.fft
+import scipy.signal
+from paths_config import load_paths
+from wav_io import wavInfo, read_frames
+from fft_csv_cache import store_columns
+
+FFT_SIZE = 262144
+
+
+@lru_cache(maxsize=8)
+def analysis_window(name, length):
+    """Window and its coherent gain, built once per (name, length) in each worker."""
+    window = scipy.signal.get_window(name, length, fftbins=True)
+    return window, window.sum()
+
+
+def segment_spectrum(wav_path, fft_size=FFT_SIZE, window="blackmanharris"):
+    """Windowed FFT of the centre of one segment file, all channels at once.
+
+    Levels are dBFS where a full-scale sine reads 0 dB, like the APx FFT
+    spectrum. Segments shorter than `fft_size` are windowed over their own
+    length and zero-padded. Returns (freq, dbfs) with dbfs shaped
+    (channels, fft_size // 2 + 1).
+    """
+    info = wavInfo(wav_path)
+    length = min(fft_size, info.nframes)
+    start = (info.nframes - length) // 2
+    samples = read_frames(info, start, start + length, np.float64).T
+
+    win, gain = analysis_window(window, length)
+    spectrum = scipy.fft.rfft(samples * win, n=fft_size, axis=-1, workers=-1)
+    magnitude = 2 * np.abs(spectrum) / gain
+    dbfs = 20 * np.log10(np.maximum(magnitude, 1e-15))
+    freq = scipy.fft.rfftfreq(fft_size, 1 / info.framerate)
+    return freq.astype(np.float32), dbfs.astype(np.float32)
+
+
+def analyze_files(wav_files, fft_size=FFT_SIZE, window="blackmanharris", max_workers=None):
+    """Spectra of many segment files, one worker process per file."""
+    with ProcessPoolExecutor(max_workers) as pool:
+        return list(pool.map(segment_spectrum, wav_files, repeat(fft_size), repeat(window)))
+
+
+def spectra_columns(wav_files, spectra):
+    """Column labels and (columns, rows) data in the layout csv_analyze expects.
+
+    Channel pairs follow the file order: file 1 ch 1, file 1 ch 2, file 2 ch 1, ...
+    """
+    labels, columns = [], []
+    for wav_file, (freq, dbfs) in zip(wav_files, spectra):
+        name = os.path.splitext(os.path.basename(wav_file))[0]
+        for ch, level in enumerate(dbfs, start=1):
+            labels += [f"{name} Ch{ch} Frequency (Hz)", f"{name} Ch{ch} Level (dBFS)"]
+            columns += [freq, level]
+    return labels, np.vstack(columns)
+
+
+def write_csv(csv_file, wav_files, spectra, fft_size=FFT_SIZE, window="blackmanharris"):
+    """Write an "All Points"-style CSV (4 info rows, header, data) plus its float64 sidecar."""
+    labels, columns = spectra_columns(wav_files, spectra)
+    # Round the way the text is written so the sidecar matches a re-parse.
+    columns = np.round(columns.astype(np.float64), 5)
+
+    os.makedirs(os.path.dirname(os.path.abspath(csv_file)), exist_ok=True)
+    with open(csv_file, "w", newline="") as f:
+        f.write("FFT Spectrum (offline)\n")
+        f.write(f"FFT Length,{fft_size}\n")
+        f.write(f"Window,{window}\n")
+        f.write(f"Files,{len(wav_files)}\n")
+        pd.DataFrame(columns.T, columns=labels).to_csv(f, index=False, float_format="%.5f")
+    store_columns(csv_file, columns)
+    print(f"Saved as: {csv_file}")
+    return csv_file
+
+
+def segment_files(fs, paths):
+    return sorted(glob.glob(f"{paths['segment_result_folder'][fs]}/{fs}_multitone_*.wav"))
+
+
+def analyze_segments(fs, paths, fft_size=FFT_SIZE, window="blackmanharris", max_workers=None):
+    """Offline stand-in for the APx multitone step: segment folder in, raw-data CSV out."""
+    wav_files = segment_files(fs, paths)
+    if not wav_files:
+        raise FileNotFoundError(f"No {fs}_multitone_*.wav files in {paths['segment_result_folder'][fs]}")
+
+    spectra = analyze_files(wav_files, fft_size, window, max_workers)
+    return write_csv(paths["csv_raw_data_files"][fs], wav_files, spectra, fft_size, window)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline multitone FFT analysis")
+    parser.add_argument(
+        "--fs",
+        type=str,
+        choices=["48k", "96k"],
+        default="48k",
+        help="Sampling rate (48k or 96k)",
+    )
+    parser.add_argument(
+        "--window",
+        type=str,
+        default="blackmanharris",
+        help="scipy.signal window name (default: blackmanharris)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: one per CPU)",
+    )
+    args = parser.parse_args(argv)
+
+    paths = load_paths()
+    analyze_segments(args.fs, paths, window=args.window, max_workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
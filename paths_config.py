@@ -0,0 +1,23 @@
+import os
+import json
+
+PATHS_FILE = "audio_quality_paths.json"
+
+_loaded = {}
+_active = None
+
+
+def load_paths(paths_file=None):
+    """The parsed paths JSON, read once per process on first use.
+
+    Without `paths_file`, the file loaded last is returned (so a --paths or
+    --folder applied by the entry point is seen everywhere), else
+    $AUDIO_QUALITY_PATHS or audio_quality_paths.json in the working directory.
+    """
+    global _active
+    paths_file = paths_file or _active or os.environ.get("AUDIO_QUALITY_PATHS", PATHS_FILE)
+    if paths_file not in _loaded:
+        with open(paths_file, "r") as f:
+            _loaded[paths_file] = json.load(f)
+    _active = paths_file
+    return _loaded[paths_file]
@@ -1,21 +1,118 @@
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Image, Spacer
-from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
+from reportlab import rl_config
 from reportlab.lib.units import inch
-from reportlab.lib.utils import ImageReader
 from reportlab.lib.enums import TA_LEFT
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image as PILImage
+import argparse
+import hashlib
 import json
+import os
+import re
+import time
+
+from apx_export import EXPORT_MANIFEST
+from csv_analyze import multitoneAnalysis
+
+# Graph names (PNG stems) the APx export writes into graph_folder[fs].
+GRAPH_NAMES = [
+    os.path.splitext(target)[0]
+    for results in EXPORT_MANIFEST.values()
+    for exports in results.values()
+    for kind, target in exports
+    if kind == "png"
+]
+
+
+def _prepare_image(src, dst, max_px, image_format="jpeg", quality=85):
+    """Downscale `src` to fit `max_px` and write it as JPEG or 256-colour PNG; returns the new size."""
+    with PILImage.open(src) as img:
+        img.load()
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            img = img.convert("RGBA")
+            flat = PILImage.new("RGB", img.size, "white")
+            flat.paste(img, mask=img.getchannel("A"))
+            img = flat
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.thumbnail((max_px, max_px), PILImage.LANCZOS)
+        if image_format == "jpeg":
+            img.save(dst, "JPEG", quality=quality, optimize=True)
+        else:
+            if img.mode == "RGB":
+                img = img.quantize(256)
+            img.save(dst, "PNG", optimize=True)
+        return img.size
+
+
+class imageCache:
+    """Downscaled, compressed copies of the report images, decoded once per source file.
+
+    Copies live in `cache_dir` under a name derived from the source path,
+    modification time, size and the output settings, so an unchanged graph is
+    not reprocessed on the next build. `prepare()` converts a batch in worker
+    processes before ReportLab runs; `get()` returns the copy and its pixel
+    size without opening the image again. JPEG copies are embedded by
+    ReportLab as they are, PNG copies are decoded and recompressed.
+    """
+
+    def __init__(self, cache_dir=".report_cache", max_px=750, image_format="jpeg", quality=85):
+        self.cache_dir = cache_dir
+        self.max_px = max_px
+        self.image_format = image_format
+        self.quality = quality
+        self.entries = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _target(self, path):
+        stat = os.stat(path)
+        key = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{self.max_px}|{self.image_format}|{self.quality}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        stem = os.path.splitext(os.path.basename(path))[0]
+        extension = "jpg" if self.image_format == "jpeg" else "png"
+        return os.path.join(self.cache_dir, f"{stem}_{digest}.{extension}")
+
+    def prepare(self, image_paths, max_workers=None):
+        """Convert every image not yet cached; returns the number of images processed."""
+        pending = {}
+        for path in dict.fromkeys(image_paths):
+            if path in self.entries:
+                continue
+            target = self._target(path)
+            if os.path.exists(target):
+                with PILImage.open(target) as img:
+                    self.entries[path] = (target, img.size)
+            else:
+                pending[path] = target
+        if len(pending) > 1:
+            with ProcessPoolExecutor(max_workers) as pool:
+                futures = {
+                    path: pool.submit(_prepare_image, path, target, self.max_px, self.image_format, self.quality)
+                    for path, target in pending.items()
+                }
+                for path, future in futures.items():
+                    self.entries[path] = (pending[path], future.result())
+        else:
+            for path, target in pending.items():
+                self.entries[path] = (target, _prepare_image(path, target, self.max_px, self.image_format, self.quality))
+        return len(pending)
+
+    def get(self, path):
+        if path not in self.entries:
+            self.prepare([path])
+        return self.entries[path]
 
-with open("report_info.json", "r", encoding="utf-8") as f:
-    info = json.load(f)
 
 class AudioReportGenerator:
-    def __init__(self, filename, page_size=(17 * inch, 30 * inch)):
+    def __init__(self, filename, page_size=(17 * inch, 30 * inch), image_cache=None):
         self.doc = SimpleDocTemplate(filename, pagesize=page_size)
         self.styles = getSampleStyleSheet()
         self._set_styles()
         self.story = []
+        self.image_cache = image_cache
+        self.image_sizes = {}
 
     def _set_styles(self):
         self.styles.add(ParagraphStyle(
@@ -62,12 +159,21 @@ class AudioReportGenerator:
         table.setStyle(style)
         self.story.append(table)
 
-    def load_image(self, path, max_width=5* inch, max_height=5 * inch):
-        img_reader = ImageReader(path)
-        orig_width, orig_height = img_reader.getSize()
+    def image_size(self, path):
+        """Source (or cached copy) and pixel size of `path`; each file is opened at most once."""
+        if self.image_cache is not None:
+            return self.image_cache.get(path)
+        if path not in self.image_sizes:
+            with PILImage.open(path) as img:
+                self.image_sizes[path] = (path, img.size)
+        return self.image_sizes[path]
+
+    def load_image(self, path, max_width=5 * inch, max_height=5 * inch):
+        # ReportLab embeds a file once per document however many cells use it.
+        source, (orig_width, orig_height) = self.image_size(path)
         scale = min(max_width / orig_width, max_height / orig_height)
-        return Image(path, width=orig_width * scale, height=orig_height * scale, hAlign='LEFT')
-    
+        return Image(source, width=orig_width * scale, height=orig_height * scale, hAlign='LEFT')
+
     def add_image(self, image_path, max_width=5 * inch, max_height=5 * inch):
         img = self.load_image(image_path, max_width, max_height)
         self.story.append(img)
@@ -76,80 +182,182 @@ class AudioReportGenerator:
         self.doc.build(self.story)
 
 
-report = AudioReportGenerator("simple_report.pdf")
-img_path = "C:/Users/chimtsen/APx500_Python_Guide/audio_report/graph/48k/DNR.png"
-
-report.add_paragraph(info["source_info"].get('Source', ''), style='HeadingLeft', font_size=16, space_after=12)
-report.add_table([
-    ['Date', info["source_info"].get('Date', '')],
-    ['Source', info["source_info"].get('Source', '')],
-    ['Sink', info["sink_info"].get('Sink', '')],
-    ['Codec', info["source_info"].get('Codec', '')],
-    ['Bit rate', info["source_info"].get('Bit rate', '')],
-    ['Prerequisite', info["source_info"].get('Prerequisite', '')],
-    ['Others', info["source_info"].get('Others', '')]
-], col_widths=[1.5 * inch, 5.5 * inch])
-
-for text in ["QHS:", "Logo:", "Lossless enabled?", "Low Latency mode with 48kHz:", "SWB"]:
-    report.add_paragraph(text, bold=True)
-
-for item in ['<para leftIndent="10">• Uplink bandwidth</para>', '<para leftIndent="10">• Downlink bandwidth</para>']:
-    report.add_paragraph(item)
-    report.add_image(img_path)
-
-img_path = "C:/Users/chimtsen/APx500_Python_Guide/audio_report/graph/48k/DNR.png"
-img = report.load_image(img_path)
-
-# 48kHz DNR
-report.add_paragraph("48kHz", bold=True)
-report.add_paragraph('<para leftIndent="10">• DNR</para>')
-report.add_table([
-    ['R2.1', 'R3(Left)', 'R3(Right)'],
-    [img, img, img]
-])
-
-# 48kHz Frequency Response
-report.add_paragraph('<para leftIndent="10">• Frequency Response</para>')
-report.add_table([
-    ['R2.1', 'R3'],
-    [img, ''],
-    [img, ''],
-    [img, ''],
-    [img, '']
-])
-
-# 48kHz Multitone
-report.add_paragraph('<para leftIndent="10">• Multitone</para>')
-report.add_table([
-    ['R2.1', 'R3'],
-    [img, ''],
-    [img, '']
-])
-
-# 96kHz DNR
-report.add_paragraph("96kHz",bold=True)
-report.add_paragraph('<para leftIndent="10">• DNR</para>')
-report.add_table([
-    ['R2.1', 'R3(Left)', 'R3(Right)'],
-    [img, '', '']
-])
-
-# 96kHz Frequency Response
-report.add_paragraph('<para leftIndent="10">• Frequency Response</para>')
-report.add_table([
-    ['R2.1', 'R3'],
-    [img, ''],
-    [img, ''],
-    [img, ''],
-    [img, '']
-])
-
-# 96kHz Multitone
-report.add_paragraph('<para leftIndent="10">• Multitone</para>')
-report.add_table([
-    ['R2.1', 'R3'],
-    [img, ''],
-    [img, '']
-])
-
-report.build()
\ No newline at end of file
+def lookup(data, dotted):
+    """'source_info.Date' -> data['source_info']['Date'] ('' when missing)."""
+    value = data
+    for key in dotted.split("."):
+        if not isinstance(value, dict):
+            return ""
+        value = value.get(key, "")
+    return value
+
+
+def fill(text, data):
+    """Replace {dotted.keys} in `text` with values from `data`."""
+    return re.sub(r"\{([^{}]+)\}", lambda m: str(lookup(data, m.group(1))), text)
+
+
+def format_metric(value):
+    if isinstance(value, bool):
+        return "Pass" if value else "Fail"
+    if value is None:
+        return ""
+    return str(value).replace("✅", "OK").replace("❌", "NG")
+
+
+def results_from_paths(paths, rates=("48k", "96k")):
+    """One DUT's entry of a results manifest from an audio_quality_paths.json.
+
+    Graphs are the PNGs of the APx export found in graph_folder[fs]; metrics
+    come from csv_analyze on csv_raw_data_files[fs] when it exists.
+    """
+    entry = {}
+    for fs in rates:
+        graph_folder = paths["graph_folder"].get(fs)
+        graphs = {}
+        if graph_folder:
+            for name in GRAPH_NAMES:
+                path = f"{graph_folder}/{name}.png"
+                if os.path.exists(path):
+                    graphs[name] = path
+
+        metrics = {}
+        csv_file = paths.get("csv_raw_data_files", {}).get(fs)
+        if csv_file and os.path.exists(csv_file):
+            results = multitoneAnalysis(fs).analyze_files([csv_file])[csv_file]
+            metrics["multitone"] = [
+                {"Channel": f"Multitone {i // 2 + 1}_{i % 2 + 1}", **res} for i, res in enumerate(results)
+            ]
+        entry[fs] = {"graphs": graphs, "metrics": metrics}
+    return entry
+
+
+def layout_images(results, layout):
+    """Every image path the layout will place, in order, for preprocessing."""
+    images = []
+    for fs in layout.get("rates", {}):
+        for block in layout.get("per_rate", []):
+            if block["type"] != "graph_table":
+                continue
+            for dut in results["duts"].values():
+                graphs = dut.get(fs, {}).get("graphs", {})
+                images += [graphs[name] for name in block["graphs"] if name in graphs]
+    return [path for path in images if os.path.exists(path)]
+
+
+def render_block(report, block, info, results, fs=None, image_box=(5 * inch, 5 * inch)):
+    kind = block["type"]
+    duts = results["duts"]
+    if kind == "heading":
+        report.add_paragraph(fill(block["text"], info), style="HeadingLeft",
+                             font_size=block.get("font_size"), space_after=block.get("space_after", 0))
+    elif kind == "paragraph":
+        report.add_paragraph(fill(block["text"], info), bold=block.get("bold", False))
+    elif kind == "bullets":
+        for text in block["items"]:
+            report.add_paragraph(f'<para leftIndent="10">• {fill(text, info)}</para>')
+    elif kind == "info_table":
+        widths = [w * inch for w in block["col_widths_inch"]] if "col_widths_inch" in block else None
+        report.add_table([[label, lookup(info, key)] for label, key in block["rows"]], col_widths=widths)
+    elif kind == "graph_table":
+        report.add_paragraph(f'<para leftIndent="10">• {block["title"]}</para>')
+        rows = [list(duts)]
+        for name in block["graphs"]:
+            row = []
+            for dut_name, dut in duts.items():
+                path = dut.get(fs, {}).get("graphs", {}).get(name)
+                if path and os.path.exists(path):
+                    row.append(report.load_image(path, *image_box))
+                else:
+                    if path:
+                        print(f"⚠️ {dut_name} {fs} {name}: {path} not found")
+                    row.append("")
+            rows.append(row)
+        report.add_table(rows)
+    elif kind == "metrics_table":
+        rows = [["DUT"] + [label for label, _ in block["columns"]]]
+        for dut_name, dut in duts.items():
+            for res in dut.get(fs, {}).get("metrics", {}).get(block["metric"], []):
+                rows.append([dut_name] + [format_metric(res.get(key)) for _, key in block["columns"]])
+        if len(rows) > 1:
+            report.add_paragraph(f'<para leftIndent="10">• {block["title"]}</para>')
+            report.add_table(rows)
+    else:
+        raise ValueError(f"Unknown layout block type '{kind}'")
+
+
+def build_report(results, layout, info, output, cache_dir=".report_cache", dpi=150, image_format="jpeg",
+                 quality=85, max_workers=None):
+    """Render a results manifest through a layout template into `output`.
+
+    All graphs are downscaled to `dpi` at their printed size and compressed
+    in worker processes first; ReportLab then only lays out the small copies.
+    """
+    page_size = tuple(v * inch for v in layout.get("page_size_inch", (17, 30)))
+    image_box = tuple(v * inch for v in layout.get("image_max_inch", (5, 5)))
+    cache = imageCache(cache_dir, int(max(image_box) / inch * dpi), image_format, quality)
+
+    start = time.perf_counter()
+    images = layout_images(results, layout)
+    converted = cache.prepare(images, max_workers)
+    print(f"Images: {len(set(images))} unique, {converted} converted in {time.perf_counter() - start:.2f} s")
+
+    report = AudioReportGenerator(output, page_size, image_cache=cache)
+    for block in layout.get("header", []):
+        render_block(report, block, info, results, image_box=image_box)
+    for fs, label in layout.get("rates", {}).items():
+        report.add_paragraph(label, bold=True)
+        for block in layout.get("per_rate", []):
+            render_block(report, block, info, results, fs, image_box)
+    # Binary streams instead of ASCII85 text: a quarter smaller for the same images.
+    rl_config.useA85 = 0
+    report.build()
+    print(f"Saved as: {output} ({os.path.getsize(output) / 1e6:.2f} MB)")
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the audio quality PDF report from a results manifest")
+    parser.add_argument(
+        "--dut",
+        type=str,
+        nargs="+",
+        default=None,
+        help="NAME=paths.json per DUT (default: DUT=audio_quality_paths.json)",
+    )
+    parser.add_argument("--results", type=str, help="Results manifest JSON to use instead of --dut")
+    parser.add_argument("--save-results", type=str, help="Also write the collected results manifest to this JSON file")
+    parser.add_argument("--layout", type=str, default="report_layout.json", help="Layout template JSON")
+    parser.add_argument("--info", type=str, default="report_info.json", help="Source/sink information JSON")
+    parser.add_argument("--output", type=str, default="simple_report.pdf", help="PDF file to write")
+    parser.add_argument("--dpi", type=int, default=150, help="Resolution of the embedded graphs at their printed size")
+    parser.add_argument("--format", type=str, default="jpeg", choices=["jpeg", "png"], help="Format of the embedded graphs")
+    parser.add_argument("--quality", type=int, default=85, help="JPEG quality of the embedded graphs")
+    parser.add_argument("--cache-dir", type=str, default=".report_cache", help="Folder for the downscaled graphs")
+    parser.add_argument("--workers", type=int, default=None, help="Number of image worker processes")
+    args = parser.parse_args(argv)
+
+    with open(args.layout, "r", encoding="utf-8") as f:
+        layout = json.load(f)
+    with open(args.info, "r", encoding="utf-8") as f:
+        info = json.load(f)
+
+    if args.results:
+        with open(args.results, "r", encoding="utf-8") as f:
+            results = json.load(f)
+    else:
+        results = {"duts": {}}
+        for spec in args.dut or ["DUT=audio_quality_paths.json"]:
+            name, _, paths_file = spec.partition("=")
+            with open(paths_file, "r", encoding="utf-8") as f:
+                results["duts"][name] = results_from_paths(json.load(f), tuple(layout.get("rates", {})))
+    if args.save_results:
+        with open(args.save_results, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4, ensure_ascii=False)
+        print(f"Saved as: {args.save_results}")
+
+    build_report(results, layout, info, args.output, args.cache_dir, args.dpi, args.format, args.quality, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import numpy as np
+from scipy.ndimage import maximum_filter1d
+
+
+def forward_max(x, size):
+    """max(x[..., i : i + size]) for every i, -inf past the end; O(n) whatever `size` is."""
+    if size == 1:
+        return x
+    return maximum_filter1d(x, size, axis=-1, mode="constant", cval=-np.inf, origin=-(size // 2))
+
+
+def backward_max(x, size):
+    """max(x[..., i - size + 1 : i + 1]) for every i, clipped at the start."""
+    return forward_max(x[..., ::-1], size)[..., ::-1]
+
+
+def spacing_bins(freq, spacing_hz):
+    """Bins within which a neighbour is closer than `spacing_hz` on a uniform frequency axis."""
+    freq = np.asarray(freq, dtype=np.float64)
+    bin_width = (freq[..., -1] - freq[..., 0]).max() / (freq.shape[-1] - 1)
+    return max(1, int(np.ceil(spacing_hz / bin_width)) - 1)
+
+
+def peak_mask(data, spacing=1, limit=None):
+    """Bins strictly greater than every other bin within ±`spacing` (and > `limit`), as a bool mask.
+
+    Same peaks as find_peak_open_src.findpeaks() in one sliding-window pass:
+    the maxima of the `spacing` bins on either side come from a forward
+    and a backward window maximum, each shifted by one bin. Works on the
+    last axis, so a (channels, bins) array is handled in one call. NaN bins
+    are never peaks and no bin next to one is either.
+    """
+    x = np.asarray(data, dtype=np.float64)
+    nan = np.isnan(x)
+    if nan.any():
+        x = np.where(nan, np.inf, x)
+
+    # Right side: max(x[i + 1 : i + 1 + spacing]); left side: max(x[i - spacing : i]), clipped at the ends.
+    mask = np.ones(x.shape, dtype=bool)
+    mask[..., :-1] = x[..., :-1] > forward_max(x, spacing)[..., 1:]
+    mask[..., 1:] &= x[..., 1:] > backward_max(x, spacing)[..., :-1]
+    mask &= ~nan
+    if limit is not None:
+        mask &= x > limit
+    return mask
+
+
+def rising_mask(data):
+    """Local maxima as detect_peaks(edge="rising") finds them: a rise into the bin and no rise out of it.
+
+    The first bin of a flat top counts; the two end bins and any bin at or
+    next to a NaN do not.
+    """
+    x = np.asarray(data, dtype=np.float64)
+    nan = np.isnan(x)
+    dx = np.diff(x, axis=-1)
+    mask = np.zeros(x.shape, dtype=bool)
+    mask[..., 1:-1] = (dx[..., 1:] <= 0) & (dx[..., :-1] > 0)
+    near_nan = nan.copy()
+    near_nan[..., 1:] |= nan[..., :-1]
+    near_nan[..., :-1] |= nan[..., 1:]
+    return mask & ~near_nan
+
+
+def suppress(data, mask, distance):
+    """Greedy minimum-distance selection among the `mask` bins, like detect_peaks' `mpd` loop.
+
+    The greedy walk keeps the highest remaining peak and drops every peak
+    within `distance` bins of it. Instead of walking, each round keeps every
+    undecided peak that outranks all undecided peaks within `distance` (no
+    higher peak can still remove it) and drops the peaks those remove; the
+    number of rounds is the longest chain of overlapping peaks, not the
+    number of peaks. Equal heights are ranked by bin, lower first.
+    """
+    x = np.asarray(data, dtype=np.float64)
+    mask = np.asarray(mask, dtype=bool)
+    if distance < 1 or not mask.any():
+        return mask
+
+    size = 2 * distance + 1
+    edge = np.full(x.shape[:-1] + (1,), -np.inf)
+    kept = np.zeros_like(mask)
+    undecided = mask.copy()
+    while undecided.any():
+        live = np.where(undecided, x, -np.inf)
+        # Strictly above the left side and not below the right: equal heights go lowest bin first.
+        left = np.concatenate([edge, backward_max(live, distance)[..., :-1]], axis=-1)
+        right = np.concatenate([forward_max(live, distance)[..., 1:], edge], axis=-1)
+        best = undecided & (live > left) & (live >= right)
+        kept |= best
+        undecided &= maximum_filter1d(best.astype(np.uint8), size, axis=-1, mode="constant") == 0
+    return kept
+
+
+def detect_peak_mask(data, mph=None, mpd=1, threshold=0):
+    """find_peak_open_src.detect_peaks() (edge="rising", no kpsh/valley) as a bool mask over the last axis."""
+    x = np.asarray(data, dtype=np.float64)
+    mask = rising_mask(x)
+    if mph is not None:
+        mask &= x >= mph
+    if threshold > 0:
+        step = np.full(x.shape, -np.inf)
+        step[..., 1:-1] = np.minimum(x[..., 1:-1] - x[..., :-2], x[..., 1:-1] - x[..., 2:])
+        mask &= step >= threshold
+    if mpd > 1:
+        mask = suppress(x, mask, mpd)
+    return mask
+
+
+def indices(mask):
+    """Peak bins of a 1-D mask, or a list with those of every row of a 2-D one."""
+    if mask.ndim == 1:
+        return np.flatnonzero(mask)
+    return [np.flatnonzero(row) for row in mask]
+
+
+def findpeaks(data, spacing=50, limit=None, freq=None, spacing_hz=None):
+    """Drop-in for find_peak_open_src.findpeaks() that also takes (channels, bins) input.
+
+    With `freq` and `spacing_hz`, the spacing is given in Hz instead of bins.
+    """
+    if spacing_hz is not None:
+        spacing = spacing_bins(freq, spacing_hz)
+    return indices(peak_mask(data, spacing, limit))
+
+
+def detect_peaks(x, mph=None, mpd=1, threshold=0):
+    """Drop-in for find_peak_open_src.detect_peaks() with the default edge/kpsh/valley options."""
+    return indices(detect_peak_mask(x, mph, mpd, threshold))
@@ -0,0 +1,264 @@
+import re
+import time
+import sqlite3
+import argparse
+import statistics
+
+RESULTS_DB = "audio_results.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    folder TEXT NOT NULL,
+    fs TEXT NOT NULL,
+    measurement TEXT NOT NULL,
+    source TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_lookup ON runs (measurement, fs, folder, created);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    item TEXT NOT NULL,
+    channel INTEGER NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, metric, item, channel)
+) WITHOUT ROWID;
+"""
+
+
+def multitone_rows(results):
+    """csv_analyze results -> (item, channel, metric, value); item is the multitone segment, as in "48k Multitone 3_2"."""
+    rows = []
+    for i, res in enumerate(results):
+        item, channel = str(i // 2 + 1), i % 2 + 1
+        if "Error" in res:
+            continue
+        rows += [
+            (item, channel, "Max_dBFS", res["Max_dBFS"]),
+            (item, channel, "Min_dBFS", res["Min_dBFS"]),
+            (item, channel, "Deviation_dB", res["Deviation_dB"]),
+            (item, channel, "Deviation Pass", float(res["Deviation Pass"])),
+            (item, channel, "Tone Bin", res["Tone Bin"]),
+            (item, channel, "Bin Match", float(res["Bin Match"] == "✅")),
+        ]
+    return rows
+
+
+def dnr_rows(results):
+    """dnr_offline results -> (item, channel, metric, value)."""
+    rows = []
+    for res in results:
+        for metric, value in res.items():
+            if metric != "Channel":
+                rows.append(("DNR", res["Channel"], metric, None if value is None else float(value)))
+    return rows
+
+
+SWEEP_COLUMN = re.compile(r"^Ch(\d+)(?:-Ch1)? (.+)$")
+
+
+def sweep_rows(table):
+    """sweep_offline table -> (item, channel, metric, value); item is the step number, channel 0 the step frequency."""
+    steps = [str(step) for step in table["Step"]]
+    rows = [(step, 0, "Frequency (Hz)", float(f)) for step, f in zip(steps, table["Frequency (Hz)"])]
+    for column in table.columns:
+        match = SWEEP_COLUMN.match(column)
+        if match:
+            channel, metric = int(match.group(1)), match.group(2)
+            rows += [(step, channel, metric, float(v)) for step, v in zip(steps, table[column])]
+    return rows
+
+
+class resultsStore:
+    """Measurement results of every run in one SQLite file.
+
+    A run is one measurement of one capture: customer folder, rate,
+    measurement name ("multitone", "dnr", "sweep"), source file and time.
+    Its numbers are stored one row per (item, channel, metric), so runs of
+    hundreds of devices can be compared without re-parsing any CSV.
+    """
+
+    def __init__(self, db_path=RESULTS_DB):
+        self.db_path = db_path
+        # Stages write from worker processes; wait for the lock instead of failing.
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, measurement, fs, rows, folder="", source=None, created=None):
+        """Store one run and its (item, channel, metric, value) rows in a single transaction; returns the run id."""
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO runs (folder, fs, measurement, source, created) VALUES (?, ?, ?, ?, ?)",
+                (folder or "", fs, measurement, source, time.time() if created is None else created),
+            )
+            run_id = cur.lastrowid
+            self.conn.executemany(
+                "INSERT INTO results (run_id, item, channel, metric, value) VALUES (?, ?, ?, ?, ?)",
+                ((run_id, item, channel, metric, value) for item, channel, metric, value in rows),
+            )
+        return run_id
+
+    def runs(self, measurement=None, fs=None, folder=None, since=None, limit=None):
+        """Runs matching every given filter, newest first."""
+        where, args = self._filters(measurement, fs, folder, since)
+        sql = f"SELECT * FROM runs{where} ORDER BY created DESC, id DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [dict(row) for row in self.conn.execute(sql, args)]
+
+    def results(self, run_id, metric=None):
+        """(item, channel, metric, value) rows of one run."""
+        sql = "SELECT item, channel, metric, value FROM results WHERE run_id = ?"
+        args = [run_id]
+        if metric:
+            sql += " AND metric = ?"
+            args.append(metric)
+        return [tuple(row) for row in self.conn.execute(sql + " ORDER BY metric, CAST(item AS INTEGER), item, channel", args)]
+
+    def latest(self, measurement, metric, fs=None, folder=None, since=None):
+        """The newest run of every folder (and rate): rows of folder, fs, run_id, created, item, channel, value."""
+        where, args = self._filters(measurement, fs, folder, since)
+        # With MAX(), SQLite takes the bare `id` from the row holding the maximum.
+        sql = f"""
+            WITH newest AS (SELECT id, MAX(created) FROM runs{where} GROUP BY folder, fs)
+            SELECT r.folder, r.fs, r.id AS run_id, r.created, v.item, v.channel, v.value
+            FROM newest
+            JOIN runs r ON r.id = newest.id
+            JOIN results v ON v.run_id = r.id AND v.metric = ?
+            ORDER BY r.folder, r.fs, CAST(v.item AS INTEGER), v.item, v.channel
+        """
+        return [dict(row) for row in self.conn.execute(sql, args + [metric])]
+
+    def compare(self, run_a, run_b, metric=None):
+        """(item, channel, metric, a, b, b - a) for every value present in both runs."""
+        sql = """
+            SELECT a.item, a.channel, a.metric, a.value, b.value, b.value - a.value
+            FROM results a JOIN results b
+              ON b.run_id = ? AND b.metric = a.metric AND b.item = a.item AND b.channel = a.channel
+            WHERE a.run_id = ?
+        """
+        args = [run_b, run_a]
+        if metric:
+            sql += " AND a.metric = ?"
+            args.append(metric)
+        sql += " ORDER BY a.metric, CAST(a.item AS INTEGER), a.item, a.channel"
+        return [tuple(row) for row in self.conn.execute(sql, args)]
+
+    def drift(self, measurement, metric, fs, threshold, since=None):
+        """Latest value of every folder against the fleet median of the same item and channel.
+
+        Returns the rows further than `threshold` from the median, largest
+        first, each with its "median" and "delta".
+        """
+        rows = self.latest(measurement, metric, fs, since=since)
+        by_key = {}
+        for row in rows:
+            if row["value"] is not None:
+                by_key.setdefault((row["item"], row["channel"]), []).append(row["value"])
+        medians = {key: statistics.median(values) for key, values in by_key.items()}
+
+        flagged = []
+        for row in rows:
+            if row["value"] is None:
+                continue
+            median = medians[(row["item"], row["channel"])]
+            if abs(row["value"] - median) > threshold:
+                flagged.append({**row, "median": median, "delta": row["value"] - median})
+        return sorted(flagged, key=lambda row: -abs(row["delta"]))
+
+    @staticmethod
+    def _filters(measurement, fs, folder, since):
+        clauses, args = [], []
+        for column, value in (("measurement", measurement), ("fs", fs), ("folder", folder)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                args.append(value)
+        if since is not None:
+            clauses.append("created >= ?")
+            args.append(since)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+
+def record_results(db_path, measurement, fs, rows, folder="", source=None):
+    """Open the store, record one run and close it again; returns the run id."""
+    with resultsStore(db_path) as store:
+        return store.record(measurement, fs, rows, folder, source)
+
+
+def format_time(created):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created))
+
+
+def parse_time(text):
+    return time.mktime(time.strptime(text, "%Y-%m-%d"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the measurement results stored across runs")
+    parser.add_argument("--db", type=str, default=RESULTS_DB, help=f"Results database (default: {RESULTS_DB})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    runs = commands.add_parser("runs", help="List the stored runs, newest first")
+    runs.add_argument("--measurement", type=str, help="multitone, dnr or sweep")
+    runs.add_argument("--fs", type=str, help="Sampling rate (48k or 96k)")
+    runs.add_argument("--folder", type=str, help="Customer folder")
+    runs.add_argument("--since", type=parse_time, help="Only runs on or after this date (YYYY-MM-DD)")
+    runs.add_argument("--limit", type=int, default=50, help="Number of runs to show (default: 50)")
+
+    show = commands.add_parser("show", help="Print the results of one run")
+    show.add_argument("run", type=int, help="Run id")
+    show.add_argument("--metric", type=str, help="Only this metric")
+
+    compare = commands.add_parser("compare", help="Difference of every value between two runs")
+    compare.add_argument("run_a", type=int, help="Reference run id")
+    compare.add_argument("run_b", type=int, help="Run id to compare")
+    compare.add_argument("--metric", type=str, help="Only this metric")
+
+    drift = commands.add_parser("drift", help="Folders whose latest run is far from the fleet median")
+    drift.add_argument("--measurement", type=str, default="multitone", help="Measurement (default: multitone)")
+    drift.add_argument("--metric", type=str, default="Deviation_dB", help="Metric (default: Deviation_dB)")
+    drift.add_argument("--fs", type=str, default="48k", help="Sampling rate (default: 48k)")
+    drift.add_argument("--threshold", type=float, default=1.0, help="Allowed distance from the median (default: 1.0)")
+    drift.add_argument("--since", type=parse_time, help="Only runs on or after this date (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+
+    with resultsStore(args.db) as store:
+        if args.command == "runs":
+            for run in store.runs(args.measurement, args.fs, args.folder, args.since, args.limit):
+                print(
+                    f"{run['id']:>6}  {format_time(run['created'])}  {run['folder'] or '-':<20} {run['fs']:<4}"
+                    f" {run['measurement']:<10} {run['source'] or ''}"
+                )
+        elif args.command == "show":
+            for item, channel, metric, value in store.results(args.run, args.metric):
+                print(f"{metric:<24} {item:>6} Ch{channel}  {value}")
+        elif args.command == "compare":
+            for item, channel, metric, a, b, diff in store.compare(args.run_a, args.run_b, args.metric):
+                marker = "" if diff is None or diff == 0 else f"  ({diff:+.3f})"
+                print(f"{metric:<24} {item:>6} Ch{channel}  {a} -> {b}{marker}")
+        else:
+            flagged = store.drift(args.measurement, args.metric, args.fs, args.threshold, args.since)
+            for row in flagged:
+                print(
+                    f"⚠️ {row['folder'] or '-'} {row['fs']} {row['item']} Ch{row['channel']}: {args.metric}"
+                    f" {row['value']} (median {row['median']:.3f}, {row['delta']:+.3f})"
+                )
+            if not flagged:
+                print(f"✅ No {args.metric} further than {args.threshold} from the median")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,218 @@
+import argparse
+from functools import lru_cache
 import numpy as np
-import matplotlib.pyplot as plt
-import scipy.io.wavfile as wav
-import os
-
-# Function to perform spectral analysis and visualize the spectrogram
-def analyze_audio_spectrum(file_path, target_freq=1000, tolerance=50):
-    sample_rate, data = wav.read(file_path)
-
-    # If stereo, convert to mono
-    if len(data.shape) == 2:
-        data = data.mean(axis=1)
-
-    # Compute the FFT
-    n = len(data)
-    freqs = np.fft.rfftfreq(n, d=1/sample_rate)
-    fft_spectrum = np.abs(np.fft.rfft(data))
-
-    # Plot the spectrum
-    plt.figure(figsize=(12, 6))
-    plt.plot(freqs, fft_spectrum)
-    plt.title("Frequency Spectrum")
-    plt.xlabel("Frequency (Hz)")
-    plt.ylabel("Amplitude")
-    plt.grid(True)
-
-    # Highlight the 1kHz region and mark other frequencies
-    plt.axvspan(target_freq - tolerance, target_freq + tolerance, color='green', alpha=0.3, label='Expected 1kHz Tone')
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig("spectrum_analysis.png")
-    plt.show()
-
-    # Identify significant non-1kHz components
-    mask = (freqs < target_freq - tolerance) | (freqs > target_freq + tolerance)
-    significant_freqs = freqs[mask][fft_spectrum[mask] > np.max(fft_spectrum) * 0.1]
+import scipy.fft
+import scipy.signal
+from numpy.lib.stride_tricks import sliding_window_view
+from wav_io import wavInfo, iter_blocks
 
+
+@lru_cache(maxsize=8)
+def stft_window(name, nperseg):
+    return scipy.signal.get_window(name, nperseg).astype(np.float32)
+
+
+def iter_frames(info, nperseg, hop, batch_samples=1 << 20):
+    """Yield (first_frame_index, frames) with frames shaped (n, channels, nperseg), float32.
+
+    The file is read in blocks of about `batch_samples` frame samples; the
+    overlap between blocks is carried over, so memory does not grow with the file.
+    """
+    frames_per_batch = max(1, batch_samples // (nperseg * info.channels))
+    carry = np.zeros((0, info.channels), dtype=np.float32)
+    index = 0
+    for _, x in iter_blocks(info, hop * frames_per_batch):
+        buf = np.concatenate([carry, x]) if len(carry) else x
+        count = (len(buf) - nperseg) // hop + 1 if len(buf) >= nperseg else 0
+        if count:
+            yield index, sliding_window_view(buf, nperseg, axis=0)[::hop][:count]
+            index += count
+        carry = buf[count * hop :]
+
+
+def frame_power(frames, window, workers=-1):
+    """|rfft|^2 of windowed frames, scaled so a full-scale sine reads 1.0 (0 dBFS)."""
+    spectrum = scipy.fft.rfft(frames * window, axis=-1, workers=workers)
+    power = spectrum.real**2 + spectrum.imag**2
+    power *= 4 / window.sum() ** 2
+    return power
+
+
+def _segment(info, nperseg, overlap):
+    nperseg = min(nperseg, info.nframes)
+    if nperseg < 2:
+        raise ValueError(f"{info.path} is too short to analyze")
+    return nperseg, max(1, int(nperseg * (1 - overlap)))
+
+
+def welch_spectrum(wav_path, nperseg=8192, overlap=0.5, window="hann", workers=-1):
+    """Welch-averaged power spectrum of every channel, streamed from the file.
+
+    Returns float32 (freq, dbfs[channels, bins]); a full-scale sine reads 0 dBFS.
+    """
+    info = wavInfo(wav_path)
+    nperseg, hop = _segment(info, nperseg, overlap)
+    win = stft_window(window, nperseg)
+
+    total = np.zeros((info.channels, nperseg // 2 + 1), dtype=np.float64)
+    count = 0
+    for _, frames in iter_frames(info, nperseg, hop):
+        total += frame_power(frames, win, workers).sum(axis=0)
+        count += len(frames)
+
+    freq = scipy.fft.rfftfreq(nperseg, 1 / info.framerate).astype(np.float32)
+    with np.errstate(divide="ignore"):
+        dbfs = 10 * np.log10(total / count)
+    return freq, dbfs.astype(np.float32)
+
+
+def stft_spectrogram(wav_path, nperseg=4096, overlap=0.5, window="hann", columns=1600, workers=-1):
+    """Spectrogram of the channel-averaged power, pooled to at most `columns` time columns.
+
+    Every STFT frame is computed, then its power is averaged into the time
+    column it falls in, so the result is (bins, columns) however long the
+    file is. Returns float32 (times, freq, dbfs).
+    """
+    info = wavInfo(wav_path)
+    nperseg, hop = _segment(info, nperseg, overlap)
+    win = stft_window(window, nperseg)
+    n_frames = (info.nframes - nperseg) // hop + 1
+    columns = min(columns, n_frames)
+
+    power = np.zeros((columns, nperseg // 2 + 1), dtype=np.float32)
+    counts = np.zeros(columns, dtype=np.int64)
+    for index, frames in iter_frames(info, nperseg, hop):
+        column = (np.arange(index, index + len(frames)) * columns) // n_frames
+        frame_mean = frame_power(frames, win, workers).mean(axis=1)
+        # Frames arrive in order, so each column is a contiguous run.
+        starts = np.flatnonzero(np.r_[True, column[1:] != column[:-1]])
+        power[column[starts]] += np.add.reduceat(frame_mean, starts, axis=0)
+        counts[column[starts]] += np.diff(np.r_[starts, len(column)])
+
+    centers = (np.arange(columns) + 0.5) * n_frames / columns
+    times = ((centers * hop + nperseg / 2) / info.framerate).astype(np.float32)
+    freq = scipy.fft.rfftfreq(nperseg, 1 / info.framerate).astype(np.float32)
+    power /= np.maximum(counts, 1)[:, None]
+    with np.errstate(divide="ignore"):
+        np.log10(power, out=power)
+    power *= 10
+    return times, freq, power.T
+
+
+def pool_rows(values, rows):
+    """Max-pool the first axis down to at most `rows` rows, so narrow tones survive downsampling."""
+    if len(values) <= rows:
+        return values
+    edges = np.linspace(0, len(values), rows + 1).astype(int)
+    return np.maximum.reduceat(values, edges[:-1], axis=0)
+
+
+def render_spectrum(freq, dbfs, output, target_freq=None, tolerance=50, size_px=(1200, 600), dpi=100):
+    """Plot one line per channel; traces are max-pooled to the pixel width of the plot."""
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(size_px[0] / dpi, size_px[1] / dpi), dpi=dpi)
+    ax = fig.subplots()
+    points = size_px[0] * 2
+    x = freq[np.linspace(0, len(freq), points + 1).astype(int)[:-1]] if len(freq) > points else freq
+    for ch, level in enumerate(dbfs):
+        ax.plot(x, pool_rows(level, points), linewidth=0.8, label=f"Ch{ch + 1}")
+    if target_freq:
+        ax.axvspan(target_freq - tolerance, target_freq + tolerance, color="green", alpha=0.3,
+                   label=f"Expected {target_freq:g} Hz tone")
+    ax.set_xscale("log")
+    ax.set_xlim(max(freq[1], 10), freq[-1])
+    ax.set_title("Frequency Spectrum (Welch average)")
+    ax.set_xlabel("Frequency (Hz)")
+    ax.set_ylabel("Level (dBFS)")
+    ax.grid(True, which="both", alpha=0.3)
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(output)
+    return output
+
+
+def render_spectrogram(times, freq, dbfs, output, size_px=(1600, 900), dpi=100, floor_db=-140):
+    """Draw the spectrogram pooled to the pixel size of the plot area (max over frequency rows
+    and time columns), so narrow tones stay visible and nothing is drawn that cannot be seen."""
+    from matplotlib import colormaps
+    from matplotlib.cm import ScalarMappable
+    from matplotlib.colors import Normalize
+    from matplotlib.figure import Figure
+
+    top = float(np.max(dbfs, initial=floor_db, where=np.isfinite(dbfs)))
+    norm = Normalize(max(floor_db, top - 120), top, clip=True)
+    cmap = colormaps["magma"]
+
+    fig = Figure(figsize=(size_px[0] / dpi, size_px[1] / dpi), dpi=dpi)
+    ax = fig.subplots()
+    ax.set_xlim(float(times[0]), float(times[-1]))
+    ax.set_ylim(float(freq[0]), float(freq[-1]))
+    fig.colorbar(ScalarMappable(norm, cmap), ax=ax, label="Level (dBFS)")
+    ax.set_title("Spectrogram")
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("Frequency (Hz)")
+    fig.tight_layout()
+
+    box = ax.get_window_extent()
+    image = pool_rows(pool_rows(dbfs, int(box.height)).T, int(box.width)).T
+    # Colour-map to 8-bit RGBA up front; matplotlib would resample a float image in float64.
+    rgba = cmap(norm(np.maximum(image, floor_db)), bytes=True)
+    ax.imshow(
+        rgba,
+        origin="lower",
+        aspect="auto",
+        interpolation="nearest",
+        extent=(float(times[0]), float(times[-1]), float(freq[0]), float(freq[-1])),
+    )
+    fig.savefig(output)
+    return output
+
+
+def significant_components(freq, dbfs, target_freq=1000, tolerance=50, threshold_db=-20):
+    """Frequencies outside the target band within `threshold_db` of the strongest bin."""
+    level = 10 * np.log10(np.mean(10 ** (dbfs.astype(np.float64) / 10), axis=0))
+    mask = (freq < target_freq - tolerance) | (freq > target_freq + tolerance)
+    return freq[mask & (level > level.max() + threshold_db)]
+
+
+# Function to perform spectral analysis and visualize the spectrum
+def analyze_audio_spectrum(file_path, target_freq=1000, tolerance=50, output="spectrum_analysis.png",
+                           nperseg=8192):
+    freq, dbfs = welch_spectrum(file_path, nperseg)
+    render_spectrum(freq, dbfs, output, target_freq, tolerance)
+    print(f"Saved as: {output}")
+
+    # Identify significant non-1kHz components (amplitude above 10 % of the peak)
     print("Significant non-1kHz frequency components detected:")
-    for f in significant_freqs:
+    for f in significant_components(freq, dbfs, target_freq, tolerance):
         print(f"{f:.1f} Hz")
+    return freq, dbfs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Welch spectrum and STFT spectrogram of a WAV recording")
+    parser.add_argument(
+        "wav",
+        type=str,
+        nargs="?",
+        default="0dB_Freq_sweep_400LnPts_20HzTo24kHz_48k24b2Chs.wav",
+        help="WAV file to analyze",
+    )
+    parser.add_argument("--target", type=float, default=1000, help="Expected tone frequency in Hz")
+    parser.add_argument("--tolerance", type=float, default=50, help="Half width of the expected-tone band in Hz")
+    parser.add_argument("--nperseg", type=int, default=8192, help="Segment length of the Welch spectrum")
+    parser.add_argument("--spectrum", type=str, default="spectrum_analysis.png", help="Spectrum image to write")
+    parser.add_argument("--spectrogram", type=str, help="Also write a spectrogram image")
+    parser.add_argument("--size", type=int, nargs=2, default=[1600, 900], help="Spectrogram image size in pixels")
+    args = parser.parse_args(argv)
+
+    analyze_audio_spectrum(args.wav, args.target, args.tolerance, args.spectrum, args.nperseg)
+    if args.spectrogram:
+        times, freq, dbfs = stft_spectrogram(args.wav, columns=args.size[0])
+        render_spectrogram(times, freq, dbfs, args.spectrogram, tuple(args.size))
+        print(f"Saved as: {args.spectrogram}")
 
-# Example usage (replace 'your_audio.wav' with actual file path)
-analyze_audio_spectrum("0dB_Freq_sweep_400LnPts_20HzTo24kHz_48k24b2Chs.wav")
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import os
+import json
+import hashlib
+from fft_csv_cache import _replace_atomic, _write_json
+
+STAGE_CACHE_VERSION = 1
+
+
+def hash_file(path, block_size=1 << 20):
+    """blake2b of the file contents, read in blocks so memory stays flat for any WAV size."""
+    digest = hashlib.blake2b(digest_size=20)
+    buf = bytearray(block_size)
+    view = memoryview(buf)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+class stageCache:
+    """Skip pipeline stages whose inputs and parameters have not changed.
+
+    A stage is identified by a key: the content hash of every input file
+    plus its parameters. Its manifest (`<cache_dir>/<stage>.json`) holds the
+    key it last ran with and the hash of every file it wrote; the stage is
+    skipped while both still match. Files are hashed once per modification
+    (`<cache_dir>/digests/`), so checking an untouched 1 GB recording costs a
+    stat, and an output rewritten with the same bytes still counts as
+    unchanged for the stages downstream of it.
+    """
+
+    def __init__(self, cache_dir=".stage_cache"):
+        self.cache_dir = cache_dir
+
+    def manifest_path(self, name):
+        return os.path.join(self.cache_dir, f"{name}.json")
+
+    def digest(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        memo_path = os.path.join(self.cache_dir, "digests", hashlib.sha1(path.encode()).hexdigest() + ".json")
+        key = {"path": path, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        try:
+            with open(memo_path, "r") as f:
+                memo = json.load(f)
+            if memo["key"] == key:
+                return memo["digest"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        digest = hash_file(path)
+        os.makedirs(os.path.dirname(memo_path), exist_ok=True)
+        _replace_atomic(memo_path, _write_json({"key": key, "digest": digest}))
+        return digest
+
+    def key(self, inputs, params):
+        """Hex key of the input contents and the (JSON-serializable) parameters."""
+        data = {
+            "version": STAGE_CACHE_VERSION,
+            # A missing input is part of the key too (e.g. no project file under --replay).
+            "inputs": {os.path.abspath(p): self.digest(p) if os.path.exists(p) else None for p in inputs},
+            "params": params,
+        }
+        return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+    def lookup(self, name, key):
+        """The manifest of `name` if it ran with `key` and all its outputs are unchanged, else None."""
+        try:
+            with open(self.manifest_path(name), "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("key") != key:
+            return None
+        for path, digest in entry["outputs"].items():
+            if not os.path.exists(path) or self.digest(path) != digest:
+                return None
+        return entry
+
+    def store(self, name, key, outputs, result=None):
+        """Record a completed run; a run that did not write all its outputs is not recorded."""
+        if not all(os.path.exists(p) for p in outputs):
+            if os.path.exists(self.manifest_path(name)):
+                os.remove(self.manifest_path(name))
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = {"key": key, "outputs": {os.path.abspath(p): self.digest(p) for p in outputs}, "result": result}
+        _replace_atomic(self.manifest_path(name), _write_json(entry))
+
+
+def run_cached(cache, name, func, args=(), inputs=(), params=None, outputs=None, keep_result=False):
+    """func(*args), unless stage `name` already ran on the same inputs and parameters.
+
+    `outputs(result)` lists the files the stage wrote; with `keep_result`
+    the (JSON-serializable) result is stored too and returned on a hit.
+    Returns (result, skipped); with `cache` None the stage always runs.
+    """
+    if cache is None:
+        return func(*args), False
+
+    key = cache.key(inputs, params)
+    entry = cache.lookup(name, key)
+    if entry is not None:
+        print(f"[cache] skip {name}: inputs and parameters unchanged")
+        return entry["result"], True
+
+    result = func(*args)
+    cache.store(name, key, outputs(result) if outputs else [], result if keep_result else None)
+    return result, False
@@ -0,0 +1,115 @@
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+
+class stage:
+    def __init__(self, name, func, args=(), kwargs=None, deps=(), resources=(), process=False):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.deps = set(deps)
+        # Stages sharing a resource (e.g. "apx", "phone") never run at the same time.
+        self.resources = set(resources)
+        # CPU-only stages run in a worker process; anything that touches the
+        # APx .NET object or the phone must stay in this process.
+        self.process = process
+
+
+class stageScheduler:
+    """Run stages as a dependency graph, overlapping whatever does not share a resource.
+
+    Ready stages are started in the order they were added. A failed stage
+    skips everything that depends on it while independent branches keep
+    going; run() raises once the graph has drained.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self.stages = {}
+        self.results = {}
+        self.failed = {}
+        self.skipped = []
+        self.timeline = []
+
+    def add(self, name, func, args=(), kwargs=None, deps=(), resources=(), process=False):
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' already exists")
+        self.stages[name] = stage(name, func, args, kwargs, deps, resources, process)
+        return name
+
+    def _check_graph(self):
+        for st in self.stages.values():
+            missing = st.deps - self.stages.keys()
+            if missing:
+                raise ValueError(f"Stage '{st.name}' depends on unknown stage(s): {sorted(missing)}")
+
+        # Kahn's algorithm: anything left over sits on a cycle.
+        remaining = {name: set(st.deps) for name, st in self.stages.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Dependency cycle between stages: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+    def _skip_blocked(self, pending):
+        # Repeat until stable so skips propagate down whole chains.
+        changed = True
+        while changed:
+            changed = False
+            for name in list(pending):
+                if self.stages[name].deps & (self.failed.keys() | set(self.skipped)):
+                    pending.remove(name)
+                    self.skipped.append(name)
+                    print(f"[scheduler] skip {name}: a dependency failed")
+                    changed = True
+
+    def run(self):
+        self._check_graph()
+        pending = list(self.stages)
+        running = {}
+        busy = set()
+        origin = time.monotonic()
+
+        with ThreadPoolExecutor(self.max_workers) as threads, ProcessPoolExecutor(self.max_workers) as processes:
+            while pending or running:
+                self._skip_blocked(pending)
+                for name in list(pending):
+                    st = self.stages[name]
+                    if not st.deps <= self.results.keys() or st.resources & busy:
+                        continue
+
+                    pending.remove(name)
+                    busy |= st.resources
+                    pool = processes if st.process else threads
+                    print(f"[scheduler] start {name}")
+                    future = pool.submit(st.func, *st.args, **st.kwargs)
+                    running[future] = (name, time.monotonic() - origin)
+
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, started = running.pop(future)
+                    busy -= self.stages[name].resources
+                    self.timeline.append((name, started, time.monotonic() - origin))
+                    try:
+                        self.results[name] = future.result()
+                        print(f"[scheduler] done {name}")
+                    except Exception as e:
+                        self.failed[name] = e
+                        print(f"[scheduler] FAILED {name}: {e!r}")
+
+        if self.failed:
+            raise RuntimeError(
+                f"Stage(s) failed: {', '.join(self.failed)}; skipped: {', '.join(self.skipped) or 'none'}"
+            )
+        return self.results
@@ -0,0 +1,195 @@
+import os
+import argparse
+import numpy as np
+from scipy import signal
+from wav_io import wavInfo, iter_blocks, read_frames
+
+# Frames per second of the band envelopes the whole recording is searched with.
+ENVELOPE_RATE = 50
+ENVELOPE_BANDS = 16
+# Envelope level of digital silence (dBFS); recorded noise sits close to it.
+FLOOR_DB = -100.0
+
+
+def stimulus_files(paths, fs):
+    """Local copies of the step 1 stimuli of `fs` in playback order, or None without "stimulus_folder"."""
+    folder = paths.get("stimulus_folder")
+    if not folder:
+        return None
+    return [os.path.join(folder, name) for name in paths["measurement_recorder_files"][fs]]
+
+
+def band_edges(framerate, hop, bands=ENVELOPE_BANDS):
+    """rfft bin ranges of `bands` log-spaced bands from 20 Hz to 0.45 x the rate; empty bands dropped."""
+    freq = np.fft.rfftfreq(hop, 1 / framerate)
+    edges = np.searchsorted(freq, np.geomspace(20, 0.45 * framerate, bands + 1))
+    return [(lo, hi) for lo, hi in zip(edges[:-1], edges[1:]) if hi > lo]
+
+
+def band_envelope(info, hop, block_frames=1 << 20):
+    """(bands, frames) level in dB of every `hop` frames, in one streaming pass.
+
+    The decimated form of a file that survives a clock-rate difference
+    between the phone and the APx: a 100 ppm drift over a 4-minute
+    stimulus moves it by about one envelope frame, while it would
+    decorrelate the waveform itself.
+    """
+    edges = band_edges(info.framerate, hop)
+    env = np.full((len(edges), -(-info.nframes // hop)), FLOOR_DB, dtype=np.float32)
+    block_frames -= block_frames % hop
+    for pos, x in iter_blocks(info, block_frames):
+        y = x.mean(axis=1)
+        y = np.concatenate([y, np.zeros(-len(y) % hop, dtype=y.dtype)]).reshape(-1, hop)
+        power = np.abs(np.fft.rfft(y, axis=1)) ** 2 / (hop * hop / 2)
+        bands = np.stack([power[:, lo:hi].sum(axis=1) for lo, hi in edges])
+        env[:, pos // hop : pos // hop + len(y)] = np.maximum(10 * np.log10(bands + 1e-30), FLOOR_DB)
+    return env
+
+
+def envelope_lag(x, template):
+    """(lag, score) where frames x[:, lag : lag + n] best match the (bands, n) `template`.
+
+    Pearson correlation over all bands and frames, from one FFT
+    cross-correlation per band; `x` is padded with silence at the end.
+    """
+    n = template.shape[1]
+    x = np.concatenate([x, np.full((x.shape[0], n - 1), FLOOR_DB)], axis=1).astype(np.float64)
+    t = template - template.mean()
+    corr = sum(signal.correlate(xb, tb, mode="valid", method="fft") for xb, tb in zip(x, t))
+    s1 = np.concatenate([[0.0], np.cumsum(x.sum(axis=0))])
+    s2 = np.concatenate([[0.0], np.cumsum((x * x).sum(axis=0))])
+    w1, w2 = s1[n:] - s1[:-n], s2[n:] - s2[:-n]
+    var = np.maximum(w2 - w1 * w1 / t.size, 0) * np.sum(t * t)
+    score = np.divide(corr, np.sqrt(var), out=np.zeros_like(corr), where=var > 0)
+    lag = int(np.argmax(score))
+    return lag, float(score[lag])
+
+
+def xcorr_lag(x, template):
+    """(lag, score) where x[lag : lag + len(template)] best matches `template`.
+
+    FFT cross-correlation normalized by the energy of every window, so the
+    score is 1.0 for an exact (scaled) copy whatever the level of `x`.
+    `x` is zero-padded, so a template running past its end still matches.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    template = np.asarray(template, dtype=np.float64)
+    x = np.concatenate([x, np.zeros(len(template) - 1)])
+    corr = signal.correlate(x, template, mode="valid", method="fft")
+    power = np.concatenate([[0.0], np.cumsum(x * x)])
+    window = power[len(template) :] - power[: -len(template)]
+    norm = np.sqrt(np.maximum(window, 0) * np.dot(template, template))
+    score = np.divide(corr, norm, out=np.zeros_like(corr), where=norm > 0)
+    lag = int(np.argmax(score))
+    return lag, float(score[lag])
+
+
+def refine(rec, ref, ref_start, ref_end, guess, search):
+    """Recording frame where stimulus frames [ref_start, ref_end) start, searched at full rate within guess ± search."""
+    template = read_frames(ref, ref_start, ref_end, dtype=np.float64).mean(axis=1)
+    lo = max(0, guess - search)
+    window = read_frames(rec, lo, guess + search + (ref_end - ref_start), dtype=np.float64).mean(axis=1)
+    lag, _ = xcorr_lag(window, template)
+    return lo + lag
+
+
+def active_ranges(ref, min_silence_len=800, keep_silence=0):
+    """Non-silent frame ranges of a stimulus file, by the splitter's own silence rule (relative threshold)."""
+    from tone_splitter import split_frame_ranges
+
+    return split_frame_ranges(ref, min_silence_len=min_silence_len, keep_silence=keep_silence)
+
+
+def place_stimulus(rec, rec_env, ref, hop, start_after=0, min_silence_len=800, keep_silence=0,
+                   anchor_s=1.0, search_s=0.05, burst_search_s=0.01, min_score=0.5):
+    """Where one stimulus file sits in the recording, coarse to fine.
+
+    1. The band envelope of the stimulus is cross-correlated with that of
+       the recording after `start_after`, which places it to about one
+       envelope frame (1 / ENVELOPE_RATE s).
+    2. `anchor_s` at the start and at the end of its non-silent part are
+       correlated sample by sample within ± `search_s`; the two anchors give
+       the offset and the clock-rate difference between the phone and the APx.
+    3. Every non-silent range (burst) of the stimulus is mapped through
+       them and its start and end are refined within ± `burst_search_s`.
+
+    Returns {"start", "end", "ranges", "score"} in recording frames.
+    """
+    if ref.framerate != rec.framerate:
+        raise ValueError(f"{ref.path} is {ref.framerate} Hz but the recording is {rec.framerate} Hz")
+    ranges = active_ranges(ref, min_silence_len, keep_silence)
+    if not ranges:
+        raise ValueError(f"{ref.path} is silent")
+
+    first = start_after // hop
+    lag, score = envelope_lag(rec_env[:, first:], band_envelope(ref, hop))
+    if score < min_score:
+        raise ValueError(f"{os.path.basename(ref.path)} not found in the recording (correlation {score:.2f})")
+    offset = (first + lag) * hop
+
+    a0, a1 = ranges[0][0], ranges[-1][1]
+    anchor = min(int(anchor_s * ref.framerate), a1 - a0)
+    search = int(search_s * rec.framerate)
+    p0 = refine(rec, ref, a0, a0 + anchor, offset + a0, search)
+    p1 = refine(rec, ref, a1 - anchor, a1, p0 + (a1 - anchor - a0), search)
+    # Recording frames per stimulus frame; a stretched anchor matches best around its middle,
+    # so every match is (scale - 1) * length / 2 late.
+    scale = (p1 - p0) / (a1 - anchor - a0) if a1 - anchor > a0 else 1.0
+
+    def span(r0, r1, guess, search):
+        length = min(anchor, r1 - r0)
+        bias = (scale - 1) * length / 2
+        b0 = refine(rec, ref, r0, r0 + length, guess(r0), search) - bias
+        b1 = refine(rec, ref, r1 - length, r1, guess(r1 - length), search) - bias + scale * length
+        return [int(round(b0)), int(round(b1))]
+
+    start, end = span(a0, a1, lambda f: p0 + round((f - a0) * scale), search)
+    burst_search = int(burst_search_s * rec.framerate)
+    placed = [span(r0, r1, lambda f: p0 + round((f - a0) * scale), burst_search) for r0, r1 in ranges]
+    return {"start": start, "end": end, "ranges": placed, "score": score}
+
+
+def align_recording(info, stimuli, min_silence_len=800, keep_silence=0, envelope_rate=ENVELOPE_RATE, **kwargs):
+    """place_stimulus() for every stimulus file in playback order; each is searched after the one before it."""
+    hop = max(1, info.framerate // envelope_rate)
+    rec_env = band_envelope(info, hop)
+    placements = []
+    start_after = 0
+    for path in stimuli:
+        placement = place_stimulus(
+            info, rec_env, wavInfo(path), hop, start_after, min_silence_len, keep_silence, **kwargs
+        )
+        placements.append(placement)
+        start_after = placement["end"]
+    return placements
+
+
+def stimulus_cut_ranges(info, stimuli, min_silence_len=800, keep_silence=0, **kwargs):
+    """Sweep range followed by every multitone burst range, from the first stimulus and the ones after it."""
+    placements = align_recording(info, stimuli, min_silence_len, keep_silence, **kwargs)
+    sweep = placements[0]
+    return [[sweep["start"], sweep["end"]]] + [r for placement in placements[1:] for r in placement["ranges"]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Locate the step 1 stimuli in a recording by cross-correlation")
+    parser.add_argument("recording", type=str, help="Recorded WAV file")
+    parser.add_argument("stimuli", type=str, nargs="+", help="Stimulus WAV files in playback order")
+    parser.add_argument(
+        "--envelope-rate", type=int, default=ENVELOPE_RATE, help=f"Envelope frames per second of the coarse search (default: {ENVELOPE_RATE})"
+    )
+    args = parser.parse_args(argv)
+
+    info = wavInfo(args.recording)
+    for path, placement in zip(args.stimuli, align_recording(info, args.stimuli, envelope_rate=args.envelope_rate)):
+        print(
+            f"{os.path.basename(path)}: frames {placement['start']}-{placement['end']}"
+            f" ({placement['start'] / info.framerate:.4f}-{placement['end'] / info.framerate:.4f} s,"
+            f" correlation {placement['score']:.2f})"
+        )
+        for i, (start, end) in enumerate(placement["ranges"]):
+            print(f"  {i + 1:>3}: {start}-{end}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.fft
+import scipy.signal
+from numpy.lib.stride_tricks import sliding_window_view
+from paths_config import load_paths
+from wav_io import wavInfo, read_frames
+
+SWEEP_PROFILES = {
+    "48k": {
+        "fs": 48000,
+        "expected_steps": 400,
+        "band_hz": (20, 20000),
+        "reference_hz": 1000,
+    },
+    "96k": {
+        "fs": 96000,
+        "expected_steps": 400,
+        "band_hz": (20, 40000),
+        "reference_hz": 1000,
+    },
+}
+
+
+def track_frequency(info, frame_s=0.17, hop_div=4, block_frames=512, silence_db=-60):
+    """Dominant frequency of overlapping Hann frames, power summed over channels.
+
+    Returns (centers, freq, bin_width): frame centres in samples and the
+    parabolically interpolated peak frequency of each frame (NaN for frames
+    more than `silence_db` below the loudest one).
+    """
+    frame = 1 << int(round(np.log2(frame_s * info.framerate)))
+    hop = frame // hop_div
+    window = scipy.signal.get_window("hann", frame).astype(np.float32)
+    bin_width = info.framerate / frame
+
+    n_frames = max(0, (info.nframes - frame) // hop + 1)
+    freq = np.full(n_frames, np.nan)
+    power = np.zeros(n_frames)
+    for first in range(0, n_frames, block_frames):
+        count = min(block_frames, n_frames - first)
+        start = first * hop
+        samples = read_frames(info, start, start + (count - 1) * hop + frame)
+        frames = sliding_window_view(samples, frame, axis=0)[::hop]  # (count, channels, frame)
+        spectrum = scipy.fft.rfft(frames * window, axis=-1, workers=-1)
+        p = (np.abs(spectrum) ** 2).sum(axis=1)
+        p[:, 0] = 0
+
+        peak = np.clip(np.argmax(p, axis=1), 1, p.shape[1] - 2)
+        rows = np.arange(count)
+        a, b, c = (np.log(p[rows, peak + k] + 1e-30) for k in (-1, 0, 1))
+        denom = a - 2 * b + c
+        offset = np.where(denom < 0, 0.5 * (a - c) / np.where(denom < 0, denom, 1), 0)
+        freq[first : first + count] = (peak + offset) * bin_width
+        power[first : first + count] = p.sum(axis=1)
+
+    if n_frames:
+        freq[power < power.max() * 10 ** (silence_db / 10)] = np.nan
+    centers = np.arange(n_frames) * hop + frame // 2
+    return centers, freq, bin_width
+
+
+def find_steps(centers, freq, bin_width, framerate, tol_rel=0.0005, tol_bins=0.5, min_step_s=0.1):
+    """Group frames of constant frequency into steps.
+
+    Returns (bounds, f_range): (steps, 2) sample bounds and (steps, 2) lowest
+    and highest tracked frequency of each step. Neighbouring low-frequency
+    steps closer together than the tracking resolution come out as one long
+    run; those runs are cut into equal parts using the median step length.
+    """
+    if len(freq) < 2:
+        return np.zeros((0, 2), dtype=np.int64), np.zeros((0, 2))
+    hop = centers[1] - centers[0]
+
+    tol = np.maximum(tol_rel * freq[:-1], tol_bins * bin_width)
+    brk = ~(np.abs(np.diff(freq)) <= tol)
+    starts = np.r_[0, np.flatnonzero(brk) + 1]
+    ends = np.r_[np.flatnonzero(brk), len(freq) - 1]
+
+    keep = ~np.isnan(freq[starts]) & ((ends - starts + 1) * hop >= min_step_s * framerate)
+    starts, ends = starts[keep], ends[keep]
+    if not len(starts):
+        return np.zeros((0, 2), dtype=np.int64), np.zeros((0, 2))
+
+    # The dominant tone of a frame flips when its centre crosses a step edge.
+    run_begin = centers[starts] - hop // 2
+    run_end = centers[ends] + hop // 2
+    lengths = run_end - run_begin
+    typical = np.median(lengths)
+
+    bounds, f_range = [], []
+    for begin, end, s, e in zip(run_begin, run_end, starts, ends):
+        parts = max(1, int(round((end - begin) / typical)))
+        edges = np.linspace(begin, end, parts + 1).astype(np.int64)
+        run_freq = freq[s : e + 1]
+        for i in range(parts):
+            bounds.append((edges[i], edges[i + 1]))
+            f_range.append((np.nanmin(run_freq), np.nanmax(run_freq)))
+    return np.asarray(bounds, dtype=np.int64), np.asarray(f_range)
+
+
+def analyze_steps(
+    info,
+    bounds,
+    f_range,
+    band_hz=(20, 20000),
+    settle=0.1,
+    max_analysis_s=0.5,
+    notch_bins=10,
+    batch_steps=64,
+    window=("kaiser", 20),
+):
+    """Level, inter-channel phase and THD+N of every step.
+
+    The centre of every step (after dropping `settle` of its length at each
+    end) is cut to one common length, so the window, the bin table and the
+    THD+N band mask are built once and whole batches of steps go through a
+    single FFT. The fundamental is refined from the spectrum and then
+    evaluated exactly (single-frequency DFT, as Goertzel) for its phase.
+    The default Kaiser window keeps its sidelobes far below any DUT's
+    THD+N, so the residual outside the +-`notch_bins` notch (at most
+    +-f0 / 2) is real.
+    """
+    framerate = info.framerate
+    lengths = ((bounds[:, 1] - bounds[:, 0]) * (1 - 2 * settle)).astype(np.int64)
+    length = int(min(lengths.min(), max_analysis_s * framerate))
+    if length < 16:
+        raise ValueError(f"{info.path}: sweep steps are too short to analyze ({length} samples)")
+
+    win = scipy.signal.get_window(window, length)
+    power_gain = (win**2).sum()
+    bin_width = framerate / length
+    bins = scipy.fft.rfftfreq(length, 1 / framerate)
+    band = (bins >= band_hz[0]) & (bins <= band_hz[1])
+    n = np.arange(length)
+
+    n_steps = len(bounds)
+    freq = np.empty(n_steps)
+    level = np.empty((n_steps, info.channels))
+    phase = np.empty((n_steps, info.channels))
+    thdn = np.empty((n_steps, info.channels))
+
+    centres = (bounds[:, 0] + bounds[:, 1]) // 2
+    for first in range(0, n_steps, batch_steps):
+        idx = np.arange(first, min(n_steps, first + batch_steps))
+        x = np.stack(
+            [read_frames(info, c - length // 2, c - length // 2 + length, np.float64).T for c in centres[idx]]
+        )  # (steps, channels, length)
+
+        xw = x * win
+        p = np.abs(scipy.fft.rfft(xw, axis=-1, workers=-1)) ** 2
+        total_p = p.sum(axis=1)
+
+        # Peak search limited to the tracked frequency range of each step.
+        lo = f_range[idx, 0] * 0.98 - 3 * bin_width
+        hi = f_range[idx, 1] * 1.02 + 3 * bin_width
+        search = (bins >= lo[:, None]) & (bins <= hi[:, None])
+        peak = np.clip(np.argmax(np.where(search, total_p, -1), axis=1), 1, len(bins) - 2)
+        rows = np.arange(len(idx))
+        a, b, c = (np.log(total_p[rows, peak + k] + 1e-30) for k in (-1, 0, 1))
+        denom = a - 2 * b + c
+        offset = np.where(denom < 0, 0.5 * (a - c) / np.where(denom < 0, denom, 1), 0)
+        f0 = (peak + offset) * bin_width
+        freq[idx] = f0
+
+        tone = np.exp(-2j * np.pi * f0[:, None] * n / framerate)
+        fundamental = np.einsum("scl,sl->sc", xw, tone)
+        phase[idx] = np.angle(fundamental)
+
+        # Windowed RMS: no error from the partial cycle at the window edges.
+        rms = np.sqrt((xw**2).sum(axis=-1) / power_gain)
+        level[idx] = 20 * np.log10(np.maximum(rms * np.sqrt(2), 1e-15))
+
+        # Never wider than f0 / 2, so the 2nd harmonic of the lowest steps stays in the residual.
+        half_width = np.minimum(notch_bins * bin_width, f0 / 2)
+        notch = np.abs(bins - f0[:, None]) <= half_width[:, None]
+        in_band = band & ~notch
+        residual = np.where(in_band[:, None, :], p, 0).sum(axis=-1)
+        # The whole fundamental counts towards the total even if it straddles a band edge.
+        total = residual + np.where(notch[:, None, :], p, 0).sum(axis=-1)
+        ratio = residual / np.maximum(total, 1e-30)
+        # One bin of slack: a 20 Hz step is measured a few mHz either side of it.
+        outside = (f0 < band_hz[0] - bin_width) | (f0 > band_hz[1] + bin_width)
+        ratio[outside] = np.nan
+        thdn[idx] = ratio
+
+    phase = np.rad2deg(np.angle(np.exp(1j * (phase - phase[:, :1]))))
+    return freq, level, phase, thdn
+
+
+def sweep_table(freq, level, phase, thdn, reference_hz=1000):
+    """Per-step results as a DataFrame; relative level is against the step nearest `reference_hz`."""
+    ref = np.argmin(np.abs(freq - reference_hz))
+    table = {"Step": np.arange(1, len(freq) + 1), "Frequency (Hz)": np.round(freq, 3)}
+    for ch in range(level.shape[1]):
+        table[f"Ch{ch + 1} Level (dBFS)"] = np.round(level[:, ch], 3)
+    for ch in range(level.shape[1]):
+        table[f"Ch{ch + 1} Relative Level (dB)"] = np.round(level[:, ch] - level[ref, ch], 3) + 0.0
+    for ch in range(1, level.shape[1]):
+        table[f"Ch{ch + 1}-Ch1 Phase (deg)"] = np.round(phase[:, ch], 3)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for ch in range(level.shape[1]):
+            table[f"Ch{ch + 1} THD+N (dB)"] = np.round(10 * np.log10(thdn[:, ch]), 3)
+            table[f"Ch{ch + 1} THD+N (%)"] = np.round(100 * np.sqrt(thdn[:, ch]), 5)
+    return pd.DataFrame(table)
+
+
+# PNG name, table column suffix, y label.
+SWEEP_GRAPHS = [
+    ("sweep_RMSLevel.png", "Level (dBFS)", "Level (dBFS)"),
+    ("sweep_RelativeLevel.png", "Relative Level (dB)", "Relative Level (dB)"),
+    ("sweep_Phase.png", "Phase (deg)", "Phase (deg)"),
+    ("sweep_ThdNRatio.png", "THD+N (dB)", "THD+N Ratio (dB)"),
+]
+
+
+def save_graphs(table, graph_folder):
+    """PNG plots named like the APx exports of audioQualityFileAnalyze.export_freq_sweep_graph."""
+    # Figure without pyplot: no GUI backend, safe in a scheduler thread.
+    from matplotlib.figure import Figure
+
+    os.makedirs(graph_folder, exist_ok=True)
+    saved = []
+    for filename, suffix, ylabel in SWEEP_GRAPHS:
+        fig = Figure(figsize=(12, 6))
+        ax = fig.subplots()
+        for column in table.columns:
+            if column.endswith(suffix):
+                ax.semilogx(table["Frequency (Hz)"], table[column], label=column.replace(f" {suffix}", ""))
+        ax.set_xlabel("Frequency (Hz)")
+        ax.set_ylabel(ylabel)
+        ax.grid(True, which="both")
+        ax.legend()
+        fig.tight_layout()
+        path = os.path.join(graph_folder, filename)
+        fig.savefig(path)
+        saved.append(path)
+    return saved
+
+
+def analyze_sweep_file(sweep_file, fs, **kwargs):
+    """Step detection + per-step analysis of one sweep recording; returns the result table."""
+    profile = SWEEP_PROFILES[fs]
+    info = wavInfo(sweep_file)
+    centers, freq, bin_width = track_frequency(info)
+    bounds, f_range = find_steps(centers, freq, bin_width, info.framerate)
+    if not len(bounds):
+        raise ValueError(f"No sweep steps found in {sweep_file}")
+    if len(bounds) != profile["expected_steps"]:
+        print(f"⚠️ {sweep_file}: found {len(bounds)} steps, expected {profile['expected_steps']}")
+
+    results = analyze_steps(info, bounds, f_range, band_hz=profile["band_hz"], **kwargs)
+    return sweep_table(*results, reference_hz=profile["reference_hz"])
+
+
+def sweep_files(fs, paths, plots=True):
+    """(sweep recording, [CSV table, graphs...]) that analyze_sweep() reads and writes."""
+    sweep_file = os.path.join(paths["segment_result_folder"][fs], f"{fs}_freq_sweep.wav")
+    outputs = [os.path.join(paths["report_folder"], f"{fs}_sweep_data.csv")]
+    if plots:
+        outputs += [os.path.join(paths["graph_folder"][fs], filename) for filename, _, _ in SWEEP_GRAPHS]
+    return sweep_file, outputs
+
+
+def analyze_sweep(fs, paths, plots=True):
+    """Offline stand-in for the APx stepped-sweep step: {fs}_freq_sweep.wav in, table (and graphs) out."""
+    sweep_file, outputs = sweep_files(fs, paths, plots)
+    table = analyze_sweep_file(sweep_file, fs)
+
+    csv_file = outputs[0]
+    os.makedirs(os.path.dirname(os.path.abspath(csv_file)), exist_ok=True)
+    table.to_csv(csv_file, index=False)
+    print(f"Saved as: {csv_file}")
+    if plots:
+        save_graphs(table, paths["graph_folder"][fs])
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline stepped frequency sweep analysis")
+    parser.add_argument(
+        "--fs",
+        type=str,
+        choices=list(SWEEP_PROFILES),
+        default="48k",
+        help="Sampling rate (48k or 96k)",
+    )
+    parser.add_argument(
+        "--wav",
+        type=str,
+        help="Sweep recording to analyze (default: {fs}_freq_sweep.wav in segment_result_folder)",
+    )
+    parser.add_argument("--no-plots", action="store_true", help="Only write the CSV table")
+    args = parser.parse_args(argv)
+
+    if args.wav:
+        print(analyze_sweep_file(args.wav, args.fs).to_string(index=False))
+    else:
+        paths = load_paths()
+        analyze_sweep(args.fs, paths, plots=not args.no_plots)
+
+
+if __name__ == "__main__":
+    main()
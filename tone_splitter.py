@@ -1,25 +1,179 @@
 import os
 import numpy as np
-import matplotlib.pyplot as plt
-import librosa
-import librosa.display
-import soundfile as sf
-import json
-from pydub import AudioSegment
-from pydub.silence import split_on_silence
+from wav_io import wavInfo, wavMap, read_frames, copy_frames
+from waveform_overview import waveformOverview
 
 class wavFileAnalysis:
     def __init__(self, audio_path):
         self.audio_path = audio_path
 
-    def draw_waveform(self):
-        y, sr = librosa.load(self.audio_path)
+    def draw_waveform(self, start_s=0.0, end_s=None, output=None):
+        import matplotlib.pyplot as plt
 
-        # draw
-        plt.figure()
-        librosa.display.waveshow(y, sr=sr)
-        plt.title("nutcracker waveform")
-        plt.show()
+        # drawn from the cached min/max/RMS overview, not from the samples
+        overview = waveformOverview.load(self.audio_path)
+        fig = plt.figure(figsize=(16, 1.2 + 1.8 * overview.info.channels))
+        overview.render(output, start_s, end_s, fig=fig)
+        if output is None:
+            plt.show()
+
+
+def ms_boundaries(framerate, length_ms):
+    """First frame of every millisecond, using pydub's int(ms * rate / 1000) rounding."""
+    return (np.arange(length_ms + 1) * (framerate / 1000.0)).astype(np.int64)
+
+
+def ms_energy(info, start=0, end=None, block_ms=10000):
+    """Per-millisecond sum of squared samples (full scale = 1.0) of frames [start, end).
+
+    Returns (energy, bounds, length_ms) where bounds[k] is the first frame of
+    millisecond k relative to `start`, the way pydub slices an AudioSegment.
+    """
+    end = info.nframes if end is None else min(end, info.nframes)
+    nframes = end - start
+    length_ms = round(1000 * nframes / info.framerate)
+    bounds = ms_boundaries(info.framerate, length_ms)
+    energy = np.zeros(length_ms)
+
+    # Only whole milliseconds that start inside the data carry energy; the
+    # tail pydub pads with silence stays zero.
+    full_ms = min(int(np.searchsorted(bounds, nframes, side="left")), length_ms)
+    for m0 in range(0, full_ms, block_ms):
+        m1 = min(m0 + block_ms, full_ms)
+        f0, f1 = bounds[m0], min(bounds[m1], nframes)
+        block = read_frames(info, start + f0, start + f1, np.float64)
+        frame_energy = np.einsum("ij,ij->i", block, block)
+        energy[m0:m1] = np.add.reduceat(frame_energy, bounds[m0:m1] - f0)
+    return energy, bounds, length_ms
+
+
+def detect_silence(energy, bounds, channels, min_silence_len, silence_thresh):
+    """pydub.silence.detect_silence (seek_step=1) over per-millisecond energies."""
+    length_ms = len(energy)
+    if length_ms < min_silence_len:
+        return []
+
+    cumulative = np.concatenate(([0.0], np.cumsum(energy)))
+    window_energy = cumulative[min_silence_len:] - cumulative[:-min_silence_len]
+    window_samples = (bounds[min_silence_len:] - bounds[:-min_silence_len]) * channels
+    thresh = 10 ** (silence_thresh / 20)
+    silent_starts = np.flatnonzero(window_energy <= thresh**2 * window_samples)
+    if not len(silent_starts):
+        return []
+
+    # Starts closer than one window apart belong to the same silent range.
+    breaks = np.flatnonzero(np.diff(silent_starts) > min_silence_len)
+    range_starts = silent_starts[np.concatenate(([0], breaks + 1))]
+    range_ends = silent_starts[np.concatenate((breaks, [len(silent_starts) - 1]))]
+    return [[int(a), int(b) + min_silence_len] for a, b in zip(range_starts, range_ends)]
+
+
+def detect_nonsilent(silent_ranges, length_ms):
+    """pydub.silence.detect_nonsilent given the silent ranges."""
+    if not silent_ranges:
+        return [[0, length_ms]]
+    if silent_ranges[0][0] == 0 and silent_ranges[0][1] == length_ms:
+        return []
+
+    prev_end = 0
+    nonsilent_ranges = []
+    for start, end in silent_ranges:
+        nonsilent_ranges.append([prev_end, start])
+        prev_end = end
+    if end != length_ms:
+        nonsilent_ranges.append([prev_end, length_ms])
+    if nonsilent_ranges[0] == [0, 0]:
+        nonsilent_ranges.pop(0)
+    return nonsilent_ranges
+
+
+def output_target(audio_path, paths):
+    filename = os.path.basename(audio_path)
+    if "48k" in filename:
+        prefix = "48k"
+    elif "96k" in filename:
+        prefix = "96k"
+    else:
+        raise ValueError(
+            "Filename must contain '48k' or '96k' to determine output folder."
+        )
+    output_dir = paths["segment_result_folder"][prefix]
+    os.makedirs(output_dir, exist_ok=True)
+    return prefix, output_dir
+
+
+def split_frame_ranges(
+    info, start=0, end=None, min_silence_len=800, silence_thresh=None, keep_silence=0
+):
+    """Frame ranges pydub's split_on_silence would cut from frames [start, end).
+
+    Works block by block on per-millisecond energies. `silence_thresh`
+    defaults to the dBFS of the analysed range - 35, like pydub_split().
+    Returned ranges are absolute frame indices into `info`.
+    """
+    end = info.nframes if end is None else min(end, info.nframes)
+    energy, bounds, length_ms = ms_energy(info, start, end)
+    if silence_thresh is None:
+        total = energy.sum()
+        if not total:
+            return []
+        dbfs = 10 * np.log10(total / ((end - start) * info.channels))
+        silence_thresh = dbfs - 35
+
+    silent_ranges = detect_silence(
+        energy, bounds, info.channels, min_silence_len, silence_thresh
+    )
+    ranges = [
+        [start_ms - keep_silence, end_ms + keep_silence]
+        for start_ms, end_ms in detect_nonsilent(silent_ranges, length_ms)
+    ]
+    for range_i, range_ii in zip(ranges, ranges[1:]):
+        if range_ii[0] < range_i[1]:
+            range_i[1] = (range_i[1] + range_ii[0]) // 2
+            range_ii[0] = range_i[1]
+    return [
+        [start + int(bounds[max(start_ms, 0)]), start + int(bounds[min(end_ms, length_ms)])]
+        for start_ms, end_ms in ranges
+    ]
+
+
+def aligned_ranges(info, paths, prefix, min_silence_len=800, keep_silence=0, sweep_only=False):
+    """Sweep range then every multitone burst range, located against the stimulus files.
+
+    With `sweep_only`, only the sweep stimulus is placed and the result is
+    just its range.
+
+    None when "stimulus_folder" is not set, a stimulus file is missing or
+    unreadable, or the stimuli cannot be found in the recording; callers
+    then fall back to the fixed sweep_end.
+    """
+    from stimulus_align import stimulus_files, stimulus_cut_ranges
+
+    stimuli = stimulus_files(paths, prefix)
+    if sweep_only:
+        stimuli = stimuli[:1]
+    if not stimuli:
+        return None
+    try:
+        return stimulus_cut_ranges(info, stimuli, min_silence_len, keep_silence)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Stimulus alignment failed, using the fixed sweep end: {e}")
+        return None
+
+
+def write_segments(info, frame_ranges, prefix, output_dir, sweep_exists):
+    """Copy each frame range to {prefix}_multitone_{i}.wav (the first to the sweep file if it is missing)."""
+    out_files = []
+    for i, (start, end) in enumerate(frame_ranges):
+        if not sweep_exists and i == 0:
+            out_file = os.path.join(output_dir, f"{prefix}_freq_sweep.wav")
+        else:
+            index = i + 1 if sweep_exists else i
+            out_file = os.path.join(output_dir, f"{prefix}_multitone_{index}.wav")
+        copy_frames(info, out_file, start, end)
+        out_files.append(out_file)
+        print(f"Save as: {out_file}")
+    return out_files
 
 
 # slower than librosa, but quality sounds same as original tone
@@ -28,21 +182,33 @@ class silenceSplitter:
         self.audio_path = audio_path
         self.paths = paths
 
+    def split(self, min_silence_len=800, silence_thresh=None, keep_silence=0):
+        """Streaming replacement for pydub_split(): same segments, bounded memory.
+
+        Segments are copied byte for byte from the source, so 24-bit input
+        stays 24-bit.
+        """
+        prefix, output_dir = output_target(self.audio_path, self.paths)
+        sweep_exists = os.path.exists(
+            os.path.join(output_dir, f"{prefix}_freq_sweep.wav")
+        )
+
+        info = wavInfo(self.audio_path)
+        frame_ranges = split_frame_ranges(
+            info,
+            min_silence_len=min_silence_len,
+            silence_thresh=silence_thresh,
+            keep_silence=keep_silence,
+        )
+        return write_segments(info, frame_ranges, prefix, output_dir, sweep_exists)
+
     def pydub_split(self):
+        from pydub import AudioSegment
+        from pydub.silence import split_on_silence
+
         sound = AudioSegment.from_wav(self.audio_path)
 
-        filename = os.path.basename(self.audio_path)
-        if "48k" in filename:
-            prefix = "48k"
-            output_dir = self.paths["segment_result_folder"]["48k"]
-        elif "96k" in filename:
-            prefix = "96k"
-            output_dir = self.paths["segment_result_folder"]["96k"]
-        else:
-            raise ValueError(
-                "Filename must contain '48k' or '96k' to determine output folder."
-            )
-        os.makedirs(output_dir, exist_ok=True)
+        prefix, output_dir = output_target(self.audio_path, self.paths)
         sweep_path = os.path.join(output_dir, f"{prefix}_freq_sweep.wav")
         sweep_exists = os.path.exists(sweep_path)
 
@@ -61,34 +227,104 @@ class silenceSplitter:
 
 
 class manualSplitter:
+    """Sweep and the rest of the recording as two files, cut from a memory-mapped view of it.
+
+    Both files are byte copies of the recording (24-bit stays 24-bit); no
+    samples are decoded except where stimulus alignment reads them.
+    """
+
     def __init__(self, audio_path, paths):
         self.audio_path = audio_path
         self.paths = paths
-        self.sound = AudioSegment.from_wav(audio_path)
-
-    def split_sweep_only(self):
-            filename = os.path.basename(self.audio_path)
-            if "48k" in filename:
-                prefix = "48k"
-                output_dir = self.paths["segment_result_folder"]["48k"]
-            elif "96k" in filename:
-                prefix = "96k"
-                output_dir = self.paths["segment_result_folder"]["96k"]
-            else:
-                raise ValueError(
-                    "Filename must contain '48k' or '96k' to determine output folder."
-                )
-            os.makedirs(output_dir, exist_ok=True)
+        self.info = wavInfo(audio_path)
 
-            sweep_end = (6 * 60 + 44) * 1000
-            sweep_segment = self.sound[:sweep_end]
+    def split_sweep_only(self, sweep_end=(6 * 60 + 44) * 1000):
+        """`sweep_end` is in ms, used when stimulus alignment is off or fails."""
+        prefix, output_dir = output_target(self.audio_path, self.paths)
+        sweep_start = 0
+        sweep_frames = int(sweep_end * (self.info.framerate / 1000.0))
+        ranges = aligned_ranges(self.info, self.paths, prefix, sweep_only=True)
+        if ranges:
+            sweep_start, sweep_frames = ranges[0]
 
-            out_file = os.path.join(output_dir, f"{prefix}_freq_sweep.wav")
-            sweep_segment.export(out_file, format="wav")
+        with wavMap(self.info) as wav_map:
+            out_file = wav_map.segment(sweep_start, sweep_frames).write(
+                os.path.join(output_dir, f"{prefix}_freq_sweep.wav")
+            )
             print(f"Saved as: {out_file}")
 
-            remaining_audio_path = os.path.join(output_dir, f"{prefix}_recording_multitone.wav")
-            remaining_segment = self.sound[sweep_end:]
-            remaining_segment.export(remaining_audio_path, format="wav")
+            remaining_audio_path = wav_map.segment(sweep_frames).write(
+                os.path.join(output_dir, f"{prefix}_recording_multitone.wav")
+            )
+        return remaining_audio_path
+
+
+
+class recordingSplitter:
+    """Step 2 in one pass: cut the sweep and the multitone bursts straight from the recording.
+
+    Replaces manualSplitter + silenceSplitter without writing and re-reading
+    the intermediate {prefix}_recording_multitone.wav.
+    """
+
+    def __init__(self, audio_path, paths):
+        self.audio_path = audio_path
+        self.paths = paths
+        self.info = wavInfo(audio_path)
+
+    def split(
+        self,
+        sweep_end=(6 * 60 + 44) * 1000,
+        min_silence_len=800,
+        silence_thresh=None,
+        keep_silence=0,
+        align=True,
+    ):
+        """`sweep_end` is in ms; silence options are those of silenceSplitter.split().
+
+        With `align` and "stimulus_folder" in the paths, the sweep and every
+        burst are cut where stimulus_align finds them; `sweep_end` and the
+        silence threshold are only the fallback.
+        """
+        prefix, output_dir = output_target(self.audio_path, self.paths)
+        ranges = None
+        if align:
+            ranges = aligned_ranges(self.info, self.paths, prefix, min_silence_len, keep_silence)
+        if ranges:
+            (sweep_start, sweep_frames), frame_ranges = ranges[0], ranges[1:]
+        else:
+            sweep_start = 0
+            sweep_frames = min(int(sweep_end * (self.info.framerate / 1000.0)), self.info.nframes)
+            frame_ranges = split_frame_ranges(
+                self.info,
+                start=sweep_frames,
+                min_silence_len=min_silence_len,
+                silence_thresh=silence_thresh,
+                keep_silence=keep_silence,
+            )
+
+        sweep_file = os.path.join(output_dir, f"{prefix}_freq_sweep.wav")
+        copy_frames(self.info, sweep_file, sweep_start, sweep_frames)
+        print(f"Saved as: {sweep_file}")
+        return [sweep_file] + write_segments(
+            self.info, frame_ranges, prefix, output_dir, sweep_exists=True
+        )
+
+
+# recordingSplitter.split() options; "split_options" in audio_quality_paths.json overrides them.
+SPLIT_DEFAULTS = {
+    "sweep_end": (6 * 60 + 44) * 1000,
+    "min_silence_len": 800,
+    "silence_thresh": None,
+    "keep_silence": 0,
+    "align": True,
+}
+
+
+def split_options(paths):
+    return {**SPLIT_DEFAULTS, **paths.get("split_options", {})}
+
 
-            return remaining_audio_path
+def split_recording(audio_path, paths):
+    """Step 2 as a plain function, so it can run in a worker process."""
+    return recordingSplitter(audio_path, paths).split(**split_options(paths))
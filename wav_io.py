@@ -0,0 +1,219 @@
+import os
+import mmap
+import struct
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class wavInfo:
+    """Layout of a RIFF/WAVE file: format fields plus where the data chunk lives."""
+
+    def __init__(self, path, fileobj=None, file_size=None):
+        """Parse `path`, or the header bytes in `fileobj` (e.g. fetched from a device).
+
+        The data size is clamped to `file_size` (the size of `path` when it
+        is read directly); a header-only `fileobj` trusts the data chunk size.
+        """
+        self.path = path
+        if fileobj is None:
+            file_size = os.path.getsize(path)
+            with open(path, "rb") as f:
+                self._parse(f)
+        else:
+            self._parse(fileobj)
+
+        if self.fmt_chunk is None or self.data_offset is None:
+            raise ValueError(f"{path} has no fmt or data chunk")
+
+        (
+            self.format_tag,
+            self.channels,
+            self.framerate,
+            _,
+            self.block_align,
+            bits,
+        ) = struct.unpack("<HHIIHH", self.fmt_chunk[:16])
+        if self.format_tag == WAVE_FORMAT_EXTENSIBLE:
+            self.format_tag = struct.unpack("<H", self.fmt_chunk[24:26])[0]
+        if self.format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+            raise ValueError(f"{path}: unsupported WAVE format tag {self.format_tag:#x}")
+
+        self.sampwidth = self.block_align // self.channels
+        self.bits = bits
+        # Recorders that are killed mid-write leave a bogus data size behind.
+        if file_size is not None:
+            self.data_size = min(self.data_size, file_size - self.data_offset)
+        self.nframes = self.data_size // self.block_align
+
+    def _parse(self, f):
+        riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError(f"{self.path} is not a RIFF/WAVE file")
+
+        self.fmt_chunk = None
+        self.data_offset = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"fmt ":
+                self.fmt_chunk = f.read(chunk_size)
+                f.seek(chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                self.data_offset = f.tell()
+                self.data_size = chunk_size
+                break
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+    @property
+    def duration(self):
+        return self.nframes / self.framerate
+
+
+def pcm_to_float(raw, info, dtype=np.float32):
+    """Convert raw frame bytes to a (frames, channels) array scaled to +-1.0 full scale."""
+    width = info.sampwidth
+    if info.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        samples = np.frombuffer(raw, dtype=f"<f{width}").astype(dtype)
+    elif width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(dtype) - 128) / 128
+    elif width == 3:
+        # Place each 24-bit sample in the top three bytes of an int32.
+        packed = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        widened = np.zeros((len(packed), 4), dtype=np.uint8)
+        widened[:, 1:] = packed
+        samples = widened.view("<i4").ravel().astype(dtype) / dtype(2**31)
+    else:
+        samples = np.frombuffer(raw, dtype=f"<i{width}").astype(dtype)
+        samples /= dtype(2 ** (8 * width - 1))
+    return samples.reshape(-1, info.channels)
+
+
+def read_frames(info, start, end, dtype=np.float32):
+    """Read frames [start, end) as a float array."""
+    start = max(0, start)
+    end = min(end, info.nframes)
+    if end <= start:
+        return np.zeros((0, info.channels), dtype=dtype)
+    with open(info.path, "rb") as f:
+        f.seek(info.data_offset + start * info.block_align)
+        raw = f.read((end - start) * info.block_align)
+    return pcm_to_float(raw, info, dtype)
+
+
+def iter_blocks(info, block_frames, start=0, end=None, dtype=np.float32):
+    """Yield (first_frame, samples) blocks of at most `block_frames` frames."""
+    end = info.nframes if end is None else min(end, info.nframes)
+    with open(info.path, "rb") as f:
+        f.seek(info.data_offset + start * info.block_align)
+        pos = start
+        while pos < end:
+            count = min(block_frames, end - pos)
+            raw = f.read(count * info.block_align)
+            if not raw:
+                break
+            yield pos, pcm_to_float(raw, info, dtype)
+            pos += len(raw) // info.block_align
+
+
+def write_header(f, info, nframes):
+    data_size = nframes * info.block_align
+    fmt = info.fmt_chunk
+    riff_size = 4 + (8 + len(fmt) + len(fmt) % 2) + (8 + data_size + data_size % 2)
+    f.write(struct.pack("<4sI4s", b"RIFF", riff_size, b"WAVE"))
+    f.write(struct.pack("<4sI", b"fmt ", len(fmt)) + fmt + b"\0" * (len(fmt) % 2))
+    f.write(struct.pack("<4sI", b"data", data_size))
+
+
+class wavMap:
+    """The data chunk of a WAV file, memory-mapped read-only.
+
+    Frame ranges come out as wavSegment views of the mapping: nothing is
+    read or copied until samples are asked for, and then only one block at
+    a time. Segments must not be used after close().
+    """
+
+    def __init__(self, info):
+        self.info = info if isinstance(info, wavInfo) else wavInfo(info)
+        self._file = open(self.info.path, "rb")
+        # mmap offsets must be page aligned, so the whole file is mapped and the data chunk sliced out of it.
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        start = self.info.data_offset
+        self.data = memoryview(self._mmap)[start : start + self.info.nframes * self.info.block_align]
+
+    def segment(self, start=0, end=None):
+        return wavSegment(self, start, end)
+
+    def close(self):
+        if self._mmap is None:
+            return
+        self.data.release()
+        self._mmap.close()
+        self._file.close()
+        self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class wavSegment:
+    """Frames [start, end) of a wavMap, clamped to the file; a view, not a copy."""
+
+    def __init__(self, wav_map, start=0, end=None):
+        info = wav_map.info
+        self.wav_map = wav_map
+        self.info = info
+        self.start = min(max(0, start), info.nframes)
+        self.end = info.nframes if end is None else min(max(self.start, end), info.nframes)
+
+    @property
+    def nframes(self):
+        return self.end - self.start
+
+    @property
+    def duration(self):
+        return self.nframes / self.info.framerate
+
+    @property
+    def raw(self):
+        """The PCM bytes of the segment, as a memoryview into the mapping."""
+        align = self.info.block_align
+        return self.wav_map.data[self.start * align : self.end * align]
+
+    def segment(self, start=0, end=None):
+        """Sub-range in frames relative to this segment."""
+        end = self.nframes if end is None else min(end, self.nframes)
+        return wavSegment(self.wav_map, self.start + max(0, start), self.start + end)
+
+    def frames(self, dtype=np.float32):
+        """All samples as a (frames, channels) float array; blocks() keeps memory bounded instead."""
+        return pcm_to_float(self.raw, self.info, dtype)
+
+    def blocks(self, block_frames, dtype=np.float32):
+        """Yield (first_frame, samples) blocks, converting one block of the mapping at a time."""
+        for pos in range(self.start, self.end, block_frames):
+            yield pos, self.wav_map.segment(pos, min(pos + block_frames, self.end)).frames(dtype)
+
+    def write(self, out_path):
+        """Write the segment as a WAV file with the source's format chunk, copying its bytes unchanged."""
+        raw = self.raw
+        with open(out_path, "wb") as dst:
+            write_header(dst, self.info, self.nframes)
+            dst.write(raw)
+            if len(raw) % 2:
+                dst.write(b"\0")
+        return out_path
+
+
+def copy_frames(info, out_path, start, end):
+    """Write frames [start, end) of `info` to `out_path` without re-encoding."""
+    with wavMap(info) as wav_map:
+        return wav_map.segment(start, end).write(out_path)
@@ -0,0 +1,242 @@
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from wav_io import wavInfo, read_frames, iter_blocks
+from fft_csv_cache import cache_key, _replace_atomic, _write_npy, _write_json
+
+OVERVIEW_VERSION = 1
+
+
+def overview_paths(wav_path, cache_dir=None):
+    """Sidecar data/metadata paths for `wav_path` (next to it unless `cache_dir` is given)."""
+    wav_path = os.path.abspath(wav_path)
+    base = os.path.join(cache_dir, os.path.basename(wav_path)) if cache_dir else wav_path
+    return f"{base}.ovw.f32.npy", f"{base}.ovw.f32.json"
+
+
+def overview_key(wav_path, base, factor):
+    return {**cache_key(wav_path), "overview_version": OVERVIEW_VERSION, "base": base, "factor": factor}
+
+
+def bucket_frames(first, count, size, nframes):
+    """Frames in buckets first..first+count of `size` frames; only the file's last one can be short."""
+    return np.minimum(size, nframes - (first + np.arange(count)) * size)
+
+
+def reduce_buckets(data, edges, frames):
+    """Merge buckets [edges[i], edges[i+1]) of a (3, channels, n) min/max/mean-square array.
+
+    `frames` is the frame count of every bucket, the weight of its mean square.
+    """
+    return np.stack(
+        [
+            np.minimum.reduceat(data[0], edges, axis=-1),
+            np.maximum.reduceat(data[1], edges, axis=-1),
+            np.add.reduceat(data[2] * frames, edges, axis=-1) / np.add.reduceat(frames, edges),
+        ]
+    )
+
+
+def build_pyramid(info, base=256, factor=4, top_buckets=2048, block_buckets=4096):
+    """Min/max/mean-square pyramid of every channel in one streaming pass.
+
+    Level 0 summarizes `base` frames per bucket; each next level merges
+    `factor` buckets of the one below, until a level has at most
+    `top_buckets` buckets. Returns a list of (3, channels, buckets) float32 arrays.
+    """
+    n0 = -(-info.nframes // base)
+    level0 = np.empty((3, info.channels, n0), dtype=np.float32)
+    for pos, x in iter_blocks(info, base * block_buckets):
+        full = len(x) // base
+        first = pos // base
+        if full:
+            # Channel-major copy: reducing contiguous runs is an order of magnitude faster.
+            buckets = np.ascontiguousarray(x[: full * base].T).reshape(info.channels, full, base)
+            level0[0, :, first : first + full] = buckets.min(axis=-1)
+            level0[1, :, first : first + full] = buckets.max(axis=-1)
+            level0[2, :, first : first + full] = np.einsum("cij,cij->ci", buckets, buckets) / base
+        if len(x) > full * base:
+            # Only the last block of the file ends in a partial bucket.
+            tail = x[full * base :]
+            level0[:, :, first + full] = [tail.min(axis=0), tail.max(axis=0), (tail**2).mean(axis=0)]
+
+    levels = [level0]
+    size = base
+    while levels[-1].shape[-1] > top_buckets:
+        below = levels[-1]
+        frames = bucket_frames(0, below.shape[-1], size, info.nframes)
+        levels.append(reduce_buckets(below, np.arange(0, below.shape[-1], factor), frames).astype(np.float32))
+        size *= factor
+    return levels
+
+
+class waveformOverview:
+    """Multi-resolution min/max/RMS summary of a WAV file, cached in a float32 sidecar.
+
+    The sidecar (`<wav>.ovw.f32.npy` + `<wav>.ovw.f32.json`) is rebuilt when
+    the WAV path, modification time or size changes. `view()` answers any
+    time range at any width from the coarsest level that still has a bucket
+    per column, and reads the WAV itself only when zoomed in below one bucket.
+    """
+
+    def __init__(self, info, levels, base, factor):
+        self.info = info
+        self.levels = levels
+        self.base = base
+        self.factor = factor
+
+    @classmethod
+    def load(cls, wav_path, cache_dir=None, base=256, factor=4):
+        info = wavInfo(wav_path)
+        data_path, meta_path = overview_paths(wav_path, cache_dir)
+        key = overview_key(wav_path, base, factor)
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+
+        if meta is not None and meta.get("key") == key and os.path.exists(data_path):
+            data = np.load(data_path, mmap_mode="r")
+            levels = [data[:, :, offset : offset + length] for offset, length in meta["levels"]]
+            return cls(info, levels, base, factor)
+
+        levels = build_pyramid(info, base, factor)
+        offsets = np.cumsum([0] + [level.shape[-1] for level in levels])
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        _replace_atomic(data_path, _write_npy(np.concatenate(levels, axis=-1)))
+        _replace_atomic(
+            meta_path,
+            _write_json({"key": key, "levels": [[int(o), int(l.shape[-1])] for o, l in zip(offsets, levels)]}),
+        )
+        return cls(info, levels, base, factor)
+
+    def view(self, start_s=0.0, end_s=None, width=1600):
+        """(times, mins, maxs, rms) for [start_s, end_s) in at most `width` columns.
+
+        times are the column start times in seconds; the others are
+        (channels, columns) float arrays with full scale at 1.0.
+        """
+        info = self.info
+        f0 = max(0, int(start_s * info.framerate))
+        f1 = info.nframes if end_s is None else min(info.nframes, int(end_s * info.framerate))
+        if f1 <= f0:
+            raise ValueError(f"Empty range {start_s}..{end_s} s in {info.path}")
+        frames_per_column = (f1 - f0) / width
+
+        level, bucket = None, 1
+        for i in range(len(self.levels)):
+            size = self.base * self.factor**i
+            if size > frames_per_column:
+                break
+            level, bucket = i, size
+
+        if level is None:
+            x = read_frames(info, f0, f1).T
+            data = np.stack([x, x, x * x])
+            i0, i1 = f0, f1
+        else:
+            i0, i1 = f0 // bucket, -(-f1 // bucket)
+            data = np.asarray(self.levels[level][:, :, i0:i1], dtype=np.float32)
+
+        columns = min(width, i1 - i0)
+        edges = np.unique(np.arange(columns) * (i1 - i0) // columns)
+        pooled = reduce_buckets(data, edges, bucket_frames(i0, i1 - i0, bucket, info.nframes))
+        times = (i0 + edges) * bucket / info.framerate
+        return times, pooled[0], pooled[1], np.sqrt(pooled[2])
+
+    def render(self, output=None, start_s=0.0, end_s=None, size_px=(1600, None), dpi=100, segments=None,
+               fig=None):
+        """Min/max envelope with the RMS band, one axis per channel, drawn at the plot's pixel width.
+
+        `segments` is a list of (start_s, end_s) ranges, e.g. what the
+        splitter cut, shaded alternately and numbered.
+        """
+        if fig is None:
+            from matplotlib.figure import Figure
+
+            height = size_px[1] or 120 + 180 * self.info.channels
+            fig = Figure(figsize=(size_px[0] / dpi, height / dpi), dpi=dpi)
+        axes = np.atleast_1d(fig.subplots(self.info.channels, 1, sharex=True, squeeze=False)[:, 0])
+        end = self.info.duration if end_s is None else min(end_s, self.info.duration)
+        for ch, ax in enumerate(axes):
+            ax.set_xlim(start_s, end)
+            ax.set_ylim(-1, 1)
+            ax.set_ylabel(f"Ch{ch + 1}")
+        axes[0].set_title(os.path.basename(self.info.path))
+        axes[-1].set_xlabel("Time (s)")
+        fig.tight_layout()
+
+        width = max(1, int(axes[0].get_window_extent().width))
+        times, mins, maxs, rms = self.view(start_s, end_s, width)
+        # Repeat the last column so the steps reach the end of the view.
+        times = np.r_[times, end]
+        mins, maxs, rms = (np.concatenate([a, a[:, -1:]], axis=1) for a in (mins, maxs, rms))
+        samples = (end - start_s) * self.info.framerate <= width
+        for ch, ax in enumerate(axes):
+            if samples:
+                # Zoomed in to single samples: draw them, an envelope would be flat.
+                ax.plot(times[:-1], mins[ch, :-1], color="navy", linewidth=0.8, marker=".", markersize=2)
+            else:
+                ax.fill_between(times, mins[ch], maxs[ch], step="post", color="tab:blue", linewidth=0)
+                ax.fill_between(times, -rms[ch], rms[ch], step="post", color="navy", linewidth=0)
+            for i, (seg_start, seg_end) in enumerate(segments or []):
+                if seg_end < start_s or seg_start > end:
+                    continue
+                ax.axvspan(seg_start, seg_end, color="tab:green" if i % 2 else "tab:orange", alpha=0.2, zorder=0)
+                if ch == 0:
+                    ax.text(max(seg_start, start_s), 0.9, str(i), fontsize=8, va="top")
+        if output:
+            fig.savefig(output)
+        return fig
+
+
+def split_segments(info, sweep_end_ms=(6 * 60 + 44) * 1000):
+    """(start_s, end_s) of the sweep and the multitone bursts, as recordingSplitter.split() cuts them."""
+    from tone_splitter import split_frame_ranges
+
+    sweep_frames = min(int(sweep_end_ms * (info.framerate / 1000.0)), info.nframes)
+    ranges = [(0, sweep_frames)] + split_frame_ranges(info, start=sweep_frames)
+    return [(start / info.framerate, end / info.framerate) for start, end in ranges]
+
+
+def draw_overview(wav_path, output, start_s=0.0, end_s=None, sweep_end_s=None, cache_dir=None):
+    """Overview image of one file; with `sweep_end_s`, the segments the splitter cuts are shaded."""
+    overview = waveformOverview.load(wav_path, cache_dir)
+    segments = None if sweep_end_s is None else split_segments(overview.info, sweep_end_s * 1000)
+    overview.render(output, start_s, end_s, segments=segments)
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Waveform overview images from cached min/max/RMS pyramids")
+    parser.add_argument("wav", type=str, nargs="+", help="WAV file(s) to draw")
+    parser.add_argument("--start", type=float, default=0.0, help="Start of the view in seconds")
+    parser.add_argument("--end", type=float, default=None, help="End of the view in seconds (default: end of file)")
+    parser.add_argument("--split", action="store_true", help="Shade the sweep and multitone segments the splitter cuts")
+    parser.add_argument("--sweep-end", type=float, default=6 * 60 + 44, help="Length of the sweep in seconds for --split")
+    parser.add_argument("--out-dir", type=str, default=None, help="Folder for the images (default: next to each WAV)")
+    parser.add_argument("--cache-dir", type=str, default=None, help="Folder for the sidecars (default: next to each WAV)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    args = parser.parse_args(argv)
+
+    outputs = []
+    for wav_path in args.wav:
+        folder = args.out_dir or os.path.dirname(os.path.abspath(wav_path))
+        os.makedirs(folder, exist_ok=True)
+        outputs.append(os.path.join(folder, f"{os.path.splitext(os.path.basename(wav_path))[0]}_overview.png"))
+
+    with ProcessPoolExecutor(args.workers) as pool:
+        futures = [
+            pool.submit(draw_overview, wav_path, output, args.start, args.end, args.sweep_end if args.split else None, args.cache_dir)
+            for wav_path, output in zip(args.wav, outputs)
+        ]
+        for future in futures:
+            print(f"Saved as: {future.result()}")
+
+
+if __name__ == "__main__":
+    main()